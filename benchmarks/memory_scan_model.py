@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Compare the memory held by scan results in the old nested-dict/YAML form and
+in the slotted ``HostRecord`` model.
+
+    python3 benchmarks/memory_scan_model.py [--hosts 65536]
+"""
+import argparse
+import gc
+import importlib.util
+import ipaddress
+import os
+import sys
+import tracemalloc
+
+import yaml
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def load_scan_model():
+    spec = importlib.util.spec_from_file_location(
+        "scan_model", os.path.join(SRC_DIR, "scan_model.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeHostDict(dict):
+    """Stands in for python-nmap's PortScannerHostDict."""
+
+
+SERVICES = [
+    (22, "ssh", "OpenSSH", "8.9p1 Ubuntu 3ubuntu0.6"),
+    (80, "http", "nginx", "1.18.0"),
+    (443, "https", "nginx", "1.18.0"),
+    (3306, "mysql", "MySQL", "8.0.36"),
+    (8080, "http-proxy", "", ""),
+]
+
+
+def synthetic_host(index: int, address: str) -> FakeHostDict:
+    tcp = {}
+    for offset in range(5):
+        port, name, product, version = SERVICES[(index + offset) % len(SERVICES)]
+        is_open = offset < 3
+        tcp[port] = {
+            "state": "open" if is_open else "closed",
+            "reason": "syn-ack" if is_open else "reset",
+            "name": name,
+            "product": product if is_open else "",
+            "version": version if is_open else "",
+            "extrainfo": "",
+            "conf": "10" if is_open else "3",
+            "cpe": "",
+        }
+    return FakeHostDict(
+        {
+            "hostnames": [{"name": "", "type": ""}],
+            "addresses": {"ipv4": address},
+            "vendor": {},
+            "status": {"state": "up", "reason": "syn-ack"},
+            "tcp": tcp,
+        }
+    )
+
+
+def to_plain_dict(data):
+    if isinstance(data, list):
+        return [to_plain_dict(item) for item in data]
+    if isinstance(data, dict):
+        return {key: to_plain_dict(value) for key, value in data.items()}
+    return data
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    retained = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=65536)
+    args = parser.parse_args()
+
+    scan_model = load_scan_model()
+    network = ipaddress.ip_network("10.0.0.0/8")
+    addresses = [str(network[i + 1]) for i in range(args.hosts)]
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+    def build_legacy():
+        raw = {address: synthetic_host(i, address) for i, address in enumerate(addresses)}
+        plain = {address: to_plain_dict(data) for address, data in raw.items()}
+        text = {
+            address: yaml.dump(data, Dumper=dumper, default_flow_style=False)
+            for address, data in plain.items()
+        }
+        return raw, plain, text
+
+    def build_records():
+        return {
+            address: scan_model.HostRecord.from_dict(address, synthetic_host(i, address))
+            for i, address in enumerate(addresses)
+        }
+
+    legacy = measure(build_legacy)
+    records = measure(build_records)
+    mib = 1024 * 1024
+    print(f"hosts:                                   {args.hosts}")
+    print(f"nmap dicts + plain dicts + YAML text:    {legacy / mib:8.1f} MiB")
+    print(f"HostRecord:                              {records / mib:8.1f} MiB")
+    print(f"reduction:                               {legacy / max(records, 1):8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare the adaptive scan-rate controller with nmap's fixed timing templates.
+
+Every mode scans the same targets shard by shard, the way the discovery
+pipeline batches them, and reports wall time and the open ports found, so a
+faster mode that misses ports is visible as such.
+
+    python3 benchmarks/scan_rate.py [--targets 127.0.0.1-8] [--shard-size 2]
+        [--ports 1-2048] [--modes T3,T4,T5,adaptive]
+
+Scanning loopback measures the best case. To see the controller back off,
+shape the interface first, e.g.:
+
+    sudo tc qdisc add dev lo root netem delay 20ms 5ms loss 3%
+    sudo tc qdisc del dev lo root
+"""
+import argparse
+import importlib.util
+import ipaddress
+import os
+import shutil
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def load_scan_rate():
+    spec = importlib.util.spec_from_file_location(
+        "scan_rate", os.path.join(SRC_DIR, "scan_rate.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def expand_targets(spec: str):
+    """Expand ``a.b.c.d-N`` and CIDR blocks into single addresses."""
+    targets = []
+    for part in spec.replace(",", " ").split():
+        if "/" in part:
+            targets.extend(str(ip) for ip in ipaddress.ip_network(part, strict=False))
+        elif "-" in part.rsplit(".", 1)[-1]:
+            base, span = part.rsplit(".", 1)
+            low, high = (int(value) for value in span.split("-"))
+            targets.extend(f"{base}.{octet}" for octet in range(low, high + 1))
+        else:
+            targets.append(part)
+    return targets
+
+
+def run_shard(nmap_path, hosts, ports, timing):
+    command = [nmap_path, "-n", "-Pn", "-sT", "-p", ports, "-oX", "-", *timing.split(), *hosts]
+    completed = subprocess.run(command, capture_output=True, text=True, check=False)
+    warnings = [line for line in completed.stderr.splitlines() if line.startswith("Warning")]
+    return completed.stdout, warnings
+
+
+def count_open_ports(xml_output):
+    try:
+        root = ET.fromstring(xml_output)
+    except ET.ParseError:
+        return 0
+    return sum(
+        1
+        for state in root.iterfind("host/ports/port/state")
+        if state.get("state") == "open"
+    )
+
+
+def run_mode(mode, scan_rate, nmap_path, shards, ports, limits):
+    controller = scan_rate.RateController(limits) if mode == "adaptive" else None
+    open_ports = 0
+    started = time.perf_counter()
+    for shard in shards:
+        timing = f"-T4 {controller.options()}" if controller else f"-{mode}"
+        xml_output, warnings = run_shard(nmap_path, shard, ports, timing)
+        open_ports += count_open_ports(xml_output)
+        if controller:
+            controller.observe(scan_rate.parse_shard_stats(xml_output, warnings))
+    elapsed = time.perf_counter() - started
+    final = controller.options() if controller else ""
+    return elapsed, open_ports, final
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--targets", default="127.0.0.1-8")
+    parser.add_argument("--shard-size", type=int, default=2)
+    parser.add_argument("--ports", default="1-2048")
+    parser.add_argument("--modes", default="T3,T4,T5,adaptive")
+    parser.add_argument("--max-rate", type=int, default=2000)
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--max-parallelism", type=int, default=256)
+    args = parser.parse_args()
+
+    nmap_path = shutil.which("nmap")
+    if nmap_path is None:
+        print("nmap was not found in PATH", file=sys.stderr)
+        return 1
+
+    scan_rate = load_scan_rate()
+    limits = scan_rate.RateLimits(
+        max_rate=args.max_rate,
+        max_retries=args.max_retries,
+        max_parallelism=args.max_parallelism,
+    )
+    targets = expand_targets(args.targets)
+    shards = [
+        targets[i : i + args.shard_size] for i in range(0, len(targets), args.shard_size)
+    ]
+
+    print(f"{len(targets)} hosts in {len(shards)} shards, ports {args.ports}")
+    print(f"{'mode':<10}{'seconds':>10}{'open ports':>12}  final settings")
+    for mode in args.modes.split(","):
+        elapsed, open_ports, final = run_mode(
+            mode, scan_rate, nmap_path, shards, args.ports, limits
+        )
+        print(f"{mode:<10}{elapsed:>10.2f}{open_ports:>12}  {final}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Measure how long woes takes to start.
+
+Launches the application repeatedly with ``WOES_STARTUP_PROFILE`` set, so it
+reports when its window was built, when the first frame was drawn and when
+the first page was ready, then quits. Also times the headless ``woes
+--version``, which must not load GTK.
+
+    python3 benchmarks/startup.py [--runs 10] [--command woes]
+
+Run it against an installed build (``ninja -C build install``) or a
+development launcher such as ``build/src/woes``.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+EVENTS = ("window-built", "first-frame", "page-ready")
+
+
+def profile_gui(command, timeout: float):
+    env = dict(os.environ, WOES_STARTUP_PROFILE="1")
+    started = time.perf_counter()
+    completed = subprocess.run(
+        command, env=env, capture_output=True, text=True, timeout=timeout, check=False
+    )
+    wall = (time.perf_counter() - started) * 1000
+    marks = {}
+    for line in completed.stderr.splitlines():
+        event, _, value = line.partition(" ")
+        if event in EVENTS:
+            try:
+                marks[event] = float(value)
+            except ValueError:
+                pass
+    if "page-ready" not in marks:
+        sys.exit(f"{' '.join(command)} did not report startup timings:\n{completed.stderr}")
+    marks["process"] = wall
+    return marks
+
+
+def time_cli(command, timeout: float) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [*command, "--version"], capture_output=True, timeout=timeout, check=True
+    )
+    return (time.perf_counter() - started) * 1000
+
+
+def report(name: str, samples):
+    print(
+        f"{name:>14}: median {statistics.median(samples):7.1f} ms"
+        f"  min {min(samples):7.1f} ms  max {max(samples):7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--command", default="woes", help="launcher to run")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--cli-only", action="store_true", help="skip the GUI runs")
+    args = parser.parse_args()
+    command = args.command.split()
+
+    cli = [time_cli(command, args.timeout) for _ in range(args.runs)]
+    print(f"{args.runs} runs of {args.command}")
+    report("cli --version", cli)
+    if args.cli_only:
+        return
+
+    runs = [profile_gui(command, args.timeout) for _ in range(args.runs)]
+    for event in (*EVENTS, "process"):
+        report(event, [run[event] for run in runs if event in run])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""
+Time the hot paths of woes and catch regressions between runs.
+
+Micro benchmarks time single functions on synthetic input: target list
+validation, nmap XML parsing and YAML rendering, header value
+wrapping and DNS answer formatting. Macro benchmarks fetch, resolve, scan
+and audit TLS end to end against stand-ins on loopback: an HTTP server, a
+DNS server, a fake ``nmap`` that replays recorded XML output and a TLS
+server with a certificate generated by ``openssl``.
+
+Every run is saved under ``.benchmarks/``, and each case is compared with
+its result in the latest run that included it. A case whose median and
+minimum both slowed by more than ``--threshold`` is reported as a
+regression, and the script exits with status 1.
+
+    python3 benchmarks/suite.py [--filter yaml] [--quick] [--repeat 5]
+        [--baseline FILE] [--nmap-xml recorded.xml] [--no-save]
+
+Cases whose dependencies (python-nmap, PyYAML, requests, dnspython, the
+openssl command) are not installed are skipped. Compare runs made on the same machine only.
+"""
+import argparse
+import glob
+import importlib
+import importlib.util
+import ipaddress
+import json
+import os
+import platform
+import shutil
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+RESULTS_DIR = os.path.join(ROOT_DIR, ".benchmarks")
+# A timed sample runs the case often enough to take at least this long.
+MIN_SAMPLE_SECONDS = 0.05
+HOST_SIZES = (1000, 10000, 65536)
+
+
+def load_woes():
+    """Import ``src`` as the ``woes`` package, as it is installed."""
+    if "woes" in sys.modules:
+        return sys.modules["woes"]
+    spec = importlib.util.spec_from_file_location(
+        "woes", os.path.join(SRC_DIR, "__init__.py"), submodule_search_locations=[SRC_DIR]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["woes"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# At import time, so the scan parser's worker processes can unpickle
+# functions from woes modules whatever the start method.
+load_woes()
+
+
+class Skip(Exception):
+    """Raised by a case's setup when it cannot run here."""
+
+
+def require(module: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise Skip(f"{e.name or module} is not installed")
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    kind: str
+    unit: str
+    sizes: Tuple[int, ...]
+    setup: Callable[[int], Callable[[], object]]
+
+
+CASES: List[Case] = []
+# Servers and temporary files shared by the macro cases, closed at exit.
+RESOURCES = ExitStack()
+OPTIONS = argparse.Namespace(nmap_xml=None)
+
+
+def case(name: str, kind: str, unit: str, sizes: Tuple[int, ...]):
+    """Register ``setup(size)``, which returns the function to time."""
+
+    def decorator(setup):
+        CASES.append(Case(name, kind, unit, sizes, setup))
+        return setup
+
+    return decorator
+
+
+_scanner = None
+
+
+def nmap_scanner():
+    global _scanner
+    require("nmap")
+    require("yaml")
+    if _scanner is None:
+        _scanner = importlib.import_module("woes.nmap_scanner").NmapScanner()
+        RESOURCES.callback(_scanner.parser.shutdown)
+    return _scanner
+
+
+def addresses(count: int) -> List[str]:
+    network = ipaddress.ip_network("10.0.0.0/8")
+    return [str(network[i + 1]) for i in range(count)]
+
+
+SERVICES = [
+    (22, "ssh", "OpenSSH", "8.9p1 Ubuntu 3ubuntu0.6"),
+    (80, "http", "nginx", "1.18.0"),
+    (443, "https", "nginx", "1.18.0"),
+    (3306, "mysql", "MySQL", "8.0.36"),
+    (8080, "http-proxy", "", ""),
+]
+
+
+def synthetic_nmap_xml(count: int) -> bytes:
+    """nmap ``-oX`` output for ``count`` hosts with the services above."""
+    parts = ['<?xml version="1.0"?>\n<nmaprun scanner="nmap" args="nmap -oX -">\n']
+    for index, address in enumerate(addresses(count)):
+        ports = []
+        for offset in range(3):
+            port, name, product, version = SERVICES[(index + offset) % len(SERVICES)]
+            script = ""
+            if name.startswith("http"):
+                script = f'<script id="http-title" output="Welcome to host {index}"/>'
+            ports.append(
+                f'<port protocol="tcp" portid="{port}"><state state="open" reason="syn-ack"/>'
+                f'<service name="{name}" product="{product}" version="{version}" conf="10"/>'
+                f"{script}</port>"
+            )
+        parts.append(
+            f'<host><status state="up" reason="syn-ack"/>'
+            f'<address addr="{address}" addrtype="ipv4"/>'
+            f'<hostnames><hostname name="host{index}.example" type="PTR"/></hostnames>'
+            f'<ports><extraports state="closed" count="997"/>{"".join(ports)}</ports>'
+            f'<times srtt="1000" rttvar="200" to="100000"/></host>\n'
+        )
+    parts.append(
+        f'<runstats><finished time="1" elapsed="1.0"/>'
+        f'<hosts up="{count}" down="0" total="{count}"/></runstats></nmaprun>\n'
+    )
+    return "".join(parts).encode()
+
+
+@case("validate_target_input", "micro", "entry", HOST_SIZES)
+def setup_validate_targets(size: int):
+    scanner = nmap_scanner()
+    entries = []
+    for index, address in enumerate(addresses(size)):
+        kind = index % 20
+        if kind < 14:
+            entries.append(address)
+        elif kind < 16:
+            entries.append(f"{address}/28")
+        elif kind < 18:
+            entries.append(f"{address.rsplit('.', 1)[0]}.1-200")
+        elif kind < 19:
+            entries.append(f"fd00::{index:x}")
+        else:
+            entries.append(f"!{address}")
+    text = "\n".join(entries)
+    return lambda: scanner.validate_target_input(text)
+
+
+@case("parse_nmap_xml", "micro", "host", HOST_SIZES)
+def setup_parse_xml(size: int):
+    scanner = nmap_scanner()
+    xml_output = synthetic_nmap_xml(size)
+    return lambda: scanner.parser.parse(xml_output)
+
+
+def parsed_hosts(size: int):
+    return nmap_scanner().parser.parse(synthetic_nmap_xml(size))
+
+
+@case("render_host_yaml", "micro", "host", HOST_SIZES)
+def setup_render_yaml(size: int):
+    scanner = nmap_scanner()
+    hosts = parsed_hosts(size)
+    scanner.yaml_cache = importlib.import_module("woes.nmap_scanner").YamlCache()
+
+    def render():
+        scanner.yaml_cache.clear()
+        return [scanner.render_host_yaml(address, host) for address, host in hosts.items()]
+
+    return render
+
+
+@case("render_host_yaml_cached", "micro", "host", HOST_SIZES)
+def setup_render_yaml_cached(size: int):
+    scanner = nmap_scanner()
+    hosts = parsed_hosts(size)
+    scanner.yaml_cache = importlib.import_module("woes.nmap_scanner").YamlCache(maxsize=size)
+    for address, host in hosts.items():
+        scanner.render_host_yaml(address, host)
+    return lambda: [scanner.render_host_yaml(address, host) for address, host in hosts.items()]
+
+
+def long_header_value(size: int) -> str:
+    """A Content-Security-Policy-like value with one long unbroken token."""
+    words = []
+    index = 0
+    while sum(len(word) + 1 for word in words) < size:
+        if index % 50 == 49:
+            words.append("sha256-" + "Qx7" * 60 + ";")
+        else:
+            words.append(f"https://cdn{index}.example.com")
+        index += 1
+    return " ".join(words)[:size]
+
+
+@case("http_page_wrap_text", "micro", "char", (1000, 10000, 100000))
+def setup_wrap_text(size: int):
+    wrap_text = importlib.import_module("woes.http_client").wrap_text
+    value = long_header_value(size)
+    return lambda: wrap_text(value)
+
+
+@case("format_dns_result", "micro", "record", (100, 1000, 10000))
+def setup_format_dns(size: int):
+    require("dns")
+    dns_client = importlib.import_module("woes.dns_client")
+    records = [
+        f'"v=spf1 ip4:{address}/32 include:_spf.example.com ~all"' for address in addresses(size)
+    ]
+    answer = dns_client.DnsAnswer("example.com", "TXT", ["127.0.0.1"], records)
+
+    # What the DNS page does short of inserting into its text buffer.
+    def format_answer():
+        return [dns_client.split_record_line(line) for line in answer.to_text().splitlines()]
+
+    return format_answer
+
+
+class HeaderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    policy = long_header_value(2000)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Security-Policy", self.policy)
+        self.send_header("Cache-Control", "max-age=300, public")
+        self.send_header("X-Cache", "TCP_HIT from a23-1-2-3.deploy.akamaitechnologies.com")
+        self.send_header("X-Check-Cacheable", "YES")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HeaderHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    RESOURCES.callback(server.server_close)
+    RESOURCES.callback(server.shutdown)
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+@case("http_fetch", "macro", "request", (100,))
+def setup_http_fetch(size: int):
+    require("requests")
+    http_client = importlib.import_module("woes.http_client")
+    run_concurrently = importlib.import_module("woes.cli").run_concurrently
+    url = start_http_server()
+    urls = [f"{url}?page={index}" for index in range(size)]
+    return lambda: list(run_concurrently(http_client.fetch, urls, 8))
+
+
+def start_dns_server() -> int:
+    """Answer every A query over UDP with four addresses."""
+    message = require("dns.message")
+    rrset = importlib.import_module("dns.rrset")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    RESOURCES.callback(sock.close)
+
+    def serve():
+        while True:
+            try:
+                wire, peer = sock.recvfrom(4096)
+            except OSError:
+                return
+            query = message.from_wire(wire)
+            response = message.make_response(query)
+            for question in query.question:
+                response.answer.append(
+                    rrset.from_text(
+                        question.name, 300, "IN", "A", *(f"192.0.2.{i}" for i in range(1, 5))
+                    )
+                )
+            sock.sendto(response.to_wire(), peer)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return sock.getsockname()[1]
+
+
+@case("dns_resolve", "macro", "lookup", (100,))
+def setup_dns_resolve(size: int):
+    require("dns")
+    dns_client = importlib.import_module("woes.dns_client")
+    run_concurrently = importlib.import_module("woes.cli").run_concurrently
+    resolver = dns_client.make_resolver("127.0.0.1")
+    resolver.port = start_dns_server()
+    names = [f"host{index}.example.com" for index in range(size)]
+    return lambda: list(
+        run_concurrently(lambda name: dns_client.lookup(name, "A", resolver), names, 8)
+    )
+
+
+def start_tls_server() -> int:
+    """Shake hands with every connection, then close it."""
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        raise Skip("openssl is not installed")
+    directory = RESOURCES.enter_context(tempfile.TemporaryDirectory(prefix="woes-bench-"))
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "30",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout", key, "-out", cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server = socket.create_server(("127.0.0.1", 0))
+    RESOURCES.callback(server.close)
+
+    def handshake(connection):
+        try:
+            with context.wrap_socket(connection, server_side=True):
+                pass
+        except (OSError, ssl.SSLError):
+            connection.close()
+
+    def serve():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=handshake, args=(connection,), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1]
+
+
+@case("tls_audit", "macro", "endpoint", (100,))
+def setup_tls_audit(size: int):
+    tls_audit = importlib.import_module("woes.tls_audit")
+    port = start_tls_server()
+    auditor = tls_audit.TlsAuditor(tls_audit.TlsAuditOptions(concurrency=8, rechecks=1))
+    endpoints = [f"127.0.0.1:{port}"] * size
+    return lambda: auditor.audit(endpoints)
+
+
+def install_fake_nmap(xml_path: str):
+    """Put an ``nmap`` that prints ``xml_path`` first on the PATH."""
+    directory = RESOURCES.enter_context(tempfile.TemporaryDirectory(prefix="woes-bench-"))
+    path = os.path.join(directory, "nmap")
+    with open(path, "w", encoding="utf-8") as script:
+        script.write(
+            f"#!{sys.executable}\n"
+            "import shutil, sys\n"
+            f"with open({xml_path!r}, 'rb') as xml:\n"
+            "    shutil.copyfileobj(xml, sys.stdout.buffer)\n"
+        )
+    os.chmod(path, 0o755)
+    os.environ["PATH"] = f"{directory}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+@case("nmap_scan", "macro", "host", (1000, 10000))
+def setup_nmap_scan(size: int):
+    scanner = nmap_scanner()
+    targets = importlib.import_module("woes.targets").compile_targets("127.0.0.1")
+    if OPTIONS.nmap_xml:
+        xml_path = OPTIONS.nmap_xml
+    else:
+        handle, xml_path = tempfile.mkstemp(prefix="woes-bench-", suffix=".xml")
+        with os.fdopen(handle, "wb") as xml:
+            xml.write(synthetic_nmap_xml(size))
+        RESOURCES.callback(os.unlink, xml_path)
+    install_fake_nmap(xml_path)
+    return lambda: scanner.scan_targets(targets, False, False, "None")
+
+
+def recorded_hosts(xml_path: str) -> int:
+    with open(xml_path, "rb") as xml:
+        data = xml.read()
+    return data.count(b"<host>") + data.count(b"<host ")
+
+
+def measure(function: Callable[[], object], repeat: int, max_seconds: float) -> Dict:
+    """
+    Time ``function`` ``repeat`` times, or for about ``max_seconds``. Fast
+    functions are looped within each sample; the first call warms caches
+    and is only kept when it alone is a full sample.
+    """
+    started = time.perf_counter()
+    function()
+    first = time.perf_counter() - started
+    loops = 1 if first >= MIN_SAMPLE_SECONDS else int(MIN_SAMPLE_SECONDS / max(first, 1e-7)) + 1
+    samples = [first] if loops == 1 and first * repeat > max_seconds else []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        samples.append((time.perf_counter() - started) / loops)
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "runs": len(samples),
+        "loops": loops,
+    }
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(
+            ["git", "-C", ROOT_DIR, "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return revision
+
+
+def environment() -> Dict[str, object]:
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def change(result: Dict, previous: Optional[Dict], threshold: float) -> Tuple[str, bool]:
+    """The median's change against the baseline, and whether it regressed."""
+    if not previous:
+        return "", False
+    ratio = result["median"] / previous["median"] - 1
+    regressed = ratio > threshold and result["min"] / previous["min"] - 1 > threshold
+    improved = ratio < -threshold and result["min"] / previous["min"] - 1 < -threshold
+    marker = "  REGRESSION" if regressed else "  faster" if improved else ""
+    return f"{ratio:+7.1%}{marker}", regressed
+
+
+def load_baseline(paths: List[str]) -> Dict[str, Dict]:
+    """Each case's most recent result in the given runs, oldest first."""
+    baseline: Dict[str, Dict] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as stream:
+            saved = json.load(stream)
+        if saved["environment"].get("node") != platform.node():
+            print(f"Warning: {path} was recorded on another machine")
+        for key, result in saved["results"].items():
+            baseline[key] = dict(result, revision=saved["environment"]["revision"])
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--filter", action="append", default=[], help="only run cases whose name contains this"
+    )
+    parser.add_argument("--kind", choices=("micro", "macro"), help="only run one kind of case")
+    parser.add_argument("--quick", action="store_true", help="smallest size of each case only")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per case")
+    parser.add_argument(
+        "--max-time", type=float, default=20.0, help="stop sampling a case after this many seconds"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="slowdown reported as a regression"
+    )
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument(
+        "--baseline", help="run to compare with (default: each case's latest saved result)"
+    )
+    parser.add_argument("--no-save", action="store_true", help="do not save this run")
+    parser.add_argument("--nmap-xml", help="recorded nmap -oX output for the fake nmap to replay")
+    args = parser.parse_args()
+    OPTIONS.nmap_xml = args.nmap_xml and os.path.abspath(args.nmap_xml)
+
+    if args.baseline:
+        baseline = load_baseline([args.baseline])
+    else:
+        baseline = load_baseline(sorted(glob.glob(os.path.join(args.results_dir, "*.json"))))
+
+    results: Dict[str, Dict] = {}
+    regressions = []
+    with RESOURCES:
+        for bench in CASES:
+            if args.kind and bench.kind != args.kind:
+                continue
+            if args.filter and not any(word in bench.name for word in args.filter):
+                continue
+            sizes = bench.sizes[:1] if args.quick else bench.sizes
+            if bench.name == "nmap_scan" and OPTIONS.nmap_xml:
+                sizes = (recorded_hosts(OPTIONS.nmap_xml),)
+            for size in sizes:
+                key = f"{bench.name}[{size}]"
+                try:
+                    function = bench.setup(size)
+                except Skip as e:
+                    print(f"{key:<34} skipped: {e}")
+                    break
+                result = dict(measure(function, args.repeat, args.max_time), unit=bench.unit)
+                results[key] = result
+                delta, regressed = change(result, baseline.get(key), args.threshold)
+                if regressed:
+                    regressions.append(key)
+                per_item = format_seconds(result["median"] / size)
+                print(
+                    f"{key:<34} median {format_seconds(result['median']):>9}"
+                    f"  min {format_seconds(result['min']):>9}"
+                    f"  {per_item:>9}/{bench.unit:<7} {delta}",
+                    flush=True,
+                )
+
+    if results and not args.no_save:
+        os.makedirs(args.results_dir, exist_ok=True)
+        path = os.path.join(
+            args.results_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{git_revision()}.json"
+        )
+        with open(path, "w", encoding="utf-8") as stream:
+            json.dump({"environment": environment(), "results": results}, stream, indent=2)
+        print(f"Saved {path}")
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
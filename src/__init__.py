@@ -1,20 +1,38 @@
 # __init__.py
-import gi
+import importlib
 
-gi.require_version("Gtk", "4.0")
-gi.require_version("Adw", "1")
-gi.require_version("GtkSource", "5")
+# The GTK pages are imported on first use, so the headless command line
+# tools in this package (woes.cli) can run without loading gi.
+GTK_VERSIONS = {"Gtk": "4.0", "Adw": "1", "GtkSource": "5"}
 
-import logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+_PAGES = {
+    "HttpPage": "http_page",
+    "NmapPage": "nmap_page",
+    "DNSPage": "dns_page",
+    "Helper": "helper",
+    "Preferences": "preferences",
+    "Diagnostics": "diagnostics",
+    "WoesWindow": "window",
+}
+
+
+def require_gtk():
+    """Pin the GObject introspection versions the application is built on."""
+    import gi
+
+    for namespace, version in GTK_VERSIONS.items():
+        gi.require_version(namespace, version)
+
+
+def __getattr__(name):
+    module = _PAGES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    require_gtk()
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
 
-# Main application pages and modules
-from .http_page import HttpPage
-from .dns_page import DNSPage
-from .nmap_page import NmapPage
-from .helper import Helper
-from .preferences import Preferences
-from .window import WoesWindow
 
 __all__ = [
     "HttpPage",
@@ -22,5 +40,6 @@ __all__ = [
     "DNSPage",
     "Helper",
     "Preferences",
+    "Diagnostics",
     "WoesWindow",
 ]
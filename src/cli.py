@@ -0,0 +1,361 @@
+# cli.py
+"""
+Headless ``woes`` commands: ``woes http``, ``woes dns``, ``woes scan`` and
+``woes tls``.
+
+Nothing here imports ``gi``. The engines behind each command are imported
+by the command that needs them, so ``woes --help`` and argument errors
+return without loading requests, dnspython or the scanner.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from .constants import VERSION
+
+COMMANDS = ("http", "dns", "scan", "tls")
+# First arguments that the launcher hands to main() instead of the GUI.
+CLI_ARGUMENTS = COMMANDS + ("-h", "--help", "--version")
+DEFAULT_WORKERS = 8
+DEFAULT_HTTP_TIMEOUT = 10.0
+
+# Exit statuses: every lookup succeeded, some failed, or the command could
+# not run at all (argparse also uses 2 for usage errors).
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_ERROR = 2
+
+
+def read_inputs(values: List[str], stdin: TextIO) -> Iterator[str]:
+    """
+    Yield the command's inputs: its arguments, or one per line of standard
+    input when there are none or an argument is ``-``. Blank lines and
+    ``#`` comments are skipped.
+    """
+    for value in values or ["-"]:
+        if value != "-":
+            yield value
+            continue
+        for line in stdin:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                yield line
+
+
+def emit(stream: TextIO, record: dict):
+    stream.write(json.dumps(record, default=str))
+    stream.write("\n")
+    stream.flush()
+
+
+def run_concurrently(function, inputs: Iterable[str], workers: int):
+    """Yield ``function(input)`` results as they complete."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = set()
+        for value in inputs:
+            pending.add(executor.submit(function, value))
+            # Keep a bounded number of lookups queued, so a long list on
+            # stdin streams instead of being read in full first.
+            if len(pending) >= workers * 4:
+                done = next(as_completed(pending))
+                pending.discard(done)
+                yield done.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def command_http(args: argparse.Namespace, stdout: TextIO) -> int:
+    from .http_client import HttpError, ensure_scheme, fetch, is_valid_url
+
+    def check(value: str) -> dict:
+        url = ensure_scheme(value)
+        if not is_valid_url(url):
+            return {"url": value, "error": "Invalid URL format"}
+        try:
+            return fetch(url, args.pragma, args.timeout).to_dict()
+        except HttpError as e:
+            return {"url": url, "error": str(e)}
+
+    failures = 0
+    for result in run_concurrently(check, read_inputs(args.urls, sys.stdin), args.workers):
+        failed = "error" in result or result["status"] >= 400
+        failures += failed
+        if args.format == "text":
+            if "error" in result:
+                stdout.write(f"{result['url']}: {result['error']}\n\n")
+            else:
+                stdout.write(f"{result['url']} {result['status']} {result['reason']}\n")
+                for key, value in result["headers"].items():
+                    stdout.write(f"{key}: {value}\n")
+                stdout.write("\n")
+            stdout.flush()
+        else:
+            emit(stdout, result)
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+def command_dns(args: argparse.Namespace, stdout: TextIO) -> int:
+    from .dns_client import DnsAnswer, is_valid_ip_or_domain, lookup, make_resolver
+
+    resolver = make_resolver(args.server)
+
+    def check(value: str) -> DnsAnswer:
+        if not is_valid_ip_or_domain(value):
+            return DnsAnswer(
+                value, args.type, list(resolver.nameservers), error="Invalid IP address or domain"
+            )
+        return lookup(value, args.type, resolver)
+
+    failures = 0
+    for answer in run_concurrently(check, read_inputs(args.names, sys.stdin), args.workers):
+        failures += answer.error is not None
+        if args.format == "text":
+            stdout.write(f"{answer.to_text()}\n")
+            stdout.flush()
+        else:
+            emit(stdout, answer.to_dict())
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+def command_scan(args: argparse.Namespace, stdout: TextIO) -> int:
+    import dataclasses
+    import time
+
+    from .connect_scanner import ALL_PORTS, ConnectScanOptions, ConnectScanner
+    from .export import WRITERS, ExportFormat
+    from .targets import TargetError, compile_targets
+
+    try:
+        targets = compile_targets(" ".join(read_inputs(args.targets, sys.stdin)))
+    except TargetError as e:
+        logging.error(f"Invalid targets: {e}")
+        return EXIT_ERROR
+
+    engine = args.engine
+    if engine == "auto":
+        import shutil
+
+        engine = "nmap" if shutil.which("nmap") else "connect"
+    if engine == "connect":
+        options = ConnectScanOptions.top_ports(
+            args.top_ports, timeout=args.timeout, concurrency=args.concurrency
+        )
+        if args.all_ports:
+            options = dataclasses.replace(options, ports=ALL_PORTS)
+        arguments = options.describe()
+    else:
+        options = None
+        arguments = ""
+
+    to_stdout = args.output in (None, "-")
+    if args.format:
+        export_format = next(fmt for fmt in ExportFormat if fmt.extension == args.format)
+    else:
+        export_format = ExportFormat.from_path("" if to_stdout else args.output)
+    try:
+        stream = stdout if to_stdout else open(args.output, "w", encoding="utf-8", newline="")
+    except OSError as e:
+        logging.error(f"Could not write results to {args.output}: {e}")
+        return EXIT_ERROR
+    info = {"arguments": arguments, "target": " ".join(args.targets), "started_at": time.time()}
+    writer = WRITERS[export_format](stream, info)
+
+    def write_host(host):
+        writer.write(host)
+        stream.flush()
+
+    def write_batch(batch):
+        for host in batch.values():
+            writer.write(host)
+        stream.flush()
+
+    try:
+        writer.begin()
+        logging.info(f"Scanning {targets.summary()} with {engine}")
+        if options is not None:
+            ConnectScanner(options).run(targets.hosts(), write_host)
+        else:
+            import nmap
+
+            from .nmap_scanner import NmapScanner
+
+            scanner = NmapScanner()
+            try:
+                scanner.scan_targets(
+                    targets,
+                    args.os,
+                    args.all_ports,
+                    args.script or "None",
+                    on_hosts=write_batch,
+                )
+            except (nmap.PortScannerError, OSError) as e:
+                logging.error(f"Scan failed: {e}")
+                return EXIT_ERROR
+        writer.end()
+        stream.flush()
+    finally:
+        if not to_stdout:
+            stream.close()
+    logging.info(f"Scanned {writer.count} hosts")
+    return EXIT_OK
+
+
+def command_tls(args: argparse.Namespace, stdout: TextIO) -> int:
+    from .tls_audit import TlsAuditOptions, TlsAuditor
+
+    options = TlsAuditOptions(
+        timeout=args.timeout,
+        concurrency=args.concurrency,
+        rechecks=args.rechecks,
+        ocsp=args.ocsp,
+    )
+    failures = 0
+    for result in TlsAuditor(options).iter_audit(read_inputs(args.endpoints, sys.stdin)):
+        failed = result.error is not None or (args.verify and not result.trusted)
+        failures += failed
+        if args.format == "text":
+            stdout.write(f"{result.to_text()}\n\n")
+            stdout.flush()
+        else:
+            emit(stdout, result.to_dict())
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="woes",
+        description="Web Ops Evaluation Suite command line tools. "
+        "Run without a command to start the application.",
+    )
+    parser.add_argument("--version", action="version", version=f"%(prog)s {VERSION}")
+    parser.add_argument(
+        "-v", "--verbose", action="count", default=0, help="log progress (twice for debug)"
+    )
+    parser.add_argument(
+        "--trace", metavar="FILE", help="write timing spans to FILE as a Chrome trace"
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        metavar="FILE",
+        help="write operation metrics to FILE in the Prometheus text format at exit",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+
+    http = commands.add_parser("http", help="fetch HTTP response headers")
+    http.add_argument("urls", nargs="*", metavar="URL", help="URLs; read from stdin if none")
+    http.add_argument(
+        "--pragma", action="store_true", help="send the Akamai debug Pragma headers"
+    )
+    http.add_argument(
+        "--timeout", type=float, default=DEFAULT_HTTP_TIMEOUT, help="seconds (default: %(default)s)"
+    )
+    http.add_argument("--format", choices=("jsonl", "text"), default="jsonl")
+    http.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    http.set_defaults(handler=command_http)
+
+    dns = commands.add_parser("dns", help="look up DNS records")
+    dns.add_argument(
+        "names", nargs="*", metavar="NAME", help="domains or IP addresses; read from stdin if none"
+    )
+    dns.add_argument(
+        "-t", "--type", default="A", type=str.upper, help="record type (default: %(default)s)"
+    )
+    dns.add_argument("--server", help="nameserver to query instead of the system resolver")
+    dns.add_argument("--format", choices=("jsonl", "text"), default="jsonl")
+    dns.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    dns.set_defaults(handler=command_dns)
+
+    scan = commands.add_parser("scan", help="scan hosts for open ports")
+    scan.add_argument(
+        "targets",
+        nargs="*",
+        metavar="TARGET",
+        help="addresses, CIDR blocks, ranges, hostnames or @file; read from stdin if none",
+    )
+    scan.add_argument(
+        "--engine",
+        choices=("auto", "nmap", "connect"),
+        default="auto",
+        help="nmap, or the built-in connect scanner (default: nmap when installed)",
+    )
+    scan.add_argument("--all-ports", action="store_true", help="scan all 65535 ports")
+    scan.add_argument("--top-ports", type=int, default=100, help="connect scan port count")
+    scan.add_argument("--timeout", type=float, default=1.0, help="connect scan timeout")
+    scan.add_argument("--concurrency", type=int, default=512, help="connect scan concurrency")
+    scan.add_argument("--os", action="store_true", help="nmap OS fingerprinting")
+    scan.add_argument("--script", help="nmap script to run")
+    scan.add_argument(
+        "--format",
+        choices=("jsonl", "csv", "xml"),
+        help="output format (default: from the output file name, else jsonl)",
+    )
+    scan.add_argument("-o", "--output", help="write to a file instead of stdout")
+    scan.set_defaults(handler=command_scan)
+
+    tls = commands.add_parser("tls", help="audit TLS certificates and handshakes")
+    tls.add_argument(
+        "endpoints",
+        nargs="*",
+        metavar="HOST[:PORT]",
+        help="endpoints, port 443 by default; read from stdin if none",
+    )
+    tls.add_argument("--timeout", type=float, default=5.0, help="seconds (default: %(default)s)")
+    tls.add_argument("--concurrency", type=int, default=64, help="endpoints audited at once")
+    tls.add_argument(
+        "--rechecks",
+        type=int,
+        default=1,
+        help="resumed handshakes after the first, to time resumption (default: %(default)s)",
+    )
+    tls.add_argument(
+        "--ocsp", action="store_true", help="check OCSP stapling with the openssl command"
+    )
+    tls.add_argument(
+        "--verify", action="store_true", help="count untrusted certificates as failures"
+    )
+    tls.add_argument("--format", choices=("jsonl", "text"), default="jsonl")
+    tls.set_defaults(handler=command_tls)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)],
+        format="%(levelname)s: %(message)s",
+        stream=sys.stderr,
+    )
+    if args.trace:
+        from . import tracing
+
+        tracing.trace_to_file(args.trace)
+    try:
+        return args.handler(args, sys.stdout)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); stop quietly.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return EXIT_OK
+    finally:
+        if args.metrics_textfile:
+            write_metrics(args.metrics_textfile)
+
+
+def write_metrics(path: str):
+    from . import metrics
+
+    try:
+        metrics.write_textfile(path)
+    except OSError as e:
+        logging.error(f"Could not write metrics to {path}: {e}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
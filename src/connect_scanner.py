@@ -0,0 +1,227 @@
+# connect_scanner.py
+import asyncio
+import logging
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from . import metrics
+from .scan_model import HostRecord, ServiceRecord
+
+# nmap's most frequently open TCP ports, most common first, so TOP_PORTS[:n]
+# is a top-n list.
+TOP_PORTS = (
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080,
+    1723, 111, 995, 993, 5900, 1025, 587, 8888, 199, 1720, 465, 548, 113, 81,
+    6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000, 32768, 554, 26, 1433,
+    49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153,
+    8081, 2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357,
+    427, 49156, 543, 544, 5101, 144, 7, 389, 8009, 3128, 444, 9999, 5009,
+    7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051, 6646, 49157, 1028,
+    873, 1755, 2717, 4899, 9100, 119, 37,
+)
+
+DEFAULT_TOP_PORTS = 100
+ALL_PORTS = range(1, 65536)
+
+
+@dataclass(frozen=True)
+class ConnectScanOptions:
+    """
+    Limits of a built-in connect scan.
+
+    ``concurrency`` caps the connection attempts in flight overall,
+    ``host_concurrency`` and ``host_rate`` (attempts per second) cap them
+    per host, and ``max_hosts`` bounds how many hosts are scanned at once.
+    """
+
+    ports: Sequence[int] = TOP_PORTS[:DEFAULT_TOP_PORTS]
+    timeout: float = 1.0
+    concurrency: int = 512
+    host_concurrency: int = 32
+    host_rate: float = 200.0
+    max_hosts: int = 128
+
+    @classmethod
+    def top_ports(cls, count: int, **kwargs) -> "ConnectScanOptions":
+        return cls(ports=TOP_PORTS[: max(1, count)], **kwargs)
+
+    def describe(self) -> str:
+        """A short, nmap-like description stored with the scan in history."""
+        if self.ports is ALL_PORTS:
+            ports = "-p-"
+        elif tuple(self.ports) == TOP_PORTS[: len(self.ports)]:
+            ports = f"--top-ports {len(self.ports)}"
+        else:
+            ports = "-p " + ",".join(str(port) for port in self.ports)
+        return f"-sT {ports} (built-in connect scan, {self.timeout:g}s timeout)"
+
+
+@lru_cache(maxsize=None)
+def service_for_port(port: int) -> ServiceRecord:
+    """Name a port from the system services table, as nmap does without -sV."""
+    try:
+        name = socket.getservbyport(port, "tcp")
+    except OSError:
+        name = ""
+    return ServiceRecord.get(name, "", "", "", "3" if name else "", "")
+
+
+class HostRateLimiter:
+    """Spaces connection attempts to one host at most ``rate`` per second."""
+
+    __slots__ = ("interval", "next_slot")
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class ConnectScanner:
+    """
+    A TCP connect scan that needs neither nmap nor raw sockets.
+
+    Each port gets a full ``connect()``: an accepted connection is open, a
+    refused one closed, and a timeout filtered, with the reasons nmap's
+    ``-sT`` reports. Hosts that answered on at least one port are returned as
+    ``HostRecord`` objects, like nmap's results, with only open ports listed.
+    """
+
+    def __init__(self, options: ConnectScanOptions = ConnectScanOptions()):
+        self.options = options
+        self.cancelled = threading.Event()
+        self.scanned = 0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(
+        self,
+        hosts: Iterable[str],
+        on_host: Optional[Callable[[HostRecord], None]] = None,
+    ) -> Dict[str, HostRecord]:
+        """Scan ``hosts`` from a worker thread; ``on_host`` streams each result."""
+        with metrics.scan("connect"):
+            results = asyncio.run(self.scan(hosts, on_host))
+        metrics.SCAN_HOSTS.inc(len(results), engine="connect")
+        return results
+
+    async def scan(
+        self,
+        hosts: Iterable[str],
+        on_host: Optional[Callable[[HostRecord], None]] = None,
+    ) -> Dict[str, HostRecord]:
+        results: Dict[str, HostRecord] = {}
+        connections = asyncio.Semaphore(self.options.concurrency)
+        host_slots = asyncio.Semaphore(self.options.max_hosts)
+        tasks = set()
+
+        async def scan_one(host: str):
+            try:
+                record = await self.scan_host(host, connections)
+                self.scanned += 1
+                if record is not None:
+                    results[record.address] = record
+                    if on_host:
+                        on_host(record)
+            except Exception as e:
+                logging.error(f"Connect scan of {host} failed: {e}")
+            finally:
+                host_slots.release()
+
+        # Hosts are started lazily so a large target set never becomes one
+        # task per address up front.
+        for host in hosts:
+            if self.cancelled.is_set():
+                break
+            await host_slots.acquire()
+            task = asyncio.create_task(scan_one(host))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return results
+
+    async def scan_host(
+        self, host: str, connections: asyncio.Semaphore
+    ) -> Optional[HostRecord]:
+        address = await self._resolve(host)
+        if address is None:
+            return None
+        limiter = HostRateLimiter(self.options.host_rate)
+        ports = iter(self.options.ports)
+        states: Dict[int, str] = {}
+
+        async def worker():
+            for port in ports:
+                if self.cancelled.is_set():
+                    return
+                await limiter.wait()
+                async with connections:
+                    # Checked again: the wait for a free slot can be long.
+                    if self.cancelled.is_set():
+                        return
+                    states[port] = await self._probe(address, port)
+
+        workers = min(self.options.host_concurrency, len(self.options.ports))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        if not any(state != "no-response" for state in states.values()):
+            return None
+        open_ports = sorted(port for port, reason in states.items() if reason == "syn-ack")
+        record = HostRecord(address, "up", "syn-ack" if open_ports else "conn-refused")
+        if address != host:
+            record.hostnames = ((host, "user"),)
+        for port in open_ports:
+            record.ports.append("tcp", port, "open", "syn-ack", service_for_port(port))
+        return record
+
+    async def _probe(self, address: str, port: int) -> str:
+        """Return the nmap reason for one connect attempt."""
+        writer = None
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), self.options.timeout
+            )
+            return "syn-ack"
+        except ConnectionRefusedError:
+            return "conn-refused"
+        except (asyncio.TimeoutError, OSError):
+            return "no-response"
+        finally:
+            if writer is not None:
+                # Wait for the transport to close, so a sweep of many hosts
+                # does not pile up half-closed connections.
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+
+    async def _resolve(self, host: str) -> Optional[str]:
+        try:
+            socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+            return host
+        except OSError:
+            pass
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                host, None, type=socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            logging.warning(f"Failed to resolve {host}: {e}")
+            return None
+        return infos[0][4][0] if infos else None
+
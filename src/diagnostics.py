@@ -0,0 +1,86 @@
+# diagnostics.py
+import time
+
+from gi.repository import Adw, Gdk, GLib, Gtk
+
+from . import metrics
+from .constants import RESOURCE_PREFIX
+
+REFRESH_SECONDS = 1
+
+
+@Gtk.Template(resource_path=f"{RESOURCE_PREFIX}/diagnostics.ui")
+class Diagnostics(Adw.Window):
+    """Shows the operation metrics and where they are exported to."""
+
+    __gtype_name__ = "Diagnostics"
+
+    metrics_page = Gtk.Template.Child("metrics_page")
+    export_row = Gtk.Template.Child("export_row")
+    since_row = Gtk.Template.Child("since_row")
+    reset_button = Gtk.Template.Child("reset_button")
+    copy_button = Gtk.Template.Child("copy_button")
+    toast_overlay = Gtk.Template.Child("toast_overlay")
+
+    def __init__(self, exporter=None, registry=metrics.REGISTRY, **kwargs):
+        super().__init__(**kwargs)
+        self.exporter = exporter
+        self.registry = registry
+        self.groups = {}
+        self.rows = {}
+        self.reset_button.connect("clicked", self.on_reset_clicked)
+        self.copy_button.connect("clicked", self.on_copy_clicked)
+        self.refresh()
+        # Only refresh while the window is open.
+        self.refresh_source = GLib.timeout_add_seconds(REFRESH_SECONDS, self.on_refresh)
+        self.connect("close-request", self.on_close_request)
+
+    def on_refresh(self):
+        self.refresh()
+        return GLib.SOURCE_CONTINUE
+
+    def refresh(self):
+        status = self.exporter.status() if self.exporter else "Not exported"
+        self.export_row.set_subtitle(status)
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.registry.started_at))
+        self.since_row.set_subtitle(started)
+        for row in self.registry.rows():
+            self.row_for(row).set_subtitle(row.value)
+
+    def row_for(self, metric_row):
+        key = (metric_row.subsystem, metric_row.title)
+        row = self.rows.get(key)
+        if row is None:
+            group = self.groups.get(metric_row.subsystem)
+            if group is None:
+                group = Adw.PreferencesGroup(title=metric_row.subsystem)
+                self.metrics_page.add(group)
+                self.groups[metric_row.subsystem] = group
+            row = Adw.ActionRow(title=metric_row.title, subtitle_selectable=True)
+            row.add_css_class("property")
+            group.add(row)
+            self.rows[key] = row
+        return row
+
+    def clear_rows(self):
+        for group in self.groups.values():
+            self.metrics_page.remove(group)
+        self.groups.clear()
+        self.rows.clear()
+
+    def on_reset_clicked(self, button):
+        self.registry.reset()
+        self.clear_rows()
+        self.refresh()
+        self.toast_overlay.add_toast(Adw.Toast(title="Metrics reset"))
+
+    def on_copy_clicked(self, button):
+        content_provider = Gdk.ContentProvider.new_for_value(self.registry.render())
+        self.get_clipboard().set_content(content_provider)
+        self.toast_overlay.add_toast(Adw.Toast(title="Metrics copied"))
+
+    def on_close_request(self, window):
+        if self.refresh_source:
+            GLib.source_remove(self.refresh_source)
+            self.refresh_source = 0
+        return False
@@ -0,0 +1,109 @@
+# dns_client.py
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import dns.exception
+import dns.resolver
+import dns.reversename
+
+from . import metrics, tracing
+
+IP_REGEX = re.compile(r"^\d{1,3}(\.\d{1,3}){3}$")
+DOMAIN_REGEX = re.compile(r"^(?=.{1,253}$)(?!-)([A-Za-z0-9-]{1,63}(?<!-)\.)+[A-Za-z]{2,63}$")
+RECORD_LINE_REGEX = re.compile(r"^(.*?)\s+(IN)\s+([A-Z]+)\s+(.+)$")
+
+
+@dataclass
+class DnsAnswer:
+    query: str
+    record_type: str
+    nameservers: List[str]
+    records: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        answer: Dict[str, object] = {
+            "query": self.query,
+            "type": self.record_type,
+            "nameservers": self.nameservers,
+            "elapsed_ms": self.elapsed_ms,
+        }
+        if self.error is None:
+            answer["records"] = self.records
+        else:
+            answer["error"] = self.error
+        return answer
+
+    def to_text(self) -> str:
+        """The answer in the ``name. IN TYPE value`` layout of the DNS page."""
+        if self.error is not None:
+            return f"{self.record_type} record lookup failed for {self.query}: {self.error}"
+        return "\n".join(f"{self.query}. IN {self.record_type} {r}" for r in self.records)
+
+
+def is_ip_address(input_str: str) -> bool:
+    """Check if the input string is a valid IP address."""
+    try:
+        dns.reversename.from_address(input_str)
+        return True
+    except dns.exception.SyntaxError:
+        return False
+
+
+def is_valid_ip_or_domain(input_str: str) -> bool:
+    """Validate whether the input string is a valid IP address or domain."""
+    return bool(IP_REGEX.match(input_str)) or bool(DOMAIN_REGEX.match(input_str))
+
+
+def split_record_line(line: str) -> Optional[Tuple[str, str, str, str]]:
+    """Split a ``name. IN TYPE value`` line into its fields, or None."""
+    match = RECORD_LINE_REGEX.match(line)
+    return match.groups() if match else None
+
+
+def make_resolver(nameserver: Optional[str] = None) -> dns.resolver.Resolver:
+    resolver = dns.resolver.Resolver()
+    if nameserver:
+        resolver.nameservers = [nameserver]
+    return resolver
+
+
+def resolve(domain_or_ip: str, record_type: str, resolver: dns.resolver.Resolver) -> DnsAnswer:
+    """
+    Look up one record type; IP addresses are looked up by their reverse
+    name, so ``record_type`` should be ``PTR`` for them.
+    """
+    answer = DnsAnswer(domain_or_ip, record_type, list(resolver.nameservers))
+    started = time.perf_counter()
+    with tracing.span("dns.resolve", "dns", query=domain_or_ip, type=record_type) as span:
+        try:
+            if record_type == "PTR":
+                name = dns.reversename.from_address(domain_or_ip)
+                result = resolver.resolve(name, record_type)
+            else:
+                result = resolver.resolve(domain_or_ip, record_type)
+            answer.records = [r.to_text() for r in result]
+        except dns.exception.DNSException as e:
+            answer.error = str(e)
+        span.set(records=len(answer.records), failed=answer.error is not None)
+    elapsed = time.perf_counter() - started
+    metrics.DNS_LOOKUPS.inc(type=record_type, result="error" if answer.error else "ok")
+    metrics.DNS_SECONDS.observe(elapsed)
+    answer.elapsed_ms = round(elapsed * 1000, 1)
+    return answer
+
+
+def lookup(
+    domain_or_ip: str,
+    record_type: str = "A",
+    resolver: Optional[dns.resolver.Resolver] = None,
+) -> DnsAnswer:
+    """Look up a domain, or the PTR record of an IP address."""
+    if resolver is None:
+        resolver = make_resolver()
+    if is_ip_address(domain_or_ip):
+        record_type = "PTR"
+    return resolve(domain_or_ip, record_type, resolver)
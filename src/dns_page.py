@@ -1,15 +1,25 @@
 # dns_page.py
 import logging
-import re
 from datetime import datetime
 
 import dns.resolver
-import dns.reversename
 from gi.repository import Gio, Gtk, GtkSource, Pango
 
+from . import runtime
 from .constants import RESOURCE_PREFIX, APP_ID
+from .dns_client import (
+    is_ip_address,
+    is_valid_ip_or_domain,
+    make_resolver,
+    resolve,
+    split_record_line,
+)
+from .result_viewer import ResultViewer
 from .style_utils import apply_source_style_scheme
 
+# Answers with more records than this are shown without per-field tags.
+TAGGED_RECORD_LIMIT = 2000
+
 
 @Gtk.Template(resource_path=f"{RESOURCE_PREFIX}/dns_page.ui")
 class DNSPage(Gtk.Box):
@@ -22,9 +32,11 @@ class DNSPage(Gtk.Box):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.tasks = runtime.scope("dns")
         self.dns_page_init_ui()
         self.source_buffer = self.init_source_buffer()
         self.source_view = self.init_source_view(self.source_buffer)
+        self.viewer = ResultViewer(self.source_view)
         self.apply_source_view_style()
         self.settings = Gio.Settings.new(APP_ID)
 
@@ -96,21 +108,11 @@ class DNSPage(Gtk.Box):
 
     def is_ip_address(self, input_str: str) -> bool:
         """Check if the input string is a valid IP address."""
-        try:
-            dns.reversename.from_address(input_str)
-            return True
-        except dns.exception.SyntaxError:
-            return False
+        return is_ip_address(input_str)
 
     def is_valid_ip_or_domain(self, input_str: str) -> bool:
         """Validate whether the input string is a valid IP address or domain."""
-        ip_pattern = re.compile(r"^\d{1,3}(\.\d{1,3}){3}$")
-        domain_pattern = re.compile(
-            r"^(?=.{1,253}$)(?!-)([A-Za-z0-9-]{1,63}(?<!-)\.)+[A-Za-z]{2,63}$"
-        )
-        is_ip = bool(ip_pattern.match(input_str))
-        is_domain = bool(domain_pattern.match(input_str))
-        return is_ip or is_domain
+        return is_valid_ip_or_domain(input_str)
 
     def on_dns_entry_activated(self, entryrow: Gtk.Widget):
         """Handle DNS entry activation event."""
@@ -136,23 +138,32 @@ class DNSPage(Gtk.Box):
         record_type = self.get_selected_record_type()
 
         try:
-            resolver = dns.resolver.Resolver()
             # Fetch the custom DNS server each time before performing the lookup
-            custom_dns_server = self.settings.get_string("custom-dns-server")
-            if custom_dns_server:
-                resolver.nameservers = [custom_dns_server]  # Use custom DNS server
-
-            # Determine the correct record type for reverse lookups
-            if self.is_ip_address(user_input):
-                record_type = "PTR"
-                result = self.dns_lookup(user_input, record_type, resolver)
-            else:
-                result = self.dns_lookup(user_input, record_type, resolver)
-
-            self.display_dns_result(result, user_input, record_type, resolver.nameservers)
+            resolver = make_resolver(self.settings.get_string("custom-dns-server"))
         except Exception as e:
-            logging.error(f"Error performing DNS lookup: {e}")
-            self.show_error(f"Error: {str(e)}")
+            self.on_dns_lookup_failed(e)
+            return
+
+        # Determine the correct record type for reverse lookups
+        if self.is_ip_address(user_input):
+            record_type = "PTR"
+
+        # The latest lookup wins; an earlier one still in flight is dropped.
+        self.tasks.spawn(
+            self.dns_lookup,
+            user_input,
+            record_type,
+            resolver,
+            on_done=lambda result: self.display_dns_result(
+                result, user_input, record_type, resolver.nameservers
+            ),
+            on_error=self.on_dns_lookup_failed,
+            replace=True,
+        )
+
+    def on_dns_lookup_failed(self, e: Exception):
+        logging.error(f"Error performing DNS lookup: {e}")
+        self.show_error(f"Error: {str(e)}")
 
     def get_selected_record_type(self) -> str:
         """Get the currently selected DNS record type from the dropdown."""
@@ -174,22 +185,16 @@ class DNSPage(Gtk.Box):
 
     @staticmethod
     def dns_lookup(domain_or_ip: str, record_type: str, resolver: dns.resolver.Resolver) -> str:
-        try:
-            if record_type == "PTR":
-                rev_name = dns.reversename.from_address(domain_or_ip)
-                result = resolver.resolve(rev_name, record_type)
-            else:
-                result = resolver.resolve(domain_or_ip, record_type)
-
-            return "\n".join(
-                [f"{domain_or_ip}. IN {record_type} {r.to_text()}" for r in result]
-            )
-        except dns.exception.DNSException as e:
-            return f"{record_type} record lookup failed for {domain_or_ip}: {e}"
+        return resolve(domain_or_ip, record_type, resolver).to_text()
 
     def display_dns_result(self, result: str, domain_or_ip: str, record_type: str, dns_servers: list):
         """Display the DNS lookup results in the source buffer with enhanced formatting."""
-        self.source_buffer.set_text("")
+        if result.count("\n") >= TAGGED_RECORD_LIMIT:
+            # Tagging every field of a huge answer (an AXFR, say) costs more
+            # than it helps; show it as plain, paged text instead.
+            self.viewer.show(self.plain_dns_result(result, domain_or_ip, record_type, dns_servers))
+            return
+        self.viewer.clear()
 
         # Check if the header tag already exists in the tag table
         self.header_tag = self.source_buffer.get_tag_table().lookup("header")
@@ -223,17 +228,30 @@ class DNSPage(Gtk.Box):
 
         self.format_dns_result(result)
 
+    @staticmethod
+    def plain_dns_result(result: str, domain_or_ip: str, record_type: str, dns_servers: list) -> str:
+        lines = [
+            f"DNS Lookup Results - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            "",
+            f"DNS server used: {', '.join(dns_servers)}",
+            "",
+            f"{domain_or_ip}\t{record_type}",
+            "",
+        ]
+        for line in result.splitlines():
+            fields = split_record_line(line)
+            lines.append("\t".join(fields) if fields else line)
+        lines.append("")
+        return "\n".join(lines)
+
     def format_dns_result(self, result: str):
         """Format the DNS result string by separating fields with tabs and applying color."""
         lines = result.splitlines()
 
         for line in lines:
-            match = re.match(r"^(.*?)\s+(IN)\s+([A-Z]+)\s+(.+)$", line)
-            if match:
-                domain = match.group(1)
-                record_class = match.group(2)
-                record_type = match.group(3)
-                value = match.group(4)
+            fields = split_record_line(line)
+            if fields:
+                domain, record_class, record_type, value = fields
 
                 self.source_buffer.insert_with_tags(
                     self.source_buffer.get_end_iter(),
@@ -0,0 +1,406 @@
+# enrichment.py
+import asyncio
+import datetime
+import hashlib
+import logging
+import socket
+import ssl
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import tracing
+from .scan_model import HostRecord, ServiceRecord
+
+BANNER_BYTES = 512
+HTTP_PORTS = frozenset({80, 81, 591, 3000, 5000, 8000, 8008, 8080, 8081, 8888})
+TLS_PORTS = frozenset({443, 465, 636, 853, 990, 992, 993, 995, 5061, 8443, 9443})
+TLS_SERVICES = ("https", "ssl", "imaps", "pop3s", "smtps", "ldaps", "ftps")
+
+# Results are attached as port script output under the ids of the NSE
+# scripts that collect the same data, so they show up, are indexed and are
+# stored exactly like nmap's own script results.
+BANNER_SCRIPT = "banner"
+HTTP_SERVER_SCRIPT = "http-server-header"
+CERTIFICATE_SCRIPT = "ssl-cert"
+
+NAME_ATTRIBUTES = {
+    "2.5.4.3": "commonName",
+    "2.5.4.6": "countryName",
+    "2.5.4.7": "localityName",
+    "2.5.4.8": "stateOrProvinceName",
+    "2.5.4.10": "organizationName",
+    "2.5.4.11": "organizationalUnitName",
+}
+KEY_TYPES = {
+    "1.2.840.113549.1.1.1": "rsa",
+    "1.2.840.10045.2.1": "ec",
+    "1.3.101.112": "ed25519",
+    "1.3.101.113": "ed448",
+}
+EC_CURVE_BITS = {
+    "1.2.840.10045.3.1.7": 256,
+    "1.3.132.0.34": 384,
+    "1.3.132.0.35": 521,
+}
+SIGNATURE_ALGORITHMS = {
+    "1.2.840.113549.1.1.4": "md5WithRSAEncryption",
+    "1.2.840.113549.1.1.5": "sha1WithRSAEncryption",
+    "1.2.840.113549.1.1.11": "sha256WithRSAEncryption",
+    "1.2.840.113549.1.1.12": "sha384WithRSAEncryption",
+    "1.2.840.113549.1.1.13": "sha512WithRSAEncryption",
+    "1.2.840.113549.1.1.10": "rsassaPss",
+    "1.2.840.10045.4.1": "ecdsa-with-SHA1",
+    "1.2.840.10045.4.3.2": "ecdsa-with-SHA256",
+    "1.2.840.10045.4.3.3": "ecdsa-with-SHA384",
+    "1.2.840.10045.4.3.4": "ecdsa-with-SHA512",
+    "1.3.101.112": "ed25519",
+}
+SUBJECT_ALT_NAME_OID = "2.5.29.17"
+
+
+@dataclass(frozen=True)
+class EnrichmentOptions:
+    timeout: float = 3.0
+    concurrency: int = 64
+    banner_bytes: int = BANNER_BYTES
+
+
+@dataclass(frozen=True)
+class EnrichmentResult:
+    address: str
+    protocol: str
+    port: int
+    scripts: Dict[str, str]
+
+
+@dataclass
+class CertificateSummary:
+    """The fields of an X.509 certificate that a scan report needs."""
+
+    subject: Dict[str, str] = field(default_factory=dict)
+    issuer: Dict[str, str] = field(default_factory=dict)
+    alt_names: List[str] = field(default_factory=list)
+    not_before: Optional[datetime.datetime] = None
+    not_after: Optional[datetime.datetime] = None
+    key_type: str = ""
+    key_bits: int = 0
+    signature_algorithm: str = ""
+    sha256: str = ""
+
+    @property
+    def self_signed(self) -> bool:
+        return bool(self.subject) and self.subject == self.issuer
+
+    def to_text(self) -> str:
+        """Render the summary in the layout of nmap's ssl-cert script."""
+
+        def name(attributes: Dict[str, str]) -> str:
+            return "/".join(f"{key}={value}" for key, value in attributes.items())
+
+        lines = [f"Subject: {name(self.subject)}"]
+        if self.alt_names:
+            lines.append(f"Subject Alternative Name: {', '.join(self.alt_names)}")
+        lines.append(f"Issuer: {name(self.issuer)}")
+        if self.key_type:
+            lines.append(f"Public Key type: {self.key_type}")
+            lines.append(f"Public Key bits: {self.key_bits}")
+        if self.signature_algorithm:
+            lines.append(f"Signature Algorithm: {self.signature_algorithm}")
+        if self.not_before:
+            lines.append(f"Not valid before: {self.not_before.isoformat()}")
+        if self.not_after:
+            lines.append(f"Not valid after:  {self.not_after.isoformat()}")
+        lines.append(f"SHA-256: {self.sha256}")
+        return "\n".join(lines)
+
+
+def _read_tlv(data: bytes, offset: int) -> Tuple[int, int, int]:
+    """Return the tag and content bounds of the DER element at ``offset``."""
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset : offset + size], "big")
+        offset += size
+    if offset + length > len(data):
+        raise ValueError("Truncated DER element")
+    return tag, offset, offset + length
+
+
+def _children(data: bytes, start: int, end: int) -> List[Tuple[int, int, int]]:
+    items = []
+    while start < end:
+        item = _read_tlv(data, start)
+        items.append(item)
+        start = item[2]
+    return items
+
+
+def _oid(data: bytes) -> str:
+    first = data[0]
+    parts = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    value = 0
+    for byte in data[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(str(part) for part in parts)
+
+
+def _name(data: bytes, start: int, end: int) -> Dict[str, str]:
+    attributes = {}
+    for _, set_start, set_end in _children(data, start, end):
+        for _, seq_start, seq_end in _children(data, set_start, set_end):
+            (_, oid_start, oid_end), (_, value_start, value_end) = _children(
+                data, seq_start, seq_end
+            )[:2]
+            oid = _oid(data[oid_start:oid_end])
+            key = NAME_ATTRIBUTES.get(oid, oid)
+            attributes[key] = data[value_start:value_end].decode("utf-8", "replace")
+    return attributes
+
+
+def _time(data: bytes, tag: int) -> datetime.datetime:
+    text = data.decode("ascii").rstrip("Z")
+    if tag == 0x17:  # UTCTime, two-digit year
+        year = int(text[:2])
+        text = f"{1900 + year if year >= 50 else 2000 + year}{text[2:]}"
+    return datetime.datetime.strptime(text[:14], "%Y%m%d%H%M%S")
+
+
+def parse_certificate(der: bytes) -> CertificateSummary:
+    """
+    Summarize a DER-encoded certificate without a crypto library.
+
+    Raises:
+        ValueError: If the certificate is malformed.
+    """
+    summary = CertificateSummary(sha256=hashlib.sha256(der).hexdigest())
+    try:
+        _, cert_start, cert_end = _read_tlv(der, 0)
+        certificate = _children(der, cert_start, cert_end)
+        _, tbs_start, tbs_end = certificate[0]
+        _, alg_start, alg_end = certificate[1]
+        _, oid_start, oid_end = _children(der, alg_start, alg_end)[0]
+        oid = _oid(der[oid_start:oid_end])
+        summary.signature_algorithm = SIGNATURE_ALGORITHMS.get(oid, oid)
+
+        fields = _children(der, tbs_start, tbs_end)
+        if fields[0][0] == 0xA0:  # explicit version
+            fields = fields[1:]
+        _, _, issuer, validity, subject, key_info, *rest = fields
+        summary.issuer = _name(der, issuer[1], issuer[2])
+        summary.subject = _name(der, subject[1], subject[2])
+        not_before, not_after = _children(der, validity[1], validity[2])
+        summary.not_before = _time(der[not_before[1] : not_before[2]], not_before[0])
+        summary.not_after = _time(der[not_after[1] : not_after[2]], not_after[0])
+        summary.key_type, summary.key_bits = _public_key(der, key_info)
+        for tag, start, end in rest:
+            if tag == 0xA3:
+                summary.alt_names = _alt_names(der, start, end)
+    except (IndexError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed certificate: {e}")
+    return summary
+
+
+def _public_key(der: bytes, key_info: Tuple[int, int, int]) -> Tuple[str, int]:
+    algorithm, key = _children(der, key_info[1], key_info[2])[:2]
+    parameters = _children(der, algorithm[1], algorithm[2])
+    oid = _oid(der[parameters[0][1] : parameters[0][2]])
+    key_type = KEY_TYPES.get(oid, oid)
+    if key_type == "rsa":
+        # BIT STRING: one unused-bits byte, then SEQUENCE { modulus, exponent }.
+        _, seq_start, seq_end = _read_tlv(der, key[1] + 1)
+        _, mod_start, mod_end = _children(der, seq_start, seq_end)[0]
+        return key_type, int.from_bytes(der[mod_start:mod_end], "big").bit_length()
+    if key_type == "ec" and len(parameters) > 1:
+        curve = _oid(der[parameters[1][1] : parameters[1][2]])
+        return key_type, EC_CURVE_BITS.get(curve, 0)
+    if key_type == "ed25519":
+        return key_type, 256
+    return key_type, (key[2] - key[1] - 1) * 8
+
+
+def _alt_names(der: bytes, start: int, end: int) -> List[str]:
+    _, seq_start, seq_end = _read_tlv(der, start)
+    for _, ext_start, ext_end in _children(der, seq_start, seq_end):
+        parts = _children(der, ext_start, ext_end)
+        if _oid(der[parts[0][1] : parts[0][2]]) != SUBJECT_ALT_NAME_OID:
+            continue
+        value = parts[-1]  # OCTET STRING wrapping SEQUENCE OF GeneralName
+        _, names_start, names_end = _read_tlv(der, value[1])
+        names = []
+        for tag, name_start, name_end in _children(der, names_start, names_end):
+            raw = der[name_start:name_end]
+            if tag == 0x82:
+                names.append(f"DNS:{raw.decode('ascii', 'replace')}")
+            elif tag == 0x87:
+                family = socket.AF_INET if len(raw) == 4 else socket.AF_INET6
+                names.append(f"IP Address:{socket.inet_ntop(family, raw)}")
+        return names
+    return []
+
+
+def unverified_tls_context() -> ssl.SSLContext:
+    # Enrichment describes whatever the service presents, so nothing is
+    # verified and legacy protocol versions are allowed where OpenSSL can.
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+        context.set_ciphers("DEFAULT:@SECLEVEL=0")
+    except (ValueError, ssl.SSLError):
+        pass
+    return context
+
+
+def is_tls_port(port: int, service: ServiceRecord) -> bool:
+    name = service.name.lower()
+    return port in TLS_PORTS or any(hint in name for hint in TLS_SERVICES)
+
+
+def is_http_port(port: int, service: ServiceRecord) -> bool:
+    return port in HTTP_PORTS or "http" in service.name.lower()
+
+
+class Enricher:
+    """
+    Post-scan enrichment of open TCP ports.
+
+    For every open port it opens one connection and, depending on the port
+    and the service nmap guessed, records the TLS certificate, the HTTP
+    ``Server`` header, or the first bytes the service sends. Every port is
+    bounded by ``timeout`` and at most ``concurrency`` ports are worked on
+    at once, so enriching a range costs one short connection per open port
+    instead of a second nmap pass with ``-A``.
+    """
+
+    def __init__(self, options: EnrichmentOptions = EnrichmentOptions()):
+        self.options = options
+        self.cancelled = threading.Event()
+        self._tls_context = unverified_tls_context()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    @tracing.traced("enrich.run", "scan")
+    def run(
+        self,
+        hosts: Iterable[HostRecord],
+        on_result: Optional[Callable[[EnrichmentResult], None]] = None,
+    ) -> List[EnrichmentResult]:
+        return asyncio.run(self.enrich(hosts, on_result))
+
+    async def enrich(
+        self,
+        hosts: Iterable[HostRecord],
+        on_result: Optional[Callable[[EnrichmentResult], None]] = None,
+    ) -> List[EnrichmentResult]:
+        results: List[EnrichmentResult] = []
+        slots = asyncio.Semaphore(self.options.concurrency)
+        tasks = set()
+
+        async def enrich_one(host: HostRecord, port: int, service: ServiceRecord):
+            try:
+                result = await asyncio.wait_for(
+                    self.enrich_port(host, port, service), self.options.timeout
+                )
+            except (asyncio.TimeoutError, OSError, ssl.SSLError) as e:
+                logging.debug(f"No enrichment for {host.address}:{port}: {e!r}")
+                result = None
+            except Exception as e:
+                logging.error(f"Enrichment of {host.address}:{port} failed: {e}")
+                result = None
+            finally:
+                slots.release()
+            if result is not None:
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        for host in hosts:
+            for (protocol, port), service in host.open_ports().items():
+                if protocol != "tcp":
+                    continue
+                if self.cancelled.is_set():
+                    break
+                await slots.acquire()
+                task = asyncio.create_task(enrich_one(host, port, service))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return results
+
+    async def enrich_port(
+        self, host: HostRecord, port: int, service: ServiceRecord
+    ) -> Optional[EnrichmentResult]:
+        scripts: Dict[str, str] = {}
+        tls = is_tls_port(port, service)
+        http = is_http_port(port, service)
+        server_hostname = host.hostname if tls else None
+        reader, writer = await asyncio.open_connection(
+            host.address,
+            port,
+            ssl=self._tls_context if tls else None,
+            server_hostname=server_hostname,
+        )
+        try:
+            if tls:
+                ssl_object = writer.get_extra_info("ssl_object")
+                der = ssl_object.getpeercert(binary_form=True) if ssl_object else None
+                if der:
+                    scripts[CERTIFICATE_SCRIPT] = self._describe_certificate(
+                        der, ssl_object
+                    )
+            if http:
+                header = await self._http_server_header(reader, writer, host, port)
+                if header:
+                    scripts[HTTP_SERVER_SCRIPT] = header
+            elif not tls:
+                banner = await self._banner(reader)
+                if banner:
+                    scripts[BANNER_SCRIPT] = banner
+        finally:
+            writer.close()
+        if not scripts:
+            return None
+        return EnrichmentResult(host.address, "tcp", port, scripts)
+
+    @staticmethod
+    def _describe_certificate(der: bytes, ssl_object: ssl.SSLObject) -> str:
+        try:
+            text = parse_certificate(der).to_text()
+        except ValueError as e:
+            text = f"{e}\nSHA-256: {hashlib.sha256(der).hexdigest()}"
+        cipher = ssl_object.cipher()
+        if cipher:
+            text += f"\nProtocol: {ssl_object.version()}, cipher {cipher[0]}"
+        return text
+
+    async def _http_server_header(self, reader, writer, host: HostRecord, port: int) -> str:
+        name = host.hostname or host.address
+        if ":" in name:
+            name = f"[{name}]"
+        writer.write(
+            f"HEAD / HTTP/1.0\r\nHost: {name}:{port}\r\nUser-Agent: woes\r\n\r\n".encode()
+        )
+        await writer.drain()
+        await reader.readline()  # status line
+        while True:
+            line = await reader.readline()
+            if not line or line in (b"\r\n", b"\n"):
+                return ""
+            text = line.decode("latin-1").strip()
+            if text.lower().startswith("server:"):
+                return text.split(":", 1)[1].strip()
+
+    async def _banner(self, reader) -> str:
+        # Services that speak first (SSH, SMTP, FTP, ...) answer within the
+        # per-port timeout; silent ones simply time out with no result.
+        data = await reader.read(self.options.banner_bytes)
+        return data.decode("latin-1").strip().encode("unicode_escape").decode("ascii")
@@ -0,0 +1,364 @@
+# export.py
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Iterable, Optional, Set, TextIO
+from xml.sax.saxutils import XMLGenerator
+
+from . import tracing
+from .nse import HOST_SCRIPTS, NSE_EXTRA_KEY
+from .scan_model import HostRecord
+
+CSV_COLUMNS = (
+    "address",
+    "hostname",
+    "state",
+    "reason",
+    "os",
+    "protocol",
+    "port",
+    "port_state",
+    "port_reason",
+    "service",
+    "product",
+    "version",
+    "extrainfo",
+    "cpe",
+    "scripts",
+)
+
+# Records are flushed to disk in batches of this many hosts.
+EXPORT_BATCH_SIZE = 256
+
+
+class ExportFormat(Enum):
+    JSONL = ("jsonl", "JSON Lines")
+    CSV = ("csv", "CSV")
+    XML = ("xml", "Nmap XML")
+
+    @property
+    def extension(self) -> str:
+        return self.value[0]
+
+    @property
+    def label(self) -> str:
+        return self.value[1]
+
+    @classmethod
+    def from_path(cls, path: str) -> "ExportFormat":
+        extension = os.path.splitext(path)[1].lstrip(".").lower()
+        for export_format in cls:
+            if export_format.extension == extension:
+                return export_format
+        return cls.JSONL
+
+
+class ExportWriter:
+    """Writes host records to a text stream one at a time."""
+
+    def __init__(self, stream: TextIO, info: Optional[dict] = None):
+        self.stream = stream
+        self.info = info or {}
+        self.count = 0
+
+    def begin(self):
+        pass
+
+    def write(self, host: HostRecord):
+        raise NotImplementedError
+
+    def end(self):
+        pass
+
+
+class JsonlWriter(ExportWriter):
+    """One JSON object per host, in the nmap-shaped layout of the YAML view."""
+
+    def write(self, host: HostRecord):
+        host_data = host.to_dict()
+        host_data["address"] = host.address
+        self.stream.write(json.dumps(host_data, default=str))
+        self.stream.write("\n")
+        self.count += 1
+
+
+class CsvWriter(ExportWriter):
+    """One row per host and port; hosts without ports get a single row."""
+
+    def begin(self):
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(CSV_COLUMNS)
+
+    def write(self, host: HostRecord):
+        prefix = [
+            host.address,
+            host.hostname or "",
+            host.state,
+            host.reason,
+            host.os_name or "",
+        ]
+        rows = []
+        for port in host.ports:
+            service = port.service
+            rows.append(
+                prefix
+                + [
+                    port.protocol,
+                    port.port,
+                    port.state,
+                    port.reason,
+                    service.name,
+                    service.product,
+                    service.version,
+                    service.extrainfo,
+                    service.cpe,
+                    json.dumps(port.scripts) if port.scripts else "",
+                ]
+            )
+        if not rows:
+            rows.append(prefix + [""] * 9 + [json.dumps(host.scripts) if host.scripts else ""])
+        self.writer.writerows(rows)
+        self.count += 1
+
+
+class NmapXmlWriter(ExportWriter):
+    """
+    Nmap's ``-oX`` layout, regenerated from the records, so tools that read
+    nmap XML can take the export. Structured NSE data is written back as
+    ``<elem>`` and ``<table>`` children of each script.
+    """
+
+    def begin(self):
+        self.xml = XMLGenerator(self.stream, encoding="utf-8", short_empty_elements=True)
+        self.xml.startDocument()
+        self.started = self.info.get("started_at") or time.time()
+        self.up = 0
+        arguments = f"{self.info.get('arguments', '')} {self.info.get('target', '')}"
+        self.xml.startElement(
+            "nmaprun",
+            {
+                "scanner": "nmap",
+                "args": f"nmap {arguments.strip()}".strip(),
+                "start": str(int(self.started)),
+                "xmloutputversion": "1.05",
+            },
+        )
+        self.xml.ignorableWhitespace("\n")
+
+    def _element(self, name: str, attributes: dict):
+        self.xml.startElement(name, {key: str(value) for key, value in attributes.items()})
+        self.xml.endElement(name)
+
+    def _data(self, value: Any):
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = ((None, item) for item in value)
+        else:
+            return
+        for key, item in items:
+            attributes = {"key": str(key)} if key is not None else {}
+            if isinstance(item, (dict, list)):
+                self.xml.startElement("table", attributes)
+                self._data(item)
+                self.xml.endElement("table")
+            else:
+                self.xml.startElement("elem", attributes)
+                if item is not None:
+                    self.xml.characters(str(item).lower() if isinstance(item, bool) else str(item))
+                self.xml.endElement("elem")
+
+    def _scripts(self, scripts: Optional[dict], data: dict):
+        for script_id, output in (scripts or {}).items():
+            self.xml.startElement("script", {"id": script_id, "output": output or ""})
+            self._data(data.get(script_id))
+            self.xml.endElement("script")
+
+    def write(self, host: HostRecord):
+        xml = self.xml
+        nse = (host.extra or {}).get(NSE_EXTRA_KEY) or {}
+        if host.state == "up":
+            self.up += 1
+        xml.startElement("host", {})
+        self._element("status", {"state": host.state, "reason": host.reason})
+        self._element(
+            "address",
+            {"addr": host.address, "addrtype": "ipv6" if ":" in host.address else "ipv4"},
+        )
+        xml.startElement("hostnames", {})
+        for name, kind in host.hostnames:
+            self._element("hostname", {"name": name, "type": kind})
+        xml.endElement("hostnames")
+
+        xml.startElement("ports", {})
+        for port in host.ports:
+            xml.startElement("port", {"protocol": port.protocol, "portid": str(port.port)})
+            self._element("state", {"state": port.state, "reason": port.reason})
+            service = port.service
+            if service.name or service.product:
+                attributes = {
+                    field: value
+                    for field, value in (
+                        ("name", service.name),
+                        ("product", service.product),
+                        ("version", service.version),
+                        ("extrainfo", service.extrainfo),
+                        ("conf", service.conf),
+                    )
+                    if value
+                }
+                xml.startElement("service", attributes)
+                if service.cpe:
+                    xml.startElement("cpe", {})
+                    xml.characters(service.cpe)
+                    xml.endElement("cpe")
+                xml.endElement("service")
+            self._scripts(port.scripts, nse.get(f"{port.port}/{port.protocol}") or {})
+            xml.endElement("port")
+        xml.endElement("ports")
+
+        if host.os_name:
+            xml.startElement("os", {})
+            self._element("osmatch", {"name": host.os_name, "accuracy": host.os_accuracy or 0})
+            xml.endElement("os")
+        if host.scripts:
+            xml.startElement("hostscript", {})
+            self._scripts(host.scripts, nse.get(HOST_SCRIPTS) or {})
+            xml.endElement("hostscript")
+        xml.endElement("host")
+        self.xml.ignorableWhitespace("\n")
+        self.count += 1
+
+    def end(self):
+        finished = time.time()
+        self.xml.startElement("runstats", {})
+        self._element(
+            "finished",
+            {"time": int(finished), "elapsed": f"{finished - self.started:.2f}", "exit": "success"},
+        )
+        self._element(
+            "hosts", {"up": self.up, "down": self.count - self.up, "total": self.count}
+        )
+        self.xml.endElement("runstats")
+        self.xml.endElement("nmaprun")
+        self.xml.endDocument()
+        self.stream.write("\n")
+
+
+WRITERS = {
+    ExportFormat.JSONL: JsonlWriter,
+    ExportFormat.CSV: CsvWriter,
+    ExportFormat.XML: NmapXmlWriter,
+}
+
+
+def open_export(path: str):
+    """Open the temporary file an export is written to before it is renamed."""
+    return open(f"{path}.part", "w", encoding="utf-8", newline="")
+
+
+@tracing.traced("export.records", "export")
+def export_records(
+    records: Iterable[HostRecord],
+    path: str,
+    export_format: ExportFormat,
+    info: Optional[dict] = None,
+) -> int:
+    """
+    Write ``records`` to ``path``, consuming them one at a time.
+
+    The export is written next to ``path`` and renamed into place when
+    complete, so readers never see a partial file.
+
+    Returns:
+        int: The number of hosts written.
+    """
+    with open_export(path) as stream:
+        writer = WRITERS[export_format](stream, info)
+        writer.begin()
+        for record in records:
+            writer.write(record)
+        writer.end()
+    os.replace(f"{path}.part", path)
+    logging.info(f"Exported {writer.count} hosts to {path}")
+    return writer.count
+
+
+class ResultExport:
+    """
+    An export that runs on its own thread while results are still arriving.
+
+    ``feed()`` only queues references to records the caller already holds,
+    so it never blocks; the thread writes them out as it gets to them. Each
+    address is written once, so records can be fed again at the end of a
+    scan without duplicating the ones that were streamed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        export_format: ExportFormat,
+        info: Optional[dict] = None,
+        on_done: Optional[Callable[[int, Optional[str]], None]] = None,
+    ):
+        self.path = path
+        self.export_format = export_format
+        self.info = info
+        self.on_done = on_done
+        self.queue: "queue.Queue[Optional[list]]" = queue.Queue()
+        self.written: Set[str] = set()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "ResultExport":
+        self.thread.start()
+        return self
+
+    def feed(self, records: Iterable[HostRecord]):
+        batch = list(records)
+        if batch:
+            self.queue.put(batch)
+
+    def finish(self):
+        self.queue.put(None)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.queue.put(None)
+
+    def _run(self):
+        error = None
+        count = 0
+        try:
+            with open_export(self.path) as stream:
+                writer = WRITERS[self.export_format](stream, self.info)
+                writer.begin()
+                while True:
+                    batch = self.queue.get()
+                    if batch is None or self.cancelled.is_set():
+                        break
+                    for record in batch:
+                        if record.address in self.written:
+                            continue
+                        self.written.add(record.address)
+                        writer.write(record)
+                        if writer.count % EXPORT_BATCH_SIZE == 0:
+                            stream.flush()
+                writer.end()
+                count = writer.count
+            if self.cancelled.is_set():
+                os.remove(f"{self.path}.part")
+                error = "Export cancelled"
+            else:
+                os.replace(f"{self.path}.part", self.path)
+                logging.info(f"Exported {count} hosts to {self.path}")
+        except Exception as e:
+            logging.error(f"Export to {self.path} failed: {e}")
+            error = str(e)
+        if self.on_done:
+            self.on_done(count, error)
@@ -0,0 +1,286 @@
+# frame_dispatcher.py
+"""
+Applies updates from worker threads to the UI once per frame.
+
+Scans report results far faster than the screen refreshes. Queuing one
+idle callback per result swamps the main loop, so workers post updates
+here instead and a tick callback applies them in batches, within a time
+budget, once per frame. Each update has a policy:
+
+- ``call``: run once, in order; never dropped.
+- ``replace``: keyed; a newer update replaces a pending one, for progress
+  and status text only the latest of which matters.
+- ``merge``: keyed deltas (dicts or lists) folded into the pending batch,
+  so a thousand new hosts become one model splice. Workers posting merges
+  wait while too many items are pending, which keeps memory bounded when
+  the UI cannot keep up.
+
+Updates keep their order, so a batch posted after ``begin`` and before
+``finish`` is applied between them. Frame ticks only run while the widget
+is mapped; while it is hidden, a timer drains the queue instead.
+"""
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+from gi.repository import GLib
+
+from . import metrics, tracing
+
+# Seconds of each frame spent applying updates before the rest wait.
+FRAME_BUDGET = 0.008
+# Items handed to a merge callback at once.
+BATCH_SIZE = 2000
+# Pending merge items at which posting workers wait for the UI.
+MAX_PENDING = 50_000
+# Drain interval while the widget is not mapped.
+UNMAPPED_INTERVAL_MS = 100
+# Frames kept for the statistics.
+STATS_FRAMES = 240
+
+CALL, REPLACE, MERGE = "call", "replace", "merge"
+
+
+class _Update:
+    __slots__ = ("policy", "key", "function", "args", "items")
+
+    def __init__(self, policy: str, key: Any, function: Callable, args: tuple, items=None):
+        self.policy = policy
+        self.key = key
+        self.function = function
+        self.args = args
+        self.items = items
+
+    def take(self, count: int):
+        """Split off up to ``count`` merge items, leaving the rest pending."""
+        if len(self.items) <= count:
+            items, self.items = self.items, type(self.items)()
+        elif isinstance(self.items, dict):
+            keys = list(self.items)[:count]
+            items = {key: self.items.pop(key) for key in keys}
+        else:
+            items, self.items = self.items[:count], self.items[count:]
+        return items
+
+
+@dataclass(frozen=True)
+class FrameStats:
+    frames: int
+    applied: int
+    merged: int
+    replaced: int
+    pending: int
+    apply_ms_p50: float
+    apply_ms_p95: float
+    apply_ms_max: float
+    interval_ms_p95: float
+
+
+class FrameDispatcher:
+    def __init__(
+        self,
+        widget,
+        frame_budget: float = FRAME_BUDGET,
+        batch_size: int = BATCH_SIZE,
+        max_pending: int = MAX_PENDING,
+    ):
+        self.widget = widget
+        self.frame_budget = frame_budget
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.closed = False
+        self._queue: Deque[_Update] = deque()
+        self._replaceable: Dict[Any, _Update] = {}
+        self._pending_items = 0
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._armed = False
+        self._tick_id = 0
+        self._timeout_id = 0
+        self._last_frame_time = 0
+        self._apply_times: Deque[float] = deque(maxlen=STATS_FRAMES)
+        self._intervals: Deque[float] = deque(maxlen=STATS_FRAMES)
+        self._counts = {"frames": 0, "applied": 0, MERGE: 0, REPLACE: 0}
+        widget.connect("unmap", self._on_unmap)
+
+    def call(self, function: Callable[..., Any], *args):
+        """Run ``function(*args)`` on the main loop, in order with other updates."""
+        with self._lock:
+            self._queue.append(_Update(CALL, None, function, args))
+            self._arm()
+
+    def replace(self, key: Any, function: Callable[..., Any], *args):
+        """Like ``call``, but only the latest pending update for ``key`` runs."""
+        with self._lock:
+            pending = self._replaceable.get(key)
+            if pending is not None:
+                pending.function, pending.args = function, args
+                self._counts[REPLACE] += 1
+                metrics.UI_UPDATES.inc(policy=REPLACE)
+                return
+            update = self._replaceable[key] = _Update(REPLACE, key, function, args)
+            self._queue.append(update)
+            self._arm()
+
+    def merge(self, key: Any, function: Callable[[Any], Any], items):
+        """
+        Fold ``items`` (a dict or a list) into the pending batch for ``key``
+        and call ``function(batch)`` with it. Blocks a worker thread while
+        the queue is full.
+        """
+        if not items:
+            return
+        with self._lock:
+            if threading.current_thread() is not threading.main_thread():
+                while self._pending_items >= self.max_pending and not self.closed:
+                    self._drained.wait(timeout=1.0)
+            last = self._queue[-1] if self._queue else None
+            if last is not None and last.policy == MERGE and last.key == key:
+                before = len(last.items)
+                if isinstance(last.items, dict):
+                    last.items.update(items)
+                else:
+                    last.items.extend(items)
+                self._pending_items += len(last.items) - before
+                self._counts[MERGE] += 1
+                metrics.UI_UPDATES.inc(policy=MERGE)
+            else:
+                batch = dict(items) if isinstance(items, dict) else list(items)
+                self._queue.append(_Update(MERGE, key, function, (), batch))
+                self._pending_items += len(batch)
+            metrics.UI_PENDING.set(self._pending_items)
+            self._arm()
+
+    def _arm(self):
+        # Called with the lock held, from any thread.
+        if not self._armed and not self.closed:
+            self._armed = True
+            GLib.idle_add(self._schedule)
+
+    def _schedule(self):
+        if self.closed:
+            return GLib.SOURCE_REMOVE
+        if self.widget.get_mapped():
+            if not self._tick_id:
+                self._last_frame_time = 0
+                self._tick_id = self.widget.add_tick_callback(self._on_tick)
+        elif not self._timeout_id:
+            self._timeout_id = GLib.timeout_add(UNMAPPED_INTERVAL_MS, self._on_timeout)
+        return GLib.SOURCE_REMOVE
+
+    def _on_unmap(self, widget):
+        # Ticks stop while the widget is unmapped; drain on a timer instead.
+        if self._tick_id:
+            self.widget.remove_tick_callback(self._tick_id)
+            self._tick_id = 0
+            if not self._timeout_id:
+                self._timeout_id = GLib.timeout_add(UNMAPPED_INTERVAL_MS, self._on_timeout)
+
+    def _on_tick(self, widget, frame_clock):
+        frame_time = frame_clock.get_frame_time()
+        if self._last_frame_time:
+            self._intervals.append((frame_time - self._last_frame_time) / 1000)
+        self._last_frame_time = frame_time
+        if self._apply_frame():
+            return GLib.SOURCE_CONTINUE
+        self._tick_id = 0
+        return GLib.SOURCE_REMOVE
+
+    def _on_timeout(self):
+        if self._apply_frame():
+            if self.widget.get_mapped() and not self._tick_id:
+                self._timeout_id = 0
+                self._last_frame_time = 0
+                self._tick_id = self.widget.add_tick_callback(self._on_tick)
+                return GLib.SOURCE_REMOVE
+            return GLib.SOURCE_CONTINUE
+        self._timeout_id = 0
+        return GLib.SOURCE_REMOVE
+
+    def _next(self) -> Optional[tuple]:
+        """The next update to apply, or None once the queue is empty."""
+        with self._lock:
+            while self._queue:
+                update = self._queue[0]
+                if update.policy != MERGE:
+                    self._queue.popleft()
+                    if update.policy == REPLACE:
+                        del self._replaceable[update.key]
+                    return update.function, update.args
+                items = update.take(self.batch_size)
+                if not update.items:
+                    self._queue.popleft()
+                self._pending_items -= len(items)
+                metrics.UI_PENDING.set(self._pending_items)
+                if self._pending_items < self.max_pending:
+                    self._drained.notify_all()
+                if items:
+                    return update.function, (items,)
+            self._armed = False
+            return None
+
+    def _apply_frame(self, budget: Optional[float] = None) -> bool:
+        """Apply updates for one frame; returns whether any are left."""
+        if self.closed:
+            return False
+        budget = self.frame_budget if budget is None else budget
+        started = time.perf_counter()
+        applied = 0
+        more = True
+        with tracing.span("ui.apply_frame", "render") as span:
+            while time.perf_counter() - started < budget:
+                update = self._next()
+                if update is None:
+                    more = False
+                    break
+                function, args = update
+                try:
+                    function(*args)
+                except Exception:
+                    logging.exception(f"UI update {function!r} failed")
+                applied += 1
+            span.set(updates=applied, more=more)
+        elapsed = time.perf_counter() - started
+        self._apply_times.append(elapsed * 1000)
+        self._counts["frames"] += 1
+        self._counts["applied"] += applied
+        metrics.UI_FRAME_SECONDS.observe(elapsed)
+        metrics.UI_UPDATES.inc(applied, policy="applied")
+        return more
+
+    def flush(self):
+        """Apply everything pending now; main thread only."""
+        self._apply_frame(budget=float("inf"))
+
+    def close(self):
+        """Drop pending updates and release waiting workers."""
+        with self._lock:
+            self.closed = True
+            self._queue.clear()
+            self._replaceable.clear()
+            self._pending_items = 0
+            self._drained.notify_all()
+        metrics.UI_PENDING.set(0)
+
+    def stats(self) -> FrameStats:
+        apply_times = sorted(self._apply_times) or [0.0]
+        intervals = sorted(self._intervals) or [0.0]
+        with self._lock:
+            pending = self._pending_items + sum(
+                1 for update in self._queue if update.policy != MERGE
+            )
+        return FrameStats(
+            frames=self._counts["frames"],
+            applied=self._counts["applied"],
+            merged=self._counts[MERGE],
+            replaced=self._counts[REPLACE],
+            pending=pending,
+            apply_ms_p50=statistics.median(apply_times),
+            apply_ms_p95=apply_times[int(0.95 * (len(apply_times) - 1))],
+            apply_ms_max=apply_times[-1],
+            interval_ms_p95=intervals[int(0.95 * (len(intervals) - 1))],
+        )
@@ -1,5 +1,104 @@
 # helper.py
-from gi.repository import Gdk, Gtk
+"""
+Copying from a Gtk.ColumnView.
+
+Copy takes the selected items from the selection model's bitset and puts
+a ``SelectedRows`` snapshot on the clipboard. Nothing is serialized until
+something pastes: GDK then asks the serializers registered below for the
+format the consumer wants, TSV or JSON, so copying tens of thousands of
+rows costs no more than collecting the items.
+"""
+import json
+from typing import Sequence, Tuple
+
+from gi.repository import Gdk, GLib, GObject, Gtk
+
+# (heading, item attribute) pairs copied when a page does not name its own.
+DEFAULT_FIELDS = (("Key", "key"), ("Value", "value"))
+TSV_MIME_TYPE = "text/tab-separated-values"
+JSON_MIME_TYPE = "application/json"
+TEXT_MIME_TYPES = ("text/plain;charset=utf-8", "text/plain")
+
+
+class SelectedRows(GObject.Object):
+    """The items selected when copying, rendered when pasted."""
+
+    __gtype_name__ = "SelectedRows"
+
+    def __init__(self, items: list, fields: Sequence[Tuple[str, str]], text_format: str = "tsv"):
+        super().__init__()
+        self.items = items
+        self.fields = tuple(fields)
+        # What plain text pastes as: "tsv" rows, or "json".
+        self.text_format = text_format
+
+    def records(self) -> list:
+        return [
+            {attr: getattr(item, attr, None) for _, attr in self.fields} for item in self.items
+        ]
+
+    def to_tsv(self, heading: bool = True) -> str:
+        lines = ["\t".join(title for title, _ in self.fields)] if heading else []
+        for item in self.items:
+            lines.append(
+                "\t".join(_tsv_cell(getattr(item, attr, "")) for _, attr in self.fields)
+            )
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> str:
+        return json.dumps(self.records(), indent=2, default=str)
+
+    def to_text(self) -> str:
+        return self.to_json() if self.text_format == "json" else self.to_tsv(heading=False)
+
+
+def _tsv_cell(value) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+def _serialize(serializer: Gdk.ContentSerializer, render):
+    data = render(serializer.get_value()).encode("utf-8")
+
+    def on_written(stream, result):
+        try:
+            stream.write_all_finish(result)
+        except GLib.Error as e:
+            serializer.return_error(e)
+            return
+        serializer.return_success()
+
+    serializer.get_output_stream().write_all_async(
+        data, serializer.get_priority(), serializer.get_cancellable(), on_written
+    )
+
+
+def _register_serializers():
+    gtype = SelectedRows.__gtype__
+    for mime_type in TEXT_MIME_TYPES:
+        Gdk.content_register_serializer(
+            gtype, mime_type, lambda serializer: _serialize(serializer, SelectedRows.to_text)
+        )
+    Gdk.content_register_serializer(
+        gtype, TSV_MIME_TYPE, lambda serializer: _serialize(serializer, SelectedRows.to_tsv)
+    )
+    Gdk.content_register_serializer(
+        gtype, JSON_MIME_TYPE, lambda serializer: _serialize(serializer, SelectedRows.to_json)
+    )
+
+
+_register_serializers()
+
+
+def selected_items(selection_model: Gtk.SelectionModel) -> list:
+    """The selected items, read from the model's selection bitset."""
+    items = []
+    found, bitset_iter, position = Gtk.BitsetIter.init_first(selection_model.get_selection())
+    while found:
+        items.append(selection_model.get_item(position))
+        found, position = bitset_iter.next()
+    return items
 
 
 class Helper:
@@ -8,16 +107,18 @@ class Helper:
     to a Gtk.ColumnView widget.
     """
 
-    def __init__(self, widget, parent_window):
+    def __init__(self, widget, parent_window, fields: Sequence[Tuple[str, str]] = DEFAULT_FIELDS):
         """
         Initialize the Helper class.
 
         Args:
             widget (Gtk.Widget): The widget to which the helper is attached.
             parent_window (Gtk.Window): The parent window containing the widget.
+            fields: (heading, item attribute) pairs to copy for each selected row.
         """
         self.widget = widget
         self.parent_window = parent_window
+        self.fields = fields
 
         if isinstance(self.widget, Gtk.ColumnView):
             self.setup_keyboard_shortcut()
@@ -41,6 +142,9 @@ class Helper:
         copy_button = Gtk.Button(label="Copy")
         copy_button.connect("clicked", self.on_copy_menu_item_activated)
         vbox.append(copy_button)
+        copy_json_button = Gtk.Button(label="Copy as JSON")
+        copy_json_button.connect("clicked", self.on_copy_menu_item_activated, "json")
+        vbox.append(copy_json_button)
         self.popover.set_child(vbox)
 
         gesture = Gtk.GestureClick()
@@ -69,20 +173,22 @@ class Helper:
             self.popover.set_parent(self.widget)
             self.popover.popup()
 
-    def on_copy_menu_item_activated(self, button):
+    def on_copy_menu_item_activated(self, button, text_format="tsv"):
         """
         Handle the activation of the copy menu item by copying selected content
         to the clipboard and hiding the popover.
 
         Args:
             button (Gtk.Button): The button that triggered the event.
+            text_format (str): What the copy pastes as in plain text, "tsv" or "json".
         """
-        self.copy_to_clipboard()
+        self.copy_to_clipboard(text_format)
         self.popover.popdown()
 
     def on_key_pressed(self, controller, keyval, keycode, state):
         """
-        Handle the Ctrl+C keyboard shortcut to copy selected content to the clipboard.
+        Handle the Ctrl+C keyboard shortcut to copy selected content to the
+        clipboard, and Ctrl+Shift+C to copy it as JSON.
 
         Args:
             controller (Gtk.EventControllerKey): The key controller that triggered the event.
@@ -96,31 +202,26 @@ class Helper:
         if state & Gdk.ModifierType.CONTROL_MASK and keyval == Gdk.KEY_c:
             self.copy_to_clipboard()
             return True
+        if state & Gdk.ModifierType.CONTROL_MASK and keyval == Gdk.KEY_C:
+            self.copy_to_clipboard("json")
+            return True
         return False
 
-    def copy_to_clipboard(self):
+    def copy_to_clipboard(self, text_format: str = "tsv"):
         """
-        Copy the selected content from the Gtk.ColumnView to the clipboard.
+        Copy the selected rows of the Gtk.ColumnView to the clipboard. The
+        rows are serialized when pasted, as TSV or JSON.
+
+        Args:
+            text_format (str): What the rows paste as in plain text, "tsv" or "json".
         """
-        if isinstance(self.widget, Gtk.ColumnView):
-            selection_model = self.widget.get_model()
-            selected_texts = []
-
-            if isinstance(selection_model, Gtk.MultiSelection):
-                for index in range(selection_model.get_n_items()):
-                    if selection_model.is_selected(index):
-                        selected_item = selection_model.get_item(index)
-                        selected_texts.append(
-                            f"{selected_item.key}: {selected_item.value}"
-                        )
-
-            elif isinstance(selection_model, Gtk.SingleSelection):
-                selected_item = selection_model.get_selected_item()
-                if selected_item:
-                    selected_texts.append(f"{selected_item.key}: {selected_item.value}")
-
-            if selected_texts:
-                clipboard_text = "\n".join(selected_texts)
-                clipboard = self.widget.get_clipboard()
-                content_provider = Gdk.ContentProvider.new_for_value(clipboard_text)
-                clipboard.set_content(content_provider)
+        if not isinstance(self.widget, Gtk.ColumnView):
+            return
+        selection_model = self.widget.get_model()
+        if selection_model is None:
+            return
+        items = selected_items(selection_model)
+        if items:
+            rows = SelectedRows(items, self.fields, text_format)
+            content_provider = Gdk.ContentProvider.new_for_value(rows)
+            self.widget.get_clipboard().set_content(content_provider)
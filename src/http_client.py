@@ -0,0 +1,168 @@
+# http_client.py
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from . import metrics, tracing
+
+AKAMAI_PRAGMA_DIRECTIVES = (
+    "akamai-x-get-request-id",
+    "akamai-x-get-cache-key",
+    "akamai-x-cache-on",
+    "akamai-x-cache-remote-on",
+    "akamai-x-get-true-cache-key",
+    "akamai-x-check-cacheable",
+    "akamai-x-get-extracted-values",
+    "akamai-x-feo-trace",
+    "x-akamai-logging-mode: verbose",
+)
+
+# Header values are wrapped to this many characters in the HTTP page.
+WRAP_WIDTH = 80
+URL_REGEX = re.compile(
+    r"^(?:http|https)://"
+    r"(?:\S+(?::\S*)?@)?"
+    r"(?:[A-Za-z0-9.-]+\.[A-Za-z]{2,}|localhost|"
+    r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|"
+    r"\[?[A-Fa-f0-9]*:[A-Fa-f0-9:]+\]?)"
+    r"(?::\d+)?"
+    r"(?:/?|[/?]\S+)$",
+    re.IGNORECASE,
+)
+
+
+class HttpError(Exception):
+    """A failed header fetch, with a short title and a detail message."""
+
+    def __init__(self, title: str, detail: str, status: Optional[int] = None):
+        super().__init__(f"{title}: {detail}")
+        self.title = title
+        self.detail = detail
+        self.status = status
+
+
+@dataclass
+class HttpResponse:
+    url: str
+    status: int
+    reason: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "status": self.status,
+            "reason": self.reason,
+            "elapsed_ms": self.elapsed_ms,
+            "headers": self.headers,
+        }
+
+
+def ensure_scheme(url: str) -> str:
+    if not urlparse(url).scheme:
+        url = "https://" + url
+    return url
+
+
+def is_valid_url(url: str) -> bool:
+    return URL_REGEX.match(url) is not None and bool(urlparse(url).netloc)
+
+
+def request_headers(use_akamai_pragma: bool) -> Dict[str, str]:
+    if use_akamai_pragma:
+        return {"Pragma": ", ".join(AKAMAI_PRAGMA_DIRECTIVES)}
+    return {}
+
+
+def format_status_error(status: int, reason: str) -> HttpError:
+    # Keep the specific messages for the most common failures.
+    if status == 404:
+        return HttpError(
+            "404 Not Found", "The requested URL was not found on this server.", status
+        )
+    if status == 403:
+        return HttpError(
+            "403 Forbidden", "You don't have permission to access this URL.", status
+        )
+    if status == 500:
+        return HttpError(
+            "500 Internal Server Error", "The server encountered an internal error.", status
+        )
+    return HttpError(f"HTTP Error {status}", f"{reason}.", status)
+
+
+def wrap_text(text: str, max_line_length: int = WRAP_WIDTH) -> str:
+    """Wrap each line of a header value at spaces, or hard at the width."""
+    wrapped_lines = []
+    for line in text.splitlines():
+        while len(line) > max_line_length:
+            split_pos = line.rfind(" ", 0, max_line_length)
+            if split_pos == -1:
+                split_pos = max_line_length
+            wrapped_lines.append(line[:split_pos])
+            line = line[split_pos:].strip()
+        wrapped_lines.append(line)
+    return "\n".join(wrapped_lines)
+
+
+def fetch(
+    url: str, use_akamai_pragma: bool = False, timeout: Optional[float] = None
+) -> HttpResponse:
+    """
+    Request ``url`` without following redirects and return the response
+    status and headers, whatever the status.
+
+    Raises:
+        HttpError: If no response was received.
+    """
+    # requests takes longer to import than the rest of the HTTP page; it is
+    # loaded by the first fetch rather than at startup.
+    import requests
+
+    started = time.perf_counter()
+    with tracing.span("http.fetch", "http", url=url, pragma=use_akamai_pragma) as span:
+        try:
+            response = requests.get(
+                url,
+                headers=request_headers(use_akamai_pragma),
+                allow_redirects=False,
+                timeout=timeout,
+            )
+        except requests.exceptions.ConnectionError:
+            metrics.HTTP_REQUESTS.inc(result="connection-error")
+            raise HttpError("Connection Error", "Failed to establish a connection.")
+        except requests.exceptions.Timeout:
+            metrics.HTTP_REQUESTS.inc(result="timeout")
+            raise HttpError("Timeout Error", "The request timed out.")
+        except requests.exceptions.RequestException as e:
+            metrics.HTTP_REQUESTS.inc(result="error")
+            raise HttpError("Request Error", str(e))
+        span.set(status=response.status_code)
+    elapsed = time.perf_counter() - started
+    metrics.HTTP_REQUESTS.inc(result=f"{response.status_code // 100}xx")
+    metrics.HTTP_SECONDS.observe(elapsed)
+    return HttpResponse(
+        url,
+        response.status_code,
+        response.reason or "",
+        dict(response.headers),
+        round(elapsed * 1000, 1),
+    )
+
+
+def fetch_headers(
+    url: str, use_akamai_pragma: bool = False, timeout: Optional[float] = None
+) -> Dict[str, str]:
+    """
+    Return the response headers of ``url``.
+
+    Raises:
+        HttpError: If the request failed or returned an error status.
+    """
+    response = fetch(url, use_akamai_pragma, timeout)
+    if response.status >= 400:
+        raise format_status_error(response.status, response.reason)
+    return response.headers
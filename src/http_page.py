@@ -1,14 +1,15 @@
 # http_page.py
-import re
 from typing import Dict, Optional
 from urllib.parse import urlparse
 
-import requests
-from gi.repository import Gio, GObject, Gtk
+from gi.repository import Adw, Gio, GObject, Gtk
 
+from . import runtime
 from .constants import RESOURCE_PREFIX
 from .helper import Helper
+from .http_client import HttpError, ensure_scheme, fetch_headers, is_valid_url, wrap_text
 from .style_utils import set_widget_visibility
+from .tls_audit import EXPIRY_WARNING_DAYS, TlsAuditResult, TlsAuditor
 
 
 class HeaderItem(GObject.Object):
@@ -31,11 +32,19 @@ class HttpPage(Gtk.Box):
     http_column_view = Gtk.Template.Child("http_column_view")
     http_header_frame = Gtk.Template.Child("http_header_frame")
     http_error_label = Gtk.Template.Child("http_error_label")
+    http_tls_list_box = Gtk.Template.Child("http_tls_list_box")
+    http_tls_expander_row = Gtk.Template.Child("http_tls_expander_row")
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.tasks = runtime.scope("http")
+        self.tls_tasks = runtime.scope("tls")
+        self.tls_auditor = TlsAuditor()
+        self.tls_rows = []
         self.http_page_init_ui()
-        self.column_view_helper = Helper(self.http_column_view, self.get_root())
+        self.column_view_helper = Helper(
+            self.http_column_view, self.get_root(), fields=(("Header", "key"), ("Value", "value"))
+        )
 
     def http_page_init_ui(self) -> None:
         self.http_entry_row.connect(
@@ -55,13 +64,96 @@ class HttpPage(Gtk.Box):
                 "<b>Invalid URL format:</b> Please enter a valid URL."
             )
             self.http_page_update_column_view(None)
+            self.tls_tasks.cancel()
+            self.http_tls_list_box.set_visible(False)
             return
 
         self.http_page_clear_error()
-        headers = self.http_page_fetch_headers(
-            url, self.http_pragma_switch_row.get_active()
+        # A newer request replaces one still in flight, so its late
+        # response cannot overwrite this one.
+        self.tasks.spawn(
+            self.http_page_fetch_headers,
+            url,
+            self.http_pragma_switch_row.get_active(),
+            on_done=self.http_page_show_headers,
+            replace=True,
         )
+        self.http_page_audit_tls(url)
 
+    def http_page_audit_tls(self, url: str) -> None:
+        self.http_tls_list_box.set_visible(False)
+        parsed = urlparse(url)
+        if parsed.scheme != "https" or not parsed.hostname:
+            self.tls_tasks.cancel()
+            return
+        endpoint = f"[{parsed.hostname}]" if ":" in parsed.hostname else parsed.hostname
+        try:
+            endpoint = f"{endpoint}:{parsed.port or 443}"
+        except ValueError:
+            return
+        self.tls_tasks.spawn(
+            self.tls_auditor.audit_one,
+            endpoint,
+            on_done=self.http_page_show_tls,
+            replace=True,
+        )
+
+    def http_page_show_tls(self, result: TlsAuditResult) -> None:
+        for row in self.tls_rows:
+            self.http_tls_expander_row.remove(row)
+        self.tls_rows = []
+        if result.error:
+            self.http_tls_expander_row.set_subtitle(result.error)
+            self.http_tls_list_box.set_visible(True)
+            return
+
+        days_left = result.days_left
+        summary = [result.protocol, "trusted" if result.trusted else "not trusted"]
+        if days_left is not None:
+            summary.append(f"{days_left} days left")
+        self.http_tls_expander_row.set_subtitle(", ".join(summary))
+        if not result.trusted or (days_left is not None and days_left < EXPIRY_WARNING_DAYS):
+            self.http_tls_expander_row.add_css_class("warning")
+        else:
+            self.http_tls_expander_row.remove_css_class("warning")
+
+        certificate = result.certificate
+        rows = [
+            ("Address", result.address),
+            ("Cipher", f"{result.cipher} ({result.cipher_bits} bits)"),
+            ("Verification", "Trusted" if result.trusted else result.verify_error),
+        ]
+        if certificate is not None:
+            rows += [
+                ("Subject", certificate.subject.get("commonName", "")),
+                ("Issuer", certificate.issuer.get("commonName", "")),
+                ("Alternative names", ", ".join(certificate.alt_names)),
+                (
+                    "Expires",
+                    certificate.not_after.isoformat() if certificate.not_after else "",
+                ),
+                ("SHA-256", certificate.sha256),
+            ]
+        rows.append(("Chain", f"{len(result.chain)} certificates presented"))
+        rows.append(
+            ("Handshake", f"{result.handshake_ms} ms, after a {result.connect_ms} ms connect")
+        )
+        if result.resumed_handshake_ms:
+            resumed = f"{min(result.resumed_handshake_ms)} ms"
+            if result.resumption_speedup:
+                resumed += f", {result.resumption_speedup}x faster"
+            elif not result.session_reused:
+                resumed += ", session not resumed"
+            rows.append(("Resumed handshake", resumed))
+
+        for title, value in rows:
+            row = Adw.ActionRow(title=title, subtitle=value or "None", subtitle_selectable=True)
+            row.add_css_class("property")
+            self.http_tls_expander_row.add_row(row)
+            self.tls_rows.append(row)
+        self.http_tls_list_box.set_visible(True)
+
+    def http_page_show_headers(self, headers: Dict[str, str]) -> None:
         if headers and "error" not in headers:
             self.http_page_update_column_view(headers)
             self.http_entry_row.remove_css_class("error")
@@ -74,72 +166,22 @@ class HttpPage(Gtk.Box):
 
     @staticmethod
     def http_page_ensure_scheme(url: str) -> str:
-        parsed_url = urlparse(url)
-        if not parsed_url.scheme:
-            url = "https://" + url
-        return url
+        return ensure_scheme(url)
 
     @staticmethod
     def http_page_is_valid_url(url: str) -> bool:
-        url_regex = re.compile(
-            r"^(?:http|https)://"
-            r"(?:\S+(?::\S*)?@)?"
-            r"(?:[A-Za-z0-9.-]+\.[A-Za-z]{2,}|localhost|"
-            r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|"
-            r"\[?[A-Fa-f0-9]*:[A-Fa-f0-9:]+\]?)"
-            r"(?::\d+)?"
-            r"(?:/?|[/?]\S+)$",
-            re.IGNORECASE,
-        )
-
-        return re.match(url_regex, url) is not None and bool(urlparse(url).netloc)
+        return is_valid_url(url)
 
     def http_page_fetch_headers(
         self, url: str, use_akamai_pragma: bool
     ) -> Dict[str, str]:
-        headers = {}
-        if use_akamai_pragma:
-            akamai_pragma_directives = [
-                "akamai-x-get-request-id",
-                "akamai-x-get-cache-key",
-                "akamai-x-cache-on",
-                "akamai-x-cache-remote-on",
-                "akamai-x-get-true-cache-key",
-                "akamai-x-check-cacheable",
-                "akamai-x-get-extracted-values",
-                "akamai-x-feo-trace",
-                "x-akamai-logging-mode: verbose",
-            ]
-            headers["Pragma"] = ", ".join(akamai_pragma_directives)
-
         try:
-            response = requests.get(url, headers=headers, allow_redirects=False)
-            response.raise_for_status()
-            return dict(response.headers)
-        except requests.exceptions.HTTPError as e:
-            # Maintain original HTTP error messages
+            return fetch_headers(url, use_akamai_pragma)
+        except HttpError as e:
             return {"error": self.http_page_format_http_error(e)}
-        except requests.exceptions.ConnectionError:
-            return {
-                "error": "<b>Connection Error:</b> Failed to establish a connection."
-            }
-        except requests.exceptions.Timeout:
-            return {"error": "<b>Timeout Error:</b> The request timed out."}
-        except requests.exceptions.RequestException as e:
-            return {"error": f"<b>Request Error:</b> {str(e)}"}
-
-    def http_page_format_http_error(self, e: requests.exceptions.HTTPError) -> str:
-        # Maintain specific, custom HTTP error messages
-        status_code = e.response.status_code
-        if status_code == 404:
-            return (
-                "<b>404 Not Found:</b> The requested URL was not found on this server."
-            )
-        elif status_code == 403:
-            return "<b>403 Forbidden:</b> You don't have permission to access this URL."
-        elif status_code == 500:
-            return "<b>500 Internal Server Error:</b> The server encountered an internal error."
-        return f"<b>HTTP Error {status_code}:</b> {e.response.reason}."
+
+    def http_page_format_http_error(self, e: HttpError) -> str:
+        return f"<b>{e.title}:</b> {e.detail}"
 
     def http_page_on_pragma_toggled(
         self, widget: Gtk.Switch, gparam: GObject.ParamSpec
@@ -239,14 +281,4 @@ class HttpPage(Gtk.Box):
 
     @staticmethod
     def http_page_wrap_text(text: str) -> str:
-        max_line_length = 80
-        wrapped_lines = []
-        for line in text.splitlines():
-            while len(line) > max_line_length:
-                split_pos = line.rfind(" ", 0, max_line_length)
-                if split_pos == -1:
-                    split_pos = max_line_length
-                wrapped_lines.append(line[:split_pos])
-                line = line[split_pos:].strip()
-            wrapped_lines.append(line)
-        return "\n".join(wrapped_lines)
+        return wrap_text(text)
@@ -1,27 +1,44 @@
 # main.py
+import logging
+import os
 import sys
+import time
 
 from gi.repository import Adw, Gio
 
+from . import metrics, runtime, tracing
 from .constants import APP_ID, VERSION
 from .preferences import Preferences
 from .window import WoesWindow
 
+# Log level name; the application logs warnings and errors by default.
+LOG_LEVEL_ENV = "WOES_LOG_LEVEL"
+# Set to print startup timings to stderr and quit once the first page is
+# ready; used by benchmarks/startup.py.
+STARTUP_PROFILE_ENV = "WOES_STARTUP_PROFILE"
+
 
 class WoesApplication(Adw.Application):
     """The main application singleton class."""
 
-    def __init__(self, version=VERSION):
+    def __init__(self, version=VERSION, started_at=None):
         super().__init__(
             application_id=APP_ID, flags=Gio.ApplicationFlags.DEFAULT_FLAGS
         )
         self.version = version
         self.win = None  # Store a reference to the main window
+        # perf_counter() when the launcher started, for startup timings.
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.startup_marks = {}
+        self.profile_startup = bool(os.environ.get(STARTUP_PROFILE_ENV))
+        self.settings = None
+        self.exporter = metrics.MetricsExporter()
 
         # Create actions and set accelerators
         self.create_action("quit", lambda *_: self.quit(), ["<primary>q"])
         self.create_action("about", self.on_about_action)
         self.create_action("preferences", self.on_preferences_action)
+        self.create_action("diagnostics", self.on_diagnostics_action)
         self.create_action("switch-to-http", self.switch_to_http, ["<primary>1"])
         self.create_action("switch-to-nmap", self.switch_to_nmap, ["<primary>2"])
 
@@ -31,18 +48,59 @@ class WoesApplication(Adw.Application):
         We raise the application's main window, creating it if necessary.
         """
         win = self.props.active_window
+        if self.settings is None:
+            self.settings = Gio.Settings(schema_id=APP_ID)
+            self.settings.connect("changed::metrics-textfile", self.on_metrics_settings_changed)
+            self.settings.connect("changed::metrics-port", self.on_metrics_settings_changed)
+            self.on_metrics_settings_changed(self.settings, None)
         if not win:
             win = WoesWindow(application=self)
+            self.mark_startup("window-built")
         win.present()
         self.win = win
+        self.watch_first_frame(win)
+
+    def do_shutdown(self):
+        runtime.RUNTIME.shutdown()
+        self.exporter.shutdown()
+        Adw.Application.do_shutdown(self)
+
+    def on_metrics_settings_changed(self, settings, key):
+        self.exporter.configure(
+            settings.get_string("metrics-textfile"), settings.get_int("metrics-port")
+        )
+
+    def watch_first_frame(self, win):
+        frame_clock = win.get_frame_clock()
+        if frame_clock is None or "first-frame" in self.startup_marks:
+            return
+
+        def on_after_paint(clock):
+            clock.disconnect(handler)
+            self.mark_startup("first-frame")
+
+        handler = frame_clock.connect("after-paint", on_after_paint)
+
+    def mark_startup(self, event: str):
+        """Record how long after launch a startup milestone was reached, once."""
+        if event in self.startup_marks:
+            return
+        elapsed = (time.perf_counter() - self.started_at) * 1000
+        self.startup_marks[event] = elapsed
+        tracing.instant(f"startup.{event}", "ui", elapsed_ms=round(elapsed, 1))
+        logging.info(f"Startup: {event} after {elapsed:.1f} ms")
+        if self.profile_startup:
+            print(f"{event} {elapsed:.1f}", file=sys.stderr, flush=True)
+            if {"first-frame", "page-ready"} <= self.startup_marks.keys():
+                self.quit()
 
     def switch_to_http(self, *args):
         if self.win:
-            self.win.stack.set_visible_child(self.win.http_page)
+            self.win.stack.set_visible_child_name("http_page")
 
     def switch_to_nmap(self, *args):
         if self.win:
-            self.win.stack.set_visible_child(self.win.nmap_page)
+            self.win.stack.set_visible_child_name("nmap_page")
 
     def on_about_action(self, widget, _):
         """Callback for the app.about action."""
@@ -63,6 +121,13 @@ class WoesApplication(Adw.Application):
         preferences.set_transient_for(self.win)
         preferences.present()
 
+    def on_diagnostics_action(self, widget, _):
+        """Callback for the app.diagnostics action."""
+        from .diagnostics import Diagnostics
+
+        diagnostics = Diagnostics(exporter=self.exporter, transient_for=self.win)
+        diagnostics.present()
+
     def create_action(self, name, callback, shortcuts=None):
         """Add an application action."""
         action = Gio.SimpleAction.new(name, None)
@@ -72,7 +137,12 @@ class WoesApplication(Adw.Application):
             self.set_accels_for_action(f"app.{name}", shortcuts)
 
 
-def main(version=VERSION):
+def main(version=VERSION, started_at=None):
     """The application's entry point."""
-    app = WoesApplication(version)
+    level = logging.getLevelName(os.environ.get(LOG_LEVEL_ENV, "WARNING").upper())
+    if not isinstance(level, int):
+        level = logging.WARNING
+    logging.basicConfig(level=level, format="%(asctime)s - %(levelname)s - %(message)s")
+    tracing.configure_from_environment()
+    app = WoesApplication(version, started_at)
     return app.run(sys.argv)
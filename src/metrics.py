@@ -0,0 +1,451 @@
+# metrics.py
+"""
+Counters, gauges and fixed-bucket histograms for what WOES does: HTTP
+fetches, DNS lookups, nmap runs, parsing, scans and caches.
+
+Metrics live in one process-wide registry. Each metric takes a lock only
+long enough to bump a number, and histograms keep one count per bucket, so
+their memory does not grow with the number of observations. The registry
+renders the Prometheus text format for a node_exporter textfile collector
+or a local ``/metrics`` endpoint, and summarizes itself for the
+diagnostics panel.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; from a fast cached lookup to a slow remote fetch.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds; from a single-host scan to a large sweep.
+SCAN_BUCKETS = (0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 14400.0)
+# Seconds; around the 16.7 ms of a 60 Hz frame.
+FRAME_BUCKETS = (0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.066, 0.1, 0.25, 1.0)
+TEXTFILE_INTERVAL = 15.0
+EXPORTER_HOST = "127.0.0.1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    return f"{seconds:.2f} s"
+
+
+@dataclass(frozen=True)
+class MetricRow:
+    """One line of the diagnostics panel."""
+
+    subsystem: str
+    title: str
+    value: str
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, subsystem: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.subsystem = subsystem
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def _items(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            # Histogram states are copied so they can be read without the lock.
+            return sorted(
+                (key, list(value) if isinstance(value, list) else value)
+                for key, value in self._values.items()
+            )
+
+    def _title(self, key: LabelValues) -> str:
+        title = self.help.rstrip(".")
+        details = ", ".join(value for value in key if value)
+        return f"{title} ({details})" if details else title
+
+    def exposition(self) -> List[str]:
+        raise NotImplementedError
+
+    def rows(self) -> List[MetricRow]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def exposition(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+            for key, value in self._items()
+        ]
+
+    def rows(self) -> List[MetricRow]:
+        return [
+            MetricRow(self.subsystem, self._title(key), _format_number(value))
+            for key, value in self._items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Observations counted into fixed buckets; each label set keeps a count
+    per bucket plus the sum and count of everything observed.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        subsystem: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, subsystem, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), then sum and count.
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-1] if state else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile, or None."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            state = list(state) if state else None
+        return self._quantile(state, q)
+
+    def _quantile(self, state: Optional[list], q: float) -> Optional[float]:
+        if not state or not state[-1]:
+            return None
+        rank = q * state[-1]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), state[:-2]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def exposition(self) -> List[str]:
+        lines = []
+        for key, state in self._items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-2]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+    def rows(self) -> List[MetricRow]:
+        rows = []
+        for key, state in self._items():
+            count = state[-1]
+            if not count:
+                continue
+            parts = [f"{count} × mean {_format_seconds(state[-2] / count)}"]
+            for label, q in (("p50", 0.5), ("p95", 0.95)):
+                bound = self._quantile(state, q)
+                if bound != float("inf"):
+                    parts.append(f"{label} ≤ {_format_seconds(bound)}")
+            rows.append(MetricRow(self.subsystem, self._title(key), ", ".join(parts)))
+        return rows
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.started_at = time.time()
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, subsystem: str, labels=()) -> Counter:
+        return self.register(Counter(name, help_text, subsystem, labels))
+
+    def gauge(self, name: str, help_text: str, subsystem: str, labels=()) -> Gauge:
+        return self.register(Gauge(name, help_text, subsystem, labels))
+
+    def histogram(
+        self, name: str, help_text: str, subsystem: str, labels=(), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, subsystem, labels, buckets))
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+        self.started_at = time.time()
+
+    def render(self) -> str:
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.exposition())
+        return "\n".join(lines) + "\n"
+
+    def rows(self) -> List[MetricRow]:
+        """Every recorded value, summarized for display, in registration order."""
+        rows: List[MetricRow] = []
+        for metric in self.metrics:
+            rows.extend(metric.rows())
+        return rows
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "woes_http_requests_total", "HTTP header fetches.", "HTTP", ("result",)
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "woes_http_request_seconds", "HTTP header fetch latency.", "HTTP"
+)
+DNS_LOOKUPS = REGISTRY.counter(
+    "woes_dns_lookups_total", "DNS lookups.", "DNS", ("type", "result")
+)
+DNS_SECONDS = REGISTRY.histogram("woes_dns_lookup_seconds", "DNS lookup latency.", "DNS")
+TLS_HANDSHAKES = REGISTRY.counter(
+    "woes_tls_handshakes_total", "TLS audit handshakes.", "TLS", ("kind", "result")
+)
+TLS_HANDSHAKE_SECONDS = REGISTRY.histogram(
+    "woes_tls_handshake_seconds", "TLS audit handshake latency.", "TLS", ("kind",)
+)
+NMAP_RUNS = REGISTRY.counter("woes_nmap_runs_total", "nmap runs.", "Scans", ("result",))
+NMAP_SECONDS = REGISTRY.histogram(
+    "woes_nmap_run_seconds", "nmap run duration.", "Scans", buckets=SCAN_BUCKETS
+)
+SCANS = REGISTRY.counter("woes_scans_total", "Scans.", "Scans", ("engine",))
+SCAN_SECONDS = REGISTRY.histogram(
+    "woes_scan_seconds", "Scan duration.", "Scans", ("engine",), SCAN_BUCKETS
+)
+SCANS_RUNNING = REGISTRY.gauge("woes_scans_running", "Scans in progress.", "Scans")
+SCAN_HOSTS = REGISTRY.counter(
+    "woes_scan_hosts_total", "Hosts reported by scans.", "Scans", ("engine",)
+)
+PARSE_SECONDS = REGISTRY.histogram(
+    "woes_parse_seconds", "nmap XML parse duration.", "Parsing"
+)
+PARSED_HOSTS = REGISTRY.counter("woes_parsed_hosts_total", "Hosts parsed from nmap XML.", "Parsing")
+YAML_CACHE = REGISTRY.counter(
+    "woes_yaml_cache_requests_total", "Rendered host YAML cache lookups.", "Caches", ("result",)
+)
+SCRIPT_CACHE = REGISTRY.counter(
+    "woes_script_cache_requests_total", "NSE script result cache lookups.", "Caches", ("result",)
+)
+UI_FRAME_SECONDS = REGISTRY.histogram(
+    "woes_ui_frame_apply_seconds",
+    "Time per frame spent applying results.",
+    "Interface",
+    buckets=FRAME_BUCKETS,
+)
+UI_UPDATES = REGISTRY.counter(
+    "woes_ui_updates_total", "Result updates to the interface.", "Interface", ("policy",)
+)
+UI_PENDING = REGISTRY.gauge(
+    "woes_ui_pending_items", "Result items waiting for a frame.", "Interface"
+)
+
+
+@contextmanager
+def scan(engine: str) -> Iterator[None]:
+    """Count a scan, its duration and that it is running."""
+    SCANS.inc(engine=engine)
+    SCANS_RUNNING.inc()
+    try:
+        with SCAN_SECONDS.time(engine=engine):
+            yield
+    finally:
+        SCANS_RUNNING.dec()
+
+
+def write_textfile(path: str, registry: Registry = REGISTRY):
+    """
+    Write the registry for node_exporter's textfile collector. The file is
+    replaced atomically, so the collector never reads a partial file.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as stream:
+        stream.write(registry.render())
+    os.replace(temporary, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Metrics exporter: {format % args}")
+
+
+class MetricsExporter:
+    """
+    Publishes the registry while the application runs: rewrites a textfile
+    every ``interval`` seconds and/or serves ``/metrics`` on localhost.
+    Both are off until configured.
+    """
+
+    def __init__(self, registry: Registry = REGISTRY, interval: float = TEXTFILE_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self.textfile: Optional[str] = None
+        self.port = 0
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def configure(self, textfile: Optional[str] = None, port: int = 0):
+        if textfile != self.textfile:
+            self._stop_textfile()
+            self.textfile = textfile or None
+            if self.textfile:
+                self._stop = threading.Event()
+                self._writer = threading.Thread(target=self._write_loop, daemon=True)
+                self._writer.start()
+        if port != self.port:
+            self._stop_server()
+            self.port = port
+            if port:
+                self._start_server(port)
+
+    def _start_server(self, port: int):
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": self.registry})
+        try:
+            self.server = ThreadingHTTPServer((EXPORTER_HOST, port), handler)
+        except OSError as e:
+            logging.error(f"Could not serve metrics on {EXPORTER_HOST}:{port}: {e}")
+            self.port = 0
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"Serving metrics on http://{EXPORTER_HOST}:{port}/metrics")
+
+    def _stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def _write_loop(self):
+        stop, path = self._stop, self.textfile
+        while True:
+            try:
+                write_textfile(path, self.registry)
+            except OSError as e:
+                logging.error(f"Could not write metrics to {path}: {e}")
+            if stop.wait(self.interval):
+                return
+
+    def _stop_textfile(self):
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+            self._writer = None
+        if self.textfile:
+            # A last write, so the file holds the final values.
+            try:
+                write_textfile(self.textfile, self.registry)
+            except OSError as e:
+                logging.error(f"Could not write metrics to {self.textfile}: {e}")
+
+    def status(self) -> str:
+        targets = []
+        if self.textfile:
+            targets.append(f"textfile {self.textfile}")
+        if self.server is not None:
+            targets.append(f"http://{EXPORTER_HOST}:{self.port}/metrics")
+        return ", ".join(targets) if targets else "Not exported"
+
+    def shutdown(self):
+        self.configure(None, 0)
@@ -1,26 +1,74 @@
 # nmap_page.py
+import ipaddress
 import logging
+import time
+from typing import Optional
 
-import nmap
-from gi.repository import Gio, GLib, GObject, Gtk, GtkSource
+from gi.repository import Gio, GLib, GObject, Gtk, GtkSource, Pango
 
-from .constants import RESOURCE_PREFIX
+from . import runtime, tracing
+from .constants import APP_ID, RESOURCE_PREFIX
+from .connect_scanner import ALL_PORTS, TOP_PORTS, ConnectScanner, ConnectScanOptions
+from .enrichment import EnrichmentOptions, Enricher
+from .export import ExportFormat, ResultExport, export_records
+from .frame_dispatcher import FrameDispatcher
+from .helper import Helper
 from .nmap_scanner import NmapScanner, ScanStatus
+from .port_matrix import PortMatrix, analytics_available
+from .result_viewer import ResultViewer
+from .scan_diff import diff_scans, plan_incremental_rescan
+from .scan_history import HISTORY_PAGE_SIZE, ScanHistory
+from .scan_index import QueryError, ScanIndex, looks_like_query
+from .scan_model import HostRecord
+from .scan_pipeline import ScanPipeline
+from .scan_rate import RateController, RateLimits
 from .style_utils import apply_source_style_scheme
+from .targets import TargetError, compile_targets
 
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+
+DIFF_ENTRY = "Changes since last scan"
+SUMMARY_ENTRY = "Scan summary"
+PROGRESS_INTERVAL = 0.25
+
+
+def address_sort_key(address: str) -> str:
+    """Return a key that sorts addresses numerically when compared as strings."""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return f"~{address}"
+    if ip.version == 4:
+        return "4" + "".join(f"{int(octet):03d}" for octet in address.split("."))
+    return "6" + ip.exploded
 
 
 class NmapItem(GObject.Object):
+    __gtype_name__ = "NmapItem"
+
     key = GObject.Property(type=str)
     value = GObject.Property(type=str)
+    open_ports = GObject.Property(type=int, default=0)
+    os = GObject.Property(type=str)
+    sort_key = GObject.Property(type=str)
 
-    def __init__(self, key: str, value: str):
+    def __init__(self, key: str, value: str, open_ports: int = 0, os: str = ""):
         super().__init__()
         self.key = key
         self.value = value
+        self.open_ports = open_ports
+        self.os = os
+        self.sort_key = address_sort_key(key)
+
+    @classmethod
+    def from_result(cls, key: str, host_data) -> "NmapItem":
+        if isinstance(host_data, HostRecord):
+            return cls(
+                key,
+                host_data.state,
+                host_data.ports.open_count(),
+                host_data.os_name or "",
+            )
+        return cls(key, "")
 
 
 @Gtk.Template(resource_path=f"{RESOURCE_PREFIX}/nmap_page.ui")
@@ -28,14 +76,21 @@ class NmapPage(Gtk.Box):
     __gtype_name__ = "NmapPage"
 
     nmap_target_entryrow = Gtk.Template.Child("nmap_target_entryrow")
-    nmap_target_listbox = Gtk.Template.Child("nmap_target_listbox")
+    nmap_target_columnview = Gtk.Template.Child("nmap_target_columnview")
+    nmap_host_filter_entry = Gtk.Template.Child("nmap_host_filter_entry")
     nmap_results_scrolled_window = Gtk.Template.Child("nmap_results_scrolled_window")
     nmap_target_scrolled_window = Gtk.Template.Child("nmap_target_scrolled_window")
     nmap_target_frame = Gtk.Template.Child("nmap_target_frame")
     nmap_results_frame = Gtk.Template.Child("nmap_results_frame")
     nmap_fingerprint_switchrow = Gtk.Template.Child("nmap_fingerprint_switchrow")
     nmap_all_ports_switchrow = Gtk.Template.Child("nmap_all_ports_switchrow")
+    nmap_incremental_switchrow = Gtk.Template.Child("nmap_incremental_switchrow")
+    nmap_pipeline_switchrow = Gtk.Template.Child("nmap_pipeline_switchrow")
+    nmap_connect_switchrow = Gtk.Template.Child("nmap_connect_switchrow")
+    nmap_enrich_switchrow = Gtk.Template.Child("nmap_enrich_switchrow")
     nmap_scripts_dropdown = Gtk.Template.Child("nmap_scripts_dropdown")
+    nmap_history_dropdown = Gtk.Template.Child("nmap_history_dropdown")
+    nmap_export_row = Gtk.Template.Child("nmap_export_row")
     nmap_spinner = Gtk.Template.Child("nmap_spinner")
     nmap_status = Gtk.Template.Child("nmap_status")
 
@@ -43,14 +98,40 @@ class NmapPage(Gtk.Box):
         super().__init__(**kwargs)
         logging.debug("Initializing NmapPage...")
         self.results_by_host = {}
-        self.nmap_target_listbox_store = Gio.ListStore(item_type=NmapItem)
+        self.results_generation = 0
+        self.scan_index = ScanIndex()
+        self.nmap_target_store = Gio.ListStore(item_type=NmapItem)
+        self.settings = Gio.Settings.new(APP_ID)
         self.scanner = NmapScanner()
+        # One scan at a time; history loads and exports run beside it.
+        self.tasks = runtime.scope("nmap", limit=1)
+        self.history_tasks = runtime.scope("nmap.history", limit=1)
+        self.export_tasks = runtime.scope("nmap.export", limit=2)
+        # Enrichment of a finished scan; it does not hold up the next scan.
+        self.enrich_tasks = runtime.scope("nmap.enrich", limit=1)
+        # Results and progress from scan workers reach the widgets through
+        # here, batched once per frame.
+        self.updates = FrameDispatcher(self)
+        self.pipeline = None
+        self.connect_scanner = None
+        self.enricher = None
+        self.scan_running = False
+        self.live_export = None
+        self.displayed_scan_id = None
+        self.history = ScanHistory()
+        self.history_entries = []
+        self.history_offset = 0
+        self.updating_history = False
         self.source_buffer = self.init_source_buffer()
         self.source_view = self.init_source_view(self.source_buffer)
+        self.viewer = ResultViewer(self.source_view)
         self.apply_source_view_style()
         self.init_ui()
 
     def __del__(self):
+        for scope in (self.tasks, self.history_tasks, self.export_tasks):
+            scope.close()
+        self.updates.close()
         del self.scanner
 
     def init_source_buffer(self) -> GtkSource.Buffer:
@@ -95,22 +176,90 @@ class NmapPage(Gtk.Box):
 
     def init_ui(self):
         logging.debug("Initializing UI components.")
-        self.nmap_target_listbox.bind_model(
-            self.nmap_target_listbox_store, self.create_listbox_row
-        )
+        self.init_target_columnview()
+        self.load_history_page()
         self.connect_signals()
         self.set_visible(
             self.nmap_spinner,
             self.nmap_status,
             self.nmap_target_frame,
             self.nmap_results_frame,
-            self.nmap_target_listbox,
+            self.nmap_target_columnview,
             self.source_view,
             self.nmap_target_scrolled_window,
             visible=False,
         )
         logging.debug("UI components initialized.")
 
+    def init_target_columnview(self):
+        """
+        Bind the host store to the column view through filter, sort and
+        selection models. Only the visible rows get widgets, and those are
+        recycled while scrolling, so the list stays responsive with tens of
+        thousands of hosts.
+        """
+        host_expression = Gtk.PropertyExpression.new(NmapItem, None, "key")
+        os_expression = Gtk.PropertyExpression.new(NmapItem, None, "os")
+        state_expression = Gtk.PropertyExpression.new(NmapItem, None, "value")
+        sort_key_expression = Gtk.PropertyExpression.new(NmapItem, None, "sort_key")
+        open_ports_expression = Gtk.PropertyExpression.new(NmapItem, None, "open_ports")
+
+        self.host_filter = Gtk.AnyFilter()
+        for expression in (host_expression, os_expression, state_expression):
+            string_filter = Gtk.StringFilter.new(expression)
+            string_filter.set_match_mode(Gtk.StringFilterMatchMode.SUBSTRING)
+            string_filter.set_ignore_case(True)
+            self.host_filter.append(string_filter)
+        self.host_filter_model = Gtk.FilterListModel.new(self.nmap_target_store, None)
+        self.host_filter_model.set_incremental(True)
+
+        self.host_sort_model = Gtk.SortListModel.new(self.host_filter_model, None)
+        self.host_sort_model.set_incremental(True)
+        self.host_selection = Gtk.SingleSelection.new(self.host_sort_model)
+        self.host_selection.set_autoselect(False)
+        self.host_selection.set_can_unselect(True)
+        self.nmap_target_columnview.set_model(self.host_selection)
+
+        # Sorters and filters are expression based, so sorting and filtering
+        # run entirely inside GTK without calling back into Python per item.
+        columns = (
+            ("Host", "key", Gtk.StringSorter.new(sort_key_expression), True),
+            ("Open", "open_ports", Gtk.NumericSorter.new(open_ports_expression), False),
+            ("OS", "os", Gtk.StringSorter.new(os_expression), True),
+            ("State", "value", Gtk.StringSorter.new(state_expression), False),
+        )
+        for title, attr_name, sorter, expand in columns:
+            column = Gtk.ColumnViewColumn.new(title, self.create_column_factory(attr_name))
+            column.set_sorter(sorter)
+            column.set_expand(expand)
+            column.set_resizable(True)
+            self.nmap_target_columnview.append_column(column)
+        self.host_sort_model.set_sorter(self.nmap_target_columnview.get_sorter())
+
+        self.column_view_helper = Helper(
+            self.nmap_target_columnview,
+            self.get_root(),
+            fields=[(title, attr_name) for title, attr_name, _, _ in columns],
+        )
+
+    @staticmethod
+    def create_column_factory(attr_name: str) -> Gtk.SignalListItemFactory:
+        factory = Gtk.SignalListItemFactory()
+
+        def setup_func(_, list_item: Gtk.ListItem) -> None:
+            label = Gtk.Label(xalign=0)
+            label.set_ellipsize(Pango.EllipsizeMode.END)
+            list_item.set_child(label)
+
+        def bind_func(_, list_item: Gtk.ListItem) -> None:
+            label = list_item.get_child()
+            item = list_item.get_item()
+            label.set_text(str(getattr(item, attr_name, "")))
+
+        factory.connect("setup", setup_func)
+        factory.connect("bind", bind_func)
+        return factory
+
     def connect_signals(self):
         try:
             self.nmap_target_entryrow.connect(
@@ -128,41 +277,93 @@ class NmapPage(Gtk.Box):
             self.nmap_scripts_dropdown.connect(
                 "notify::selected-item", self.on_nmap_scripts_dropdown_changed
             )
-            self.nmap_target_listbox.connect(
-                "row-selected", self.on_nmap_target_listbox_row_selected
+            self.host_selection.connect(
+                "notify::selected-item", self.on_nmap_target_selection_changed
+            )
+            self.nmap_host_filter_entry.connect(
+                "search-changed", self.on_nmap_host_filter_changed
+            )
+            self.nmap_history_dropdown.connect(
+                "notify::selected", self.on_nmap_history_dropdown_changed
             )
+            self.nmap_export_row.connect("activated", self.on_nmap_export_row_activated)
             logging.debug("Connected signals for UI components.")
         except Exception as e:
             logging.error(f"Error connecting signals for UI components: {e}")
 
     def on_nmap_target_entryrow_activated(self, entryrow: Gtk.Widget):
         target = entryrow.get_text().strip()
-        if not self.scanner.validate_target_input(target):
+        if not target:
+            self.tasks.ui(self.clear_results)
+            self.tasks.ui(self.nmap_target_entryrow.set_sensitive, True)
+            return
+        if self.tasks.busy:
+            return
+
+        try:
+            targets = compile_targets(target)
+        except TargetError as e:
             entryrow.get_style_context().add_class("error")
+            entryrow.set_tooltip_text(str(e))
             return
         else:
             entryrow.get_style_context().remove_class("error")
+            entryrow.set_tooltip_text(None)
 
-        if not target:
-            GLib.idle_add(self.clear_results)
-            GLib.idle_add(self.nmap_target_entryrow.set_sensitive, True)
-            return
-
-        GLib.idle_add(self.nmap_target_entryrow.set_sensitive, False)
+        # Enrichment of the previous scan would attach to the new results.
+        self.enrich_tasks.cancel()
+        self.tasks.ui(self.nmap_target_entryrow.set_sensitive, False)
+        self.scan_running = True
+        self.displayed_scan_id = None
 
         os_fingerprinting_enabled = self.nmap_fingerprint_switchrow.get_active()
         scan_all_ports_enabled = self.nmap_all_ports_switchrow.get_active()
         selected_script = self.get_selected_script()
+        incremental_enabled = self.nmap_incremental_switchrow.get_active()
+        max_age = self.settings.get_int("incremental-max-age") * 3600
+        pipeline_enabled = self.nmap_pipeline_switchrow.get_active()
+        enrich_enabled = self.nmap_enrich_switchrow.get_active()
+        connect_options = None
+        if self.nmap_connect_switchrow.get_active() or not self.scanner.nmap_available():
+            connect_options = self.connect_scan_options(scan_all_ports_enabled)
 
         status_message = ScanStatus.IN_PROGRESS.value[1].format(target=target)
-        self.set_scan_status(ScanStatus.IN_PROGRESS.value[0], status_message)
+        self.set_scan_status(
+            ScanStatus.IN_PROGRESS.value[0], f"{status_message} {targets.summary()}"
+        )
 
-        self.scanner.executor.submit(
+        task = self.tasks.spawn(
             self._run_nmap_scan_task,
             target,
+            targets,
             os_fingerprinting_enabled,
             scan_all_ports_enabled,
             selected_script,
+            incremental_enabled,
+            max_age,
+            pipeline_enabled,
+            connect_options,
+            enrich_enabled,
+            pool="scan",
+        )
+        task.on_cancel(self.cancel_pipeline)
+
+    def cancel_pipeline(self):
+        pipeline = self.pipeline
+        if pipeline is not None:
+            pipeline.cancel()
+        connect_scanner = self.connect_scanner
+        if connect_scanner is not None:
+            connect_scanner.cancel()
+
+    def connect_scan_options(self, scan_all_ports: bool) -> ConnectScanOptions:
+        return ConnectScanOptions(
+            ports=ALL_PORTS
+            if scan_all_ports
+            else TOP_PORTS[: self.settings.get_int("connect-top-ports")],
+            timeout=self.settings.get_int("connect-timeout") / 1000,
+            concurrency=self.settings.get_int("connect-concurrency"),
+            host_rate=self.settings.get_int("connect-host-rate"),
         )
 
     def get_selected_script(self):
@@ -174,42 +375,498 @@ class NmapPage(Gtk.Box):
         )
 
     def _run_nmap_scan_task(
-        self, target, os_fingerprinting_enabled, scan_all_ports_enabled, selected_script
+        self,
+        target,
+        targets,
+        os_fingerprinting_enabled,
+        scan_all_ports_enabled,
+        selected_script,
+        incremental_enabled=False,
+        max_age=0,
+        pipeline_enabled=False,
+        connect_options=None,
+        enrich_enabled=False,
     ):
+        started_at = time.time()
+        if connect_options:
+            options = connect_options.describe()
+        else:
+            options = self.scanner.build_nmap_options(
+                os_fingerprinting_enabled, scan_all_ports_enabled, selected_script
+            )
         try:
-            nm = self.scanner.run_nmap_scan(
-                target,
-                os_fingerprinting_enabled,
-                scan_all_ports_enabled,
-                selected_script,
+            # Scans run with other options are not comparable: ports or
+            # scripts they did not probe would show up as changes.
+            previous_scans = self.history.list_scans(
+                limit=2, target=target, arguments=options
+            )
+            previous = (
+                self.history.load_scan(previous_scans[0].scan_id)
+                if previous_scans
+                else {}
             )
-            self.process_scan_results(nm)
+            probed_at = {}
+
+            if connect_options:
+                hosts = self._run_connect_scan(targets, connect_options)
+            elif incremental_enabled and previous_scans:
+                last_diff = None
+                if len(previous_scans) > 1:
+                    last_diff = diff_scans(
+                        self.history.load_scan(previous_scans[1].scan_id), previous
+                    )
+                probe_times = self.history.probe_times(previous_scans[0].scan_id)
+                discovered = self._discover_new_hosts(targets.without(previous))
+                plan = plan_incremental_rescan(
+                    previous, probe_times, last_diff, max_age, discovered=discovered
+                )
+                logging.debug(
+                    f"Incremental rescan of {target}: {len(plan.full_hosts)} full, "
+                    f"{len(plan.port_hosts)} partial, {len(plan.carried_hosts)} carried"
+                )
+                hosts = self.scanner.run_incremental_scan(
+                    plan,
+                    previous,
+                    os_fingerprinting_enabled,
+                    scan_all_ports_enabled,
+                    selected_script,
+                )
+                probed_at = {host: probe_times[host] for host in plan.carried_hosts}
+            elif pipeline_enabled:
+                hosts = self._run_pipeline_scan(
+                    targets,
+                    os_fingerprinting_enabled,
+                    scan_all_ports_enabled,
+                    selected_script,
+                )
+            elif selected_script not in (None, "None") and self.settings.get_boolean(
+                "script-cache"
+            ):
+                hosts = self.scanner.run_cached_script_scan(
+                    targets,
+                    os_fingerprinting_enabled,
+                    scan_all_ports_enabled,
+                    selected_script,
+                    self.history,
+                    self.settings.get_int("script-cache-max-age") * 3600,
+                )
+            else:
+                hosts = self.scanner.scan_targets(
+                    targets,
+                    os_fingerprinting_enabled,
+                    scan_all_ports_enabled,
+                    selected_script,
+                )
+
+            diff = diff_scans(previous, hosts) if previous_scans else None
+            scan_id = self.process_scan_results(
+                hosts, target, options, started_at, probed_at, diff
+            )
+            if enrich_enabled and hosts:
+                self.updates.call(self.start_enrichment, hosts, scan_id)
         except Exception as e:
-            GLib.idle_add(self.handle_scan_error, target, str(e))
-            GLib.idle_add(
+            hosts = {}
+            self.updates.call(self.handle_scan_error, target, str(e))
+            self.updates.replace(
+                "status",
                 self.set_scan_status,
                 ScanStatus.FAILED.value[0],
                 "Scan failed unexpectedly",
             )
+        self.updates.call(self.finish_scan_export, hosts)
+
+    def _discover_new_hosts(self, targets):
+        if not len(targets):
+            return []
+        self.pipeline = ScanPipeline(self.scanner)
+        try:
+            return self.pipeline.discover(targets)
+        finally:
+            self.pipeline = None
+
+    def _run_connect_scan(self, targets, connect_options):
+        total = len(targets)
+        last_report = [0.0]
+        scanned = [0]
+
+        def on_host(record):
+            scanned[0] += 1
+            self.updates.merge("hosts", self.append_host_results, {record.address: record})
+            now = time.monotonic()
+            if now - last_report[0] >= PROGRESS_INTERVAL:
+                last_report[0] = now
+                self.updates.replace(
+                    "status",
+                    self.set_scan_status,
+                    ScanStatus.IN_PROGRESS.value[0],
+                    f"{scanned[0]} of {total} hosts up...",
+                )
+
+        self.updates.call(self.begin_streamed_results)
+        self.connect_scanner = ConnectScanner(connect_options)
+        try:
+            return self.scanner.run_connect_scan(targets, self.connect_scanner, on_host)
+        finally:
+            self.connect_scanner = None
+
+    def _run_pipeline_scan(
+        self, targets, os_fingerprinting_enabled, scan_all_ports_enabled, selected_script
+    ):
+        controller = None
+        if self.settings.get_boolean("adaptive-scan-rate"):
+            controller = RateController(
+                RateLimits(
+                    max_rate=self.settings.get_int("scan-max-rate"),
+                    max_retries=self.settings.get_int("scan-max-retries"),
+                    max_parallelism=self.settings.get_int("scan-max-parallelism"),
+                )
+            )
+        self.pipeline = ScanPipeline(self.scanner, controller=controller)
+        last_report = [0.0]
+
+        def on_progress(discovered: int, scanned: int):
+            now = time.monotonic()
+            if now - last_report[0] < PROGRESS_INTERVAL:
+                return
+            last_report[0] = now
+            self.updates.replace(
+                "status",
+                self.set_scan_status,
+                ScanStatus.IN_PROGRESS.value[0],
+                f"Discovered {discovered} hosts, scanned {scanned}...",
+            )
 
-    def process_scan_results(self, nm: nmap.PortScanner):
-        logging.debug(f"Processing Nmap scan results for hosts: {nm.all_hosts()}")
-        results = self.scanner.convert_results_to_yaml(nm)
-        GLib.idle_add(self.update_nmap_results_view, (nm.all_hosts(), results))
-        GLib.idle_add(
-            self.set_scan_status, ScanStatus.COMPLETE.value[0], "Scan complete"
+        self.updates.call(self.begin_streamed_results)
+        try:
+            return self.pipeline.run(
+                targets,
+                os_fingerprinting_enabled,
+                scan_all_ports_enabled,
+                selected_script,
+                on_hosts=lambda records: self.updates.merge(
+                    "hosts", self.append_host_results, records
+                ),
+                on_progress=on_progress,
+            )
+        finally:
+            self.pipeline = None
+
+    def begin_streamed_results(self):
+        self.results_generation += 1
+        self.scanner.yaml_cache.clear()
+        self.results_by_host = {}
+        self.scan_index = ScanIndex()
+        self.nmap_target_store.remove_all()
+        self.viewer.clear()
+
+    def append_host_results(self, records: dict):
+        if self.live_export is not None:
+            self.live_export.feed(records.values())
+        items = []
+        for address, record in records.items():
+            if address not in self.results_by_host:
+                items.append(NmapItem.from_result(address, record))
+            self.results_by_host[address] = record
+            self.scan_index.add(record)
+        self.nmap_target_store.splice(self.nmap_target_store.get_n_items(), 0, items)
+
+        if self.nmap_host_filter_entry.get_text().strip():
+            self.on_nmap_host_filter_changed(self.nmap_host_filter_entry)
+        self.set_visible(
+            self.nmap_target_columnview,
+            self.nmap_target_frame,
+            self.nmap_target_scrolled_window,
+            visible=True,
+        )
+
+    @tracing.traced("ui.process_scan_results", "render")
+    def process_scan_results(
+        self,
+        hosts: dict,
+        target: str,
+        options: str,
+        started_at: float,
+        probed_at: Optional[dict] = None,
+        diff=None,
+    ):
+        logging.debug(f"Processing Nmap scan results for {len(hosts)} hosts")
+        results = dict(hosts)
+        host_list = list(hosts)
+        if diff is not None:
+            logging.info(f"Changes since last scan of {target}: {diff.summary()}")
+            results[DIFF_ENTRY] = diff.to_dict()
+            host_list.insert(0, DIFF_ENTRY)
+        summary = self.scan_summary(hosts)
+        if summary is not None:
+            results[SUMMARY_ENTRY] = summary
+            host_list.insert(0, SUMMARY_ENTRY)
+        scan_id = None
+        try:
+            scan_id = self.history.record_scan(
+                target, options, hosts, started_at=started_at, probed_at=probed_at
+            )
+            self.displayed_scan_id = scan_id
+            self.updates.call(self.load_history_page)
+        except Exception as e:
+            logging.error(f"Failed to store scan in history: {e}")
+        index = ScanIndex.from_hosts(hosts.values())
+        self.updates.call(self.update_nmap_results_view, (host_list, results, index))
+        self.updates.replace(
+            "status", self.set_scan_status, ScanStatus.COMPLETE.value[0], "Scan complete"
+        )
+        self.updates.call(self.nmap_target_entryrow.set_sensitive, True)
+        return scan_id
+
+    @tracing.traced("analytics.summary", "render")
+    def scan_summary(self, hosts: dict):
+        """
+        Compute the estate-wide summary shown as the first entry of a scan:
+        top ports, services and OSes and a per-subnet rollup. Needs NumPy.
+        """
+        if not analytics_available() or len(hosts) < 2:
+            return None
+        try:
+            return PortMatrix.from_hosts(
+                host for host in hosts.values() if isinstance(host, HostRecord)
+            ).summary()
+        except Exception as e:
+            logging.error(f"Failed to summarize scan: {e}")
+            return None
+
+    def start_enrichment(self, hosts: dict, scan_id: Optional[int] = None):
+        open_ports = sum(host.ports.open_count() for host in hosts.values())
+        if not open_ports:
+            return
+        self.set_scan_status(
+            ScanStatus.IN_PROGRESS.value[0],
+            f"Grabbing banners and certificates from {open_ports} open ports...",
+        )
+        self.enricher = Enricher(EnrichmentOptions())
+        task = self.enrich_tasks.spawn(
+            self._run_enrichment, self.enricher, hosts, scan_id, open_ports, pool="scan"
+        )
+        task.on_cancel(self.enricher.cancel)
+
+    def _run_enrichment(
+        self, enricher: Enricher, hosts: dict, scan_id: Optional[int], open_ports: int
+    ):
+        # The scan is already stored and shown; a failure here only loses
+        # the extra script output.
+        try:
+            results = enricher.run(
+                hosts.values(),
+                on_result=lambda result: self.updates.merge(
+                    "enrichment", self.apply_enrichments, [result]
+                ),
+            )
+            if scan_id is not None:
+                for result in results:
+                    try:
+                        self.history.add_port_scripts(
+                            scan_id, result.address, result.protocol, result.port, result.scripts
+                        )
+                    except Exception as e:
+                        logging.error(f"Failed to store enrichment in history: {e}")
+            logging.info(f"Enriched {len(results)} of {open_ports} open ports")
+        except Exception as e:
+            logging.error(f"Enrichment failed: {e}")
+        if not enricher.cancelled.is_set():
+            self.updates.replace(
+                "status", self.set_scan_status, ScanStatus.COMPLETE.value[0], "Scan complete"
+            )
+
+    def apply_enrichments(self, results: list):
+        changed = set()
+        for result in results:
+            record = self.results_by_host.get(result.address)
+            if not isinstance(record, HostRecord):
+                continue
+            if not record.ports.set_scripts(result.protocol, result.port, result.scripts):
+                continue
+            self.scan_index.add(record)
+            self.scanner.yaml_cache.discard((self.results_generation, result.address))
+            changed.add(result.address)
+        # The selected host is re-rendered once per batch, not per result.
+        item = self.host_selection.get_selected_item()
+        if item is not None and item.key in changed:
+            self.viewer.show(self.render_host_results(item.key), keep_folds=True)
+
+    def load_history_page(self, offset: Optional[int] = None):
+        if offset is not None:
+            self.history_offset = max(0, offset)
+        scans = self.history.list_scans(
+            limit=HISTORY_PAGE_SIZE, offset=self.history_offset
         )
-        GLib.idle_add(self.nmap_target_entryrow.set_sensitive, True)
+        has_older = self.history_offset + len(scans) < self.history.count_scans()
+
+        # Entries are either a ScanSummary or the offset of another page.
+        self.history_entries = [None]
+        labels = ["Select a previous scan"]
+        if self.history_offset > 0:
+            self.history_entries.append(self.history_offset - HISTORY_PAGE_SIZE)
+            labels.append("Newer scans…")
+        for scan in scans:
+            self.history_entries.append(scan)
+            labels.append(scan.label)
+        if has_older:
+            self.history_entries.append(self.history_offset + HISTORY_PAGE_SIZE)
+            labels.append("Older scans…")
+
+        self.updating_history = True
+        self.nmap_history_dropdown.set_model(Gtk.StringList.new(labels))
+        self.nmap_history_dropdown.set_selected(0)
+        self.updating_history = False
+        return False
+
+    def on_nmap_history_dropdown_changed(
+        self, combo_row: Gtk.Widget, gparam: GObject.ParamSpec
+    ):
+        if self.updating_history:
+            return
+        index = combo_row.get_selected()
+        if index >= len(self.history_entries):
+            return
+        entry = self.history_entries[index]
+        if entry is None:
+            return
+        if isinstance(entry, int):
+            self.load_history_page(entry)
+            return
+
+        status_message = f"Loading scan of {entry.target}..."
+        self.set_scan_status(ScanStatus.IN_PROGRESS.value[0], status_message)
+        # Only the latest selection is shown; an earlier load is dropped.
+        self.history_tasks.spawn(
+            self._load_history_task,
+            entry.scan_id,
+            on_done=self.show_history_scan,
+            on_error=self.on_history_load_failed,
+            replace=True,
+        )
+
+    def _load_history_task(self, scan_id: int):
+        hosts = self.history.load_scan(scan_id)
+        index = ScanIndex.from_hosts(hosts.values())
+        host_list = list(hosts)
+        results = dict(hosts)
+        summary = self.scan_summary(hosts)
+        if summary is not None:
+            results[SUMMARY_ENTRY] = summary
+            host_list.insert(0, SUMMARY_ENTRY)
+        return scan_id, (host_list, results, index)
+
+    def show_history_scan(self, loaded):
+        scan_id, view = loaded
+        self.displayed_scan_id = scan_id
+        self.update_nmap_results_view(view)
+        self.set_scan_status(ScanStatus.COMPLETE.value[0], "Scan complete")
+
+    def on_history_load_failed(self, e: Exception):
+        logging.error(f"Failed to load scan from history: {e}")
+        self.set_scan_status(ScanStatus.COMPLETE.value[0], "Scan complete")
+
+    def on_nmap_export_row_activated(self, row: Gtk.Widget):
+        file_filters = Gio.ListStore.new(Gtk.FileFilter)
+        for export_format in ExportFormat:
+            file_filter = Gtk.FileFilter()
+            file_filter.set_name(f"{export_format.label} (*.{export_format.extension})")
+            file_filter.add_suffix(export_format.extension)
+            file_filters.append(file_filter)
+        dialog = Gtk.FileDialog()
+        dialog.set_title("Export Scan Results")
+        dialog.set_initial_name(f"scan-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        dialog.set_filters(file_filters)
+        dialog.save(self.get_root(), None, self.on_export_file_chosen)
+
+    def on_export_file_chosen(self, dialog: Gtk.FileDialog, result: Gio.AsyncResult):
+        try:
+            export_file = dialog.save_finish(result)
+        except GLib.Error:
+            return
+        if export_file is not None and export_file.get_path():
+            self.start_export(export_file.get_path())
+
+    def start_export(self, path: str):
+        """
+        Export the displayed results to ``path`` in the background.
+
+        While a scan is running the export follows it, writing hosts as they
+        arrive; a stored scan is streamed from the history database, so its
+        hosts are never all held in memory for the export.
+        """
+        if self.live_export is not None:
+            self.nmap_export_row.set_subtitle("An export is already running")
+            return
+        export_format = ExportFormat.from_path(path)
+        info = {"target": self.nmap_target_entryrow.get_text().strip()}
+        self.nmap_export_row.set_subtitle(f"Exporting to {path}...")
+
+        def on_done(count: int, error: Optional[str] = None):
+            self.export_tasks.ui(self.on_export_done, path, count, error)
+
+        if self.scan_running:
+            self.live_export = ResultExport(path, export_format, info, on_done).start()
+            self.live_export.feed(
+                record
+                for record in self.results_by_host.values()
+                if isinstance(record, HostRecord)
+            )
+            return
+
+        if self.displayed_scan_id is not None:
+            summary = self.history.get_scan(self.displayed_scan_id)
+            if summary is not None:
+                info = {
+                    "target": summary.target,
+                    "arguments": summary.arguments,
+                    "started_at": summary.started_at,
+                }
+            records = self.history.stream_hosts(self.displayed_scan_id)
+        else:
+            records = [
+                record
+                for record in self.results_by_host.values()
+                if isinstance(record, HostRecord)
+            ]
+        try:
+            self.export_tasks.spawn(
+                self._export_task, records, path, export_format, info, on_done
+            )
+        except runtime.RuntimeBusy:
+            self.nmap_export_row.set_subtitle("Wait for the running exports to finish")
+
+    def _export_task(self, records, path, export_format, info, on_done):
+        try:
+            on_done(export_records(records, path, export_format, info))
+        except Exception as e:
+            logging.error(f"Export to {path} failed: {e}")
+            on_done(0, str(e))
+
+    def finish_scan_export(self, hosts: dict):
+        self.scan_running = False
+        logging.info(f"Scan result updates: {self.updates.stats()}")
+        if self.live_export is not None:
+            self.live_export.feed(
+                record for record in hosts.values() if isinstance(record, HostRecord)
+            )
+            self.live_export.finish()
+
+    def on_export_done(self, path: str, count: int, error: Optional[str] = None):
+        self.live_export = None
+        if error:
+            self.nmap_export_row.set_subtitle(f"Export failed: {error}")
+        else:
+            self.nmap_export_row.set_subtitle(f"Exported {count} hosts to {path}")
 
     def handle_scan_error(self, target: str, error_message: str):
-        nmap_item = NmapItem(key=target, value=error_message)
-        self.nmap_target_listbox_store.append(nmap_item)
+        nmap_item = NmapItem(key=target, value="error")
+        self.nmap_target_store.append(nmap_item)
         self.results_by_host[target] = error_message
-        self.source_buffer.set_text(error_message)
+        self.viewer.show(error_message)
 
         self.set_visible(
             self.source_view,
-            self.nmap_target_listbox,
+            self.nmap_target_columnview,
             self.nmap_results_frame,
             self.nmap_target_frame,
             self.nmap_target_scrolled_window,
@@ -217,91 +874,117 @@ class NmapPage(Gtk.Box):
         )
         self.refresh_source_view()
 
-    def on_nmap_target_listbox_row_selected(
-        self, listbox: Gtk.ListBox, row: Gtk.ListBoxRow
+    def on_nmap_host_filter_changed(self, entry: Gtk.SearchEntry):
+        text = entry.get_text().strip()
+        entry.remove_css_class("error")
+        entry.set_tooltip_text(None)
+
+        if text and looks_like_query(text):
+            try:
+                with tracing.span("index.query", "render", query=text) as span:
+                    matches = self.scan_index.query(text)
+                    # Counting a "not" query walks it, so it is done once.
+                    count = len(matches)
+                    span.set(matches=count)
+            except QueryError as e:
+                entry.add_css_class("error")
+                entry.set_tooltip_text(str(e))
+                return
+            logging.debug(f"Filter '{text}' matched {count} hosts")
+            self.host_filter_model.set_filter(
+                Gtk.CustomFilter.new(lambda item: item.key in matches)
+            )
+            return
+
+        for index in range(self.host_filter.get_n_items()):
+            self.host_filter.get_item(index).set_search(text)
+        # Leaving the filter unset when the entry is empty skips the filter
+        # pass over the store entirely.
+        self.host_filter_model.set_filter(self.host_filter if text else None)
+
+    @tracing.traced("ui.select_host", "render")
+    def on_nmap_target_selection_changed(
+        self, selection: Gtk.SingleSelection, gparam: GObject.ParamSpec
     ):
-        logging.debug("on_nmap_target_listbox_row_selected called")
-        if row is not None:
-            child = row.get_child()
-            if isinstance(child, Gtk.Label):
-                selected_target = child.get_label()
-                logging.debug(
-                    f"Row selected: {row.get_index()} - Target: {selected_target}"
-                )
+        item = selection.get_selected_item()
+        if item is not None:
+            selected_target = item.key
+            logging.debug(f"Host selected: {selected_target}")
 
-                results = self.results_by_host.get(selected_target, "")
-                logging.debug(f"Results for {selected_target}: {results[:200]}")
+            results = self.render_host_results(selected_target)
 
-                if results:
-                    self.source_buffer.set_text(results)
-                    self.refresh_source_view()
-                    logging.debug(
-                        f"Source view updated with results for {selected_target}"
-                    )
-                else:
-                    logging.warning(f"No results found for {selected_target}")
+            if results:
+                self.viewer.show(results)
+                self.refresh_source_view()
             else:
-                logging.error("Row child is not a Gtk.Label, cannot retrieve target")
+                logging.warning(f"No results found for {selected_target}")
         else:
             logging.debug("No row is currently selected.")
-            self.source_buffer.set_text("")
+            self.viewer.clear()
             self.refresh_source_view()
             logging.debug("Cleared source view because no row is selected")
 
+    def render_host_results(self, host: str) -> str:
+        host_data = self.results_by_host.get(host)
+        if host_data is None:
+            return ""
+        return self.scanner.render_host_yaml((self.results_generation, host), host_data)
+
     def refresh_source_view(self):
-        logging.debug("Entering refresh_source_view")
         if not self.source_view:
             logging.error("Source view is None; cannot refresh")
             return
 
-        logging.debug(
-            f"Source buffer text length: {len(self.source_buffer.get_text(self.source_buffer.get_start_iter(), self.source_buffer.get_end_iter(), False))}"
-        )
+        if tracing.enabled():
+            tracing.instant(
+                "ui.refresh_source_view",
+                "render",
+                chars=self.source_buffer.get_char_count(),
+                total_chars=len(self.viewer.text),
+            )
         self.source_view.queue_draw()
 
         parent = self.source_view.get_parent()
         if parent:
-            logging.debug(
-                "Source view has a parent; queuing resize and redraw for the parent"
-            )
             parent.queue_resize()
             parent.queue_draw()
         else:
             logging.warning(
                 "Source view does not have a parent; skipping parent refresh"
             )
-        logging.debug("Exiting refresh_source_view")
 
+    @tracing.traced("ui.update_results_view", "render")
     def update_nmap_results_view(self, args: tuple):
         logging.debug("update_nmap_results_view called")
-        hosts, results = args
-        self.nmap_target_listbox_store.remove_all()
-        self.source_buffer.set_text("")
+        hosts, results, *rest = args
+        self.scan_index = rest[0] if rest else ScanIndex.from_hosts(
+            host_data for host_data in results.values() if isinstance(host_data, HostRecord)
+        )
+        self.viewer.clear()
 
+        # Host results stay structured; YAML is only rendered when a host is
+        # selected, so a new generation invalidates the rendered cache.
+        self.results_generation += 1
+        self.scanner.yaml_cache.clear()
         self.results_by_host = {}
+        items = []
         for target in hosts:
-            result_text = results.get(target, "No results available")
-            logging.debug(f"Adding target: {target} with results: {result_text[:200]}")
-            nmap_item = NmapItem(key=target, value=result_text)
-            self.nmap_target_listbox_store.append(nmap_item)
-            self.results_by_host[target] = result_text
-
-        logging.debug(
-            f"Total items in list store after update: {self.nmap_target_listbox_store.get_n_items()}"
-        )
+            host_data = results.get(target, "No results available")
+            items.append(NmapItem.from_result(target, host_data))
+            self.results_by_host[target] = host_data
 
-        if hosts:
-            first_host = self.nmap_target_listbox_store.get_item(0)
-            if first_host:
-                logging.debug(f"Automatically selecting first host: {first_host.key}")
-                self.nmap_target_listbox.select_row(
-                    self.nmap_target_listbox.get_row_at_index(0)
-                )
-                self.source_buffer.set_text(self.results_by_host[first_host.key])
+        # A single splice emits one items-changed signal for the whole scan.
+        self.nmap_target_store.splice(0, self.nmap_target_store.get_n_items(), items)
+        logging.debug(f"Total items in host store after update: {len(items)}")
+
+        if items:
+            self.host_selection.set_selected(0)
+        if self.nmap_host_filter_entry.get_text().strip():
+            self.on_nmap_host_filter_changed(self.nmap_host_filter_entry)
 
         self.set_visible(
             self.source_view,
-            self.nmap_target_listbox,
+            self.nmap_target_columnview,
             self.nmap_results_frame,
             self.nmap_target_frame,
             self.nmap_target_scrolled_window,
@@ -319,12 +1002,12 @@ class NmapPage(Gtk.Box):
             self.nmap_status.set_visible(False)
 
     def clear_results(self):
-        self.nmap_target_listbox_store.remove_all()
-        self.source_buffer.set_text("")
+        self.nmap_target_store.remove_all()
+        self.viewer.clear()
         self.set_visible(
             self.nmap_results_frame,
             self.nmap_target_frame,
-            self.nmap_target_listbox,
+            self.nmap_target_columnview,
             self.source_view,
             visible=False,
         )
@@ -341,12 +1024,3 @@ class NmapPage(Gtk.Box):
 
     def on_nmap_scripts_dropdown_changed(self):
         self.selected_script = self.get_selected_script()
-
-    def create_listbox_row(
-        self, item: NmapItem, user_data: any = None
-    ) -> Gtk.ListBoxRow:
-        label = Gtk.Label(label=item.key)
-        row = Gtk.ListBoxRow()
-        row.set_child(label)
-        logging.debug(f"Created listbox row for item: {item.key}")
-        return row
@@ -1,18 +1,46 @@
 # nmap_scanner.py
 import logging
-import re
-from concurrent.futures import ThreadPoolExecutor
+import shlex
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
 from enum import Enum
-from typing import Any, Dict, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 import nmap
 import yaml
 
+from . import metrics, tracing
+from .connect_scanner import ConnectScanner
+from .nse import (
+    ScriptResult,
+    attach_script_results,
+    host_fingerprint,
+    script_results_for,
+    service_fingerprint,
+)
+from .result_parser import ResultParser
+from .scan_diff import RescanPlan
+from .scan_history import ScanHistory, ScriptCacheEntry
+from .scan_model import HostRecord
+from .scan_rate import ShardStats, parse_shard_stats
+from .targets import TargetError, TargetSet, compile_targets, split_by_family
+
+# Use the libyaml emitter when PyYAML was built with it; it is several times
+# faster than the pure Python dumper on large script outputs.
+YamlDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+YAML_CACHE_SIZE = 256
+
 
 class ScanOptions(Enum):
     DEFAULT = "-T4"
     OS_FINGERPRINTING = "-O -A"
+    VERSION_DETECTION = "-sV"
     ALL_PORTS = "-p-"
+    PORTS = "-p "
+    SKIP_DISCOVERY = "-Pn"
+    IPV6 = "-6"
     SCRIPT = "--script="
 
 
@@ -22,44 +50,82 @@ class ScanStatus(Enum):
     FAILED = (1.0, "Scan failed unexpectedly")
 
 
-class NmapScanner:
-    def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=4)
+class YamlCache:
+    """A bounded, thread-safe LRU of rendered YAML documents."""
 
-    def __del__(self):
-        self.executor.shutdown(wait=True)
+    def __init__(self, maxsize: int = YAML_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Any, str]" = OrderedDict()
+        self._lock = threading.Lock()
 
-    def validate_target_input(self, target: str) -> bool:
-        ipv4_segment = r"(25[0-5]|2[0-4][0-9]|1[0-9]{2}|[1-9]?[0-9]|0)"
-        ipv4_address = r"(?:{}\.{}\.{}\.{})".format(
-            ipv4_segment, ipv4_segment, ipv4_segment, ipv4_segment
-        )
-        fqdn = r"(?:[A-Za-z0-9-]{1,63}\.)+[A-Za-z]{2,}"
-        cidr = r"{}\/[0-9]{{1,2}}".format(
-            ipv4_address
-        )  # Escaping curly braces for the CIDR notation
+    def get(self, key: Any) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
 
-        addr_regex = (
-            r"^(localhost|" r"{}|" r"{}|" r"{})$".format(ipv4_address, fqdn, cidr)
-        )
+    def put(self, key: Any, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
 
-        targets = re.split(r"[ ,]+", target.strip())
+    def discard(self, key: Any):
+        with self._lock:
+            self._entries.pop(key, None)
 
-        for t in targets:
-            if re.match(addr_regex, t):
-                logging.debug(f"Target '{t}' matched the pattern.")
-            else:
-                logging.debug(f"Target '{t}' did NOT match the pattern.")
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
 
-        return all(re.match(addr_regex, t) for t in targets)
+
+class NmapScanner:
+    def __init__(self):
+        self.parser = ResultParser()
+        self.yaml_cache = YamlCache()
+
+    def __del__(self):
+        self.parser.shutdown()
+
+    def validate_target_input(self, target: str) -> bool:
+        try:
+            targets = compile_targets(target)
+        except TargetError as e:
+            logging.debug(f"Target '{target}' is invalid: {e}")
+            return False
+        logging.debug(f"Target '{target}' compiled to {targets.summary()}.")
+        return True
 
     def build_nmap_options(
-        self, os_fingerprinting: bool, scan_all_ports: bool, selected_script: str
+        self,
+        os_fingerprinting: bool,
+        scan_all_ports: bool,
+        selected_script: str,
+        ports: Optional[Iterable[int]] = None,
+        skip_discovery: bool = False,
+        timing: Optional[str] = None,
+        ipv6: bool = False,
+        version_detection: bool = False,
     ) -> str:
         options = ScanOptions.DEFAULT.value
+        if ipv6:
+            options += f" {ScanOptions.IPV6.value}"
+        if timing:
+            # Explicit timing options override the template's values.
+            options += f" {timing}"
+        if skip_discovery:
+            options += f" {ScanOptions.SKIP_DISCOVERY.value}"
         if os_fingerprinting:
+            # -A includes version detection.
             options += f" {ScanOptions.OS_FINGERPRINTING.value}"
-        if scan_all_ports:
+        elif version_detection:
+            options += f" {ScanOptions.VERSION_DETECTION.value}"
+        if ports:
+            port_list = ",".join(str(port) for port in sorted(ports))
+            options += f" {ScanOptions.PORTS.value}{port_list}"
+        elif scan_all_ports:
             options += f" {ScanOptions.ALL_PORTS.value}"
         if selected_script and selected_script != "None":
             options += f" {ScanOptions.SCRIPT.value}{selected_script}"
@@ -68,46 +134,318 @@ class NmapScanner:
 
     def run_nmap_scan(
         self,
-        target: str,
+        targets: Sequence[str],
         os_fingerprinting: bool,
         scan_all_ports: bool,
         selected_script: str,
-    ):
-        logging.debug(
-            f"Running Nmap scan for target: {target} with options: {self.build_nmap_options(os_fingerprinting, scan_all_ports, selected_script)}"
+        ports: Optional[Iterable[int]] = None,
+        skip_discovery: bool = False,
+        timing: Optional[str] = None,
+        ipv6: bool = False,
+        on_hosts: Optional[Callable[[Dict[str, HostRecord]], None]] = None,
+        version_detection: bool = False,
+    ) -> Dict[str, HostRecord]:
+        """
+        Run one nmap scan of ``targets``, nmap target specifications, and
+        return its host records.
+
+        nmap's XML output is parsed by the parser processes, so a large scan
+        does not hold the GIL of the process running the UI; ``on_hosts`` is
+        called with each parsed batch of records.
+        """
+        options = self.build_nmap_options(
+            os_fingerprinting,
+            scan_all_ports,
+            selected_script,
+            ports,
+            skip_discovery,
+            timing,
+            ipv6,
+            version_detection,
         )
+        xml_output, _ = self.run_nmap_xml(targets, options)
+        return self.parser.parse(xml_output, on_hosts)
+
+    def run_nmap_shard(
+        self,
+        targets: Sequence[str],
+        os_fingerprinting: bool,
+        scan_all_ports: bool,
+        selected_script: str,
+        timing: Optional[str] = None,
+        ipv6: bool = False,
+    ) -> Tuple[Dict[str, HostRecord], ShardStats]:
+        """Scan one pipeline shard; also returns its timing statistics."""
         options = self.build_nmap_options(
-            os_fingerprinting, scan_all_ports, selected_script
+            os_fingerprinting,
+            scan_all_ports,
+            selected_script,
+            skip_discovery=True,
+            timing=timing,
+            ipv6=ipv6,
         )
-        try:
-            nm = nmap.PortScanner()
-            nm.scan(hosts=target, arguments=options)
-            logging.debug(f"Nmap scan completed with results: {nm.all_hosts()}")
-            return nm
-        except nmap.PortScannerError as e:
-            logging.error(f"Nmap scan failed: {e}")
-            raise e
-        except Exception as e:
-            logging.error(f"Unexpected error during scan: {e}")
-            raise e
-
-    def convert_results_to_yaml(self, nm: nmap.PortScanner) -> Dict[str, str]:
-        all_results = {}
-        for host in nm.all_hosts():
-            logging.debug(f"Processing results for host: {host}")
-            host_data = nm[host]
-            logging.debug(f"Raw host data: {host_data}")
-            plain_dict = self.to_plain_dict(host_data)
-            yaml_output = yaml.safe_dump(plain_dict, default_flow_style=False)
-            all_results[host] = yaml_output
-        return all_results
-
-    def to_plain_dict(self, data: Any) -> Union[Dict[str, Any], Any]:
-        if isinstance(data, nmap.PortScannerHostDict):
-            return {k: self.to_plain_dict(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self.to_plain_dict(item) for item in data]
-        elif isinstance(data, dict):
-            return {k: self.to_plain_dict(v) for k, v in data.items()}
-        else:
-            return data
+        xml_output, warnings = self.run_nmap_xml(targets, options)
+        return self.parser.parse(xml_output), parse_shard_stats(xml_output, warnings)
+
+    @staticmethod
+    def run_nmap_xml(targets: Sequence[str], options: str) -> Tuple[bytes, List[str]]:
+        """
+        Run nmap with ``-oX -`` and return its XML output and warnings.
+
+        Targets are written to nmap's standard input (``-iL -``) rather than
+        its command line, which a list of 100,000 scattered addresses would
+        overflow.
+
+        Raises:
+            nmap.PortScannerError: If nmap is missing or the scan failed.
+        """
+        nmap_path = shutil.which("nmap")
+        if nmap_path is None:
+            raise nmap.PortScannerError("nmap program was not found in path")
+        command = [nmap_path, "-oX", "-", *shlex.split(options), "-iL", "-"]
+        logging.debug(f"Running Nmap scan of {len(targets)} targets with options: {options}")
+        with tracing.span("nmap.run", "scan", targets=len(targets), options=options) as span:
+            with metrics.NMAP_SECONDS.time():
+                completed = subprocess.run(
+                    command,
+                    input="\n".join(targets).encode(),
+                    capture_output=True,
+                    check=False,
+                )
+            span.set(exit=completed.returncode, xml_bytes=len(completed.stdout))
+        warnings, errors = [], []
+        for line in completed.stderr.decode(errors="replace").splitlines():
+            if line.startswith("Warning"):
+                warnings.append(line)
+            elif line.strip():
+                errors.append(line)
+        if completed.returncode != 0 or b"<nmaprun" not in completed.stdout:
+            message = "\n".join(errors) or f"nmap exited with status {completed.returncode}"
+            logging.error(f"Nmap scan failed: {message}")
+            metrics.NMAP_RUNS.inc(result="error")
+            raise nmap.PortScannerError(message)
+        metrics.NMAP_RUNS.inc(result="ok")
+        for line in errors:
+            logging.warning(f"nmap: {line}")
+        return completed.stdout, warnings
+
+    @tracing.traced("scan.targets", "scan")
+    def scan_targets(
+        self,
+        targets: TargetSet,
+        os_fingerprinting: bool,
+        scan_all_ports: bool,
+        selected_script: str,
+        on_hosts: Optional[Callable[[Dict[str, HostRecord]], None]] = None,
+        version_detection: bool = False,
+    ) -> Dict[str, HostRecord]:
+        """
+        Scan a compiled target set, one nmap run per address family, with
+        overlaps already merged and exclusions applied.
+        """
+        hosts: Dict[str, HostRecord] = {}
+        with metrics.scan("nmap"):
+            for ipv6, expressions in targets.nmap_targets().items():
+                hosts.update(
+                    self.run_nmap_scan(
+                        expressions,
+                        os_fingerprinting,
+                        scan_all_ports,
+                        selected_script,
+                        ipv6=ipv6,
+                        on_hosts=on_hosts,
+                        version_detection=version_detection,
+                    )
+                )
+        metrics.SCAN_HOSTS.inc(len(hosts), engine="nmap")
+        return hosts
+
+    @staticmethod
+    def nmap_available() -> bool:
+        return shutil.which("nmap") is not None
+
+    @tracing.traced("scan.connect", "scan")
+    def run_connect_scan(
+        self,
+        targets: TargetSet,
+        scanner: ConnectScanner,
+        on_host: Optional[Callable[[HostRecord], None]] = None,
+    ) -> Dict[str, HostRecord]:
+        """
+        Scan with the built-in asyncio connect scanner instead of nmap.
+
+        The caller keeps ``scanner`` so it can cancel the scan. Results are
+        the same HostRecord objects nmap scans produce, so they feed the same
+        views, history and diffs.
+        """
+        logging.debug(f"Running built-in connect scan of {targets.summary()}")
+        return scanner.run(targets.hosts(), on_host)
+
+    def run_incremental_scan(
+        self,
+        plan: RescanPlan,
+        previous: Dict[str, HostRecord],
+        os_fingerprinting: bool,
+        scan_all_ports: bool,
+        selected_script: str,
+    ) -> Dict[str, HostRecord]:
+        """
+        Re-probe only the hosts and ports selected by an incremental rescan plan
+        and merge the fresh results over the previous scan.
+
+        Hosts that the plan probes but nmap no longer reports are dropped, so
+        they show up as missing when the merged result is diffed.
+        """
+        merged = {host: previous[host] for host in plan.carried_hosts}
+
+        for ipv6, hosts in split_by_family(plan.full_hosts).items():
+            merged.update(
+                self.run_nmap_scan(
+                    hosts,
+                    os_fingerprinting,
+                    scan_all_ports,
+                    selected_script,
+                    ipv6=ipv6,
+                )
+            )
+
+        if plan.port_hosts:
+            ports = set().union(*plan.port_hosts.values())
+            for ipv6, hosts in split_by_family(plan.port_hosts).items():
+                records = self.run_nmap_scan(
+                    hosts, False, False, selected_script, ports, ipv6=ipv6
+                )
+                for host, record in records.items():
+                    merged[host] = (
+                        previous[host].with_ports(record) if host in previous else record
+                    )
+
+        return merged
+
+    def run_cached_script_scan(
+        self,
+        targets: TargetSet,
+        os_fingerprinting: bool,
+        scan_all_ports: bool,
+        selected_script: str,
+        cache: ScanHistory,
+        max_age: float,
+    ) -> Dict[str, HostRecord]:
+        """
+        Run a script scan, reusing script output cached from earlier scans.
+
+        The targets are first scanned with version detection but without
+        scripts. Ports whose service fingerprint matches a cached run of the same script selection, younger
+        than ``max_age`` seconds, get the cached output; the script is then run
+        only against the remaining ports of the hosts that have them, and its
+        results are cached in turn.
+        """
+        # Fingerprints need nmap's product and version, not only its guess
+        # of the service from the port number, or an upgraded service would
+        # still match the cached output of the old one.
+        hosts = self.scan_targets(
+            targets, os_fingerprinting, scan_all_ports, "None", version_detection=True
+        )
+
+        misses: Dict[str, Set[int]] = {}
+        fingerprints: Dict[str, Dict[Tuple[Optional[str], Optional[int]], str]] = {}
+        hits = 0
+        for address, host in hosts.items():
+            locations = [
+                (protocol, port, service_fingerprint(service))
+                for (protocol, port), service in host.open_ports().items()
+            ]
+            locations.append((None, None, host_fingerprint(host)))
+            for protocol, port, fingerprint in locations:
+                cached = cache.cached_scripts(
+                    address, protocol, port, selected_script, fingerprint, max_age
+                )
+                if cached is None:
+                    fingerprints.setdefault(address, {})[(protocol, port)] = fingerprint
+                    if port is not None:
+                        misses.setdefault(address, set()).add(port)
+                    else:
+                        misses.setdefault(address, set())
+                else:
+                    hits += 1
+                    attach_script_results(host, cached)
+
+        missed = sum(len(locations) for locations in fingerprints.values())
+        logging.info(f"Script cache: {hits} hits, {missed} misses on {len(misses)} hosts")
+        metrics.SCRIPT_CACHE.inc(hits, result="hit")
+        metrics.SCRIPT_CACHE.inc(missed, result="miss")
+        if not misses:
+            return hosts
+
+        # Hosts are grouped by the ports left to script, so one nmap run
+        # covers every host that needs the same ports.
+        groups: Dict[Tuple[int, ...], List[str]] = {}
+        for address, ports in misses.items():
+            groups.setdefault(tuple(sorted(ports)), []).append(address)
+        entries: List[ScriptCacheEntry] = []
+        for ports, addresses in groups.items():
+            for ipv6, family in split_by_family(addresses).items():
+                records = self.run_nmap_scan(
+                    family,
+                    False,
+                    False,
+                    selected_script,
+                    ports or None,
+                    skip_discovery=True,
+                    ipv6=ipv6,
+                )
+                for address in family:
+                    entries.extend(
+                        self._script_results_to_cache(
+                            hosts[address], records.get(address), fingerprints[address]
+                        )
+                    )
+        cache.store_scripts_many(selected_script, entries)
+        return hosts
+
+    @staticmethod
+    def _script_results_to_cache(
+        host: HostRecord,
+        fresh: Optional[HostRecord],
+        fingerprints: Dict[Tuple[Optional[str], Optional[int]], str],
+    ) -> List[ScriptCacheEntry]:
+        # Locations that produced no output are cached too, so scripts that
+        # found nothing are not re-run on the next scan.
+        entries = []
+        for (protocol, port), fingerprint in fingerprints.items():
+            results: List[ScriptResult] = (
+                script_results_for(fresh, protocol, port) if fresh is not None else []
+            )
+            attach_script_results(host, results)
+            entries.append((host.address, protocol, port, fingerprint, results))
+        return entries
+
+    @staticmethod
+    def dump_yaml(data: Any) -> str:
+        if isinstance(data, HostRecord):
+            data = data.to_dict()
+        return yaml.dump(data, Dumper=YamlDumper, default_flow_style=False)
+
+    def render_host_yaml(self, key: Any, host_data: Any) -> str:
+        """
+        Serialize a single host's results, memoized in a bounded LRU.
+
+        Args:
+            key: A cache key that changes whenever the host data changes,
+                e.g. ``(results_generation, host)``.
+            host_data: A HostRecord, another structured result such as a
+                scan diff, or an error message.
+
+        Returns:
+            str: The YAML text for the host.
+        """
+        if isinstance(host_data, str):
+            return host_data
+        yaml_output = self.yaml_cache.get(key)
+        metrics.YAML_CACHE.inc(result="miss" if yaml_output is None else "hit")
+        if yaml_output is None:
+            with tracing.span("render.yaml", "render") as span:
+                yaml_output = self.dump_yaml(host_data)
+                span.set(chars=len(yaml_output))
+            self.yaml_cache.put(key, yaml_output)
+        return yaml_output
@@ -0,0 +1,180 @@
+# nse.py
+import hashlib
+import logging
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+from .scan_model import HostRecord, ServiceRecord
+
+# Structured script data is kept in HostRecord.extra under this key, by
+# "<port>/<protocol>" for port scripts and "host" for host scripts.
+NSE_EXTRA_KEY = "nse"
+HOST_SCRIPTS = "host"
+INTEGER_REGEX = re.compile(r"^-?(?:0|[1-9][0-9]{0,17})$")
+
+ScriptData = Union[Dict[str, Any], List[Any], str, int, bool, None]
+
+
+@dataclass(frozen=True)
+class ScriptResult:
+    """One NSE script's output for a host, or for one of its ports."""
+
+    address: str
+    script_id: str
+    output: str
+    data: ScriptData = None
+    protocol: Optional[str] = None
+    port: Optional[int] = None
+
+    @property
+    def location(self) -> str:
+        return HOST_SCRIPTS if self.port is None else f"{self.port}/{self.protocol}"
+
+
+def _value(text: Optional[str]) -> Union[str, int, bool, None]:
+    if text is None:
+        return None
+    if text in ("true", "false"):
+        return text == "true"
+    if INTEGER_REGEX.match(text):
+        return int(text)
+    return text
+
+
+def parse_table(element: ET.Element) -> ScriptData:
+    """
+    Convert a ``<script>`` or ``<table>`` element's children to Python data.
+
+    Keyed ``<elem>``/``<table>`` children become a dict, unkeyed ones a list,
+    matching how NSE scripts build their structured output. Mixed tables
+    keep unkeyed children under their 1-based Lua index.
+    """
+    keyed: Dict[str, Any] = {}
+    unkeyed: List[Any] = []
+    for child in element:
+        if child.tag == "elem":
+            value = _value(child.text)
+        elif child.tag == "table":
+            value = parse_table(child)
+        else:
+            continue
+        key = child.get("key")
+        if key is None:
+            unkeyed.append(value)
+        else:
+            keyed[key] = value
+    if not keyed:
+        return unkeyed
+    for index, value in enumerate(unkeyed, start=1):
+        keyed.setdefault(str(index), value)
+    return keyed
+
+
+def _script_results(
+    element: ET.Element, address: str, protocol: Optional[str], port: Optional[int]
+) -> List[ScriptResult]:
+    results = []
+    for script in element.findall("script"):
+        data = parse_table(script)
+        results.append(
+            ScriptResult(
+                address,
+                script.get("id", ""),
+                script.get("output", ""),
+                data or None,
+                protocol,
+                port,
+            )
+        )
+    return results
+
+
+def parse_nse_xml(xml_output: Union[str, bytes, None]) -> Dict[str, List[ScriptResult]]:
+    """
+    Parse every NSE result in nmap XML output.
+
+    Returns:
+        dict: Script results keyed by host address.
+    """
+    if not xml_output:
+        return {}
+    try:
+        root = ET.fromstring(xml_output)
+    except ET.ParseError as e:
+        logging.warning(f"Could not parse nmap XML for script output: {e}")
+        return {}
+
+    results: Dict[str, List[ScriptResult]] = {}
+    for host in root.iter("host"):
+        address = None
+        for entry in host.findall("address"):
+            if entry.get("addrtype") in ("ipv4", "ipv6"):
+                address = entry.get("addr")
+                break
+        if address is None:
+            continue
+        host_results = []
+        for port in host.findall("ports/port"):
+            host_results.extend(
+                _script_results(
+                    port, address, port.get("protocol"), int(port.get("portid", "0"))
+                )
+            )
+        hostscript = host.find("hostscript")
+        if hostscript is not None:
+            host_results.extend(_script_results(hostscript, address, None, None))
+        if host_results:
+            results[address] = host_results
+    return results
+
+
+def attach_script_results(host: HostRecord, results: List[ScriptResult]):
+    """Store script output and structured data on a host record."""
+    structured: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        if result.port is None:
+            if host.scripts is None:
+                host.scripts = {}
+            host.scripts[result.script_id] = result.output
+        else:
+            host.ports.set_scripts(result.protocol, result.port, {result.script_id: result.output})
+        if result.data is not None:
+            structured.setdefault(result.location, {})[result.script_id] = result.data
+    if structured:
+        extra = host.extra if host.extra is not None else {}
+        nse = extra.setdefault(NSE_EXTRA_KEY, {})
+        for location, scripts in structured.items():
+            nse.setdefault(location, {}).update(scripts)
+        host.extra = extra
+
+
+def script_results_for(host: HostRecord, protocol: Optional[str], port: Optional[int]):
+    """Rebuild the ScriptResults stored on a host for one port, or the host."""
+    location = HOST_SCRIPTS if port is None else f"{port}/{protocol}"
+    data = ((host.extra or {}).get(NSE_EXTRA_KEY) or {}).get(location, {})
+    if port is None:
+        outputs = host.scripts or {}
+    else:
+        row = host.ports.find(protocol, port)
+        outputs = (row.scripts if row else None) or {}
+    return [
+        ScriptResult(host.address, script_id, output, data.get(script_id), protocol, port)
+        for script_id, output in outputs.items()
+    ]
+
+
+def service_fingerprint(service: ServiceRecord) -> str:
+    """Identify a service well enough to tell when cached script output is stale."""
+    fields = (service.name, service.product, service.version, service.extrainfo, service.cpe)
+    return hashlib.sha1("\x1f".join(fields).encode()).hexdigest()
+
+
+def host_fingerprint(host: HostRecord) -> str:
+    """Fingerprint a host for host scripts: its open ports and their services."""
+    parts = sorted(
+        f"{port}/{protocol}:{service_fingerprint(service)}"
+        for (protocol, port), service in host.open_ports().items()
+    )
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
@@ -0,0 +1,320 @@
+# port_matrix.py
+import socket
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .scan_model import PROTOCOLS, STATES, HostRecord
+
+SUMMARY_TOP_N = 10
+SUMMARY_SUBNETS = 20
+DEFAULT_SUBNET_PREFIX = 24
+IPV6_SUBNET_PREFIX = 64
+# Subnet keys of IPv6 hosts are numbered above every possible IPv4 key.
+IPV6_KEY_BASE = 1 << 32
+
+# NumPy is optional, and slow to import, so it is loaded by the first
+# summary rather than with the Port Scan page.
+np = None
+
+
+def analytics_available() -> bool:
+    """Import NumPy if it is installed; analytics are disabled without it."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+@dataclass(frozen=True)
+class SubnetSummary:
+    subnet: str
+    hosts: int
+    hosts_up: int
+    open_ports: int
+    top_port: Optional[str]
+    top_service: Optional[str]
+    top_os: Optional[str]
+
+
+class PortMatrix:
+    """
+    Columnar, NumPy-backed view of a scan for estate-wide aggregates.
+
+    The host × port matrix is stored sparsely, CSR style: ``entry_host`` and
+    ``entry_port`` give the row and column of every open port, with its
+    service in ``entry_service``. Hosts have ``host_os`` and ``host_up``
+    columns and their IPv4 address as an integer, so histograms and subnet
+    rollups are ``bincount`` calls instead of loops over host records.
+    """
+
+    def __init__(
+        self,
+        addresses: List[str],
+        host_ipv4,
+        host_up,
+        host_os,
+        os_names: List[str],
+        ipv6_addresses: Dict[int, str],
+        entry_host,
+        entry_port,
+        entry_service,
+        port_labels: List[str],
+        service_names: List[str],
+    ):
+        self.addresses = addresses
+        self.host_ipv4 = host_ipv4
+        self.host_up = host_up
+        self.host_os = host_os
+        self.os_names = os_names
+        self.ipv6_addresses = ipv6_addresses
+        self.entry_host = entry_host
+        self.entry_port = entry_port
+        self.entry_service = entry_service
+        self.port_labels = port_labels
+        self.service_names = service_names
+
+    @classmethod
+    def from_hosts(cls, hosts: Iterable[HostRecord]) -> "PortMatrix":
+        """
+        Build the matrix from host records.
+
+        Raises:
+            RuntimeError: If NumPy is not installed.
+        """
+        if not analytics_available():
+            raise RuntimeError("Scan analytics need NumPy, which is not installed")
+        open_code = STATES.code("open")
+        up = "up"
+        addresses: List[str] = []
+        ipv4: List[int] = []
+        ipv6_addresses: Dict[int, str] = {}
+        host_up: List[bool] = []
+        host_os: List[int] = []
+        os_codes: Dict[str, int] = {}
+        entry_host: List[int] = []
+        entry_port: List[int] = []
+        entry_service: List[int] = []
+        port_codes: Dict[int, int] = {}
+        service_codes: Dict[str, int] = {}
+        inet_aton, from_bytes = socket.inet_aton, int.from_bytes
+
+        for row, host in enumerate(hosts):
+            address = host.address
+            addresses.append(address)
+            if ":" in address:
+                ipv4.append(0)
+                ipv6_addresses[row] = address
+            else:
+                try:
+                    ipv4.append(from_bytes(inet_aton(address), "big"))
+                except OSError:
+                    ipv4.append(0)
+            host_up.append(host.state == up)
+            host_os.append(
+                os_codes.setdefault(host.os_name, len(os_codes)) if host.os_name else -1
+            )
+
+            table = host.ports
+            for index, state in enumerate(table.states):
+                if state != open_code:
+                    continue
+                # Columns are keyed by protocol and port in one integer.
+                key = table.protocols[index] << 16 | table.ports[index]
+                service = table.services.get(index)
+                name = service.name if service is not None else ""
+                entry_host.append(row)
+                entry_port.append(port_codes.setdefault(key, len(port_codes)))
+                entry_service.append(service_codes.setdefault(name, len(service_codes)))
+
+        port_labels = [f"{key & 0xFFFF}/{PROTOCOLS[key >> 16]}" for key in port_codes]
+        return cls(
+            addresses,
+            np.array(ipv4, dtype=np.uint32),
+            np.array(host_up, dtype=bool),
+            np.array(host_os, dtype=np.int32),
+            list(os_codes),
+            ipv6_addresses,
+            np.array(entry_host, dtype=np.int32),
+            np.array(entry_port, dtype=np.int32),
+            np.array(entry_service, dtype=np.int32),
+            port_labels,
+            [name or "unknown" for name in service_codes],
+        )
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    @property
+    def open_ports(self) -> int:
+        return len(self.entry_host)
+
+    def dense(self, columns: Optional[List[str]] = None):
+        """
+        Return the host × port matrix as a dense boolean array, for the given
+        ``port/protocol`` columns or every open port column.
+        """
+        if columns is None:
+            selected = np.arange(len(self.port_labels))
+        else:
+            positions = {label: i for i, label in enumerate(self.port_labels)}
+            selected = np.array([positions.get(label, -1) for label in columns], dtype=np.int64)
+        remap = np.full(len(self.port_labels), -1, dtype=np.int64)
+        known = selected[selected >= 0]
+        remap[known] = np.nonzero(selected >= 0)[0]
+        matrix = np.zeros((len(self.addresses), len(selected)), dtype=bool)
+        column = remap[self.entry_port] if len(self.entry_port) else self.entry_port
+        keep = column >= 0
+        matrix[self.entry_host[keep], column[keep]] = True
+        return matrix
+
+    def hosts_with_port(self, label: str) -> List[str]:
+        try:
+            column = self.port_labels.index(label)
+        except ValueError:
+            return []
+        rows = np.unique(self.entry_host[self.entry_port == column])
+        return [self.addresses[row] for row in rows]
+
+    def port_histogram(self):
+        """Number of hosts with each port open, indexed like ``port_labels``."""
+        return np.bincount(self.entry_port, minlength=len(self.port_labels))
+
+    def service_histogram(self):
+        return np.bincount(self.entry_service, minlength=len(self.service_names))
+
+    def os_histogram(self):
+        known = self.host_os[self.host_os >= 0]
+        return np.bincount(known, minlength=len(self.os_names))
+
+    @staticmethod
+    def top(counts, labels: List[str], n: int = SUMMARY_TOP_N) -> List[Tuple[str, int]]:
+        """The ``n`` largest non-zero counts with their labels, largest first."""
+        if not len(counts):
+            return []
+        n = min(n, len(counts))
+        candidates = np.argpartition(counts, -n)[-n:]
+        ordered = candidates[np.argsort(-counts[candidates], kind="stable")]
+        return [(labels[i], int(counts[i])) for i in ordered if counts[i]]
+
+    def subnet_keys(self, prefix: int = DEFAULT_SUBNET_PREFIX):
+        """
+        Return each host's subnet as an index into the returned labels.
+
+        IPv4 hosts are grouped by ``prefix`` (1 to 32); IPv6 hosts by /64.
+        """
+        keys = self.host_ipv4.astype(np.int64) >> (32 - prefix)
+        ipv6_codes: Dict[int, int] = {}
+        ipv6_labels: Dict[int, str] = {}
+        host_bits = 128 - IPV6_SUBNET_PREFIX
+        for row, address in self.ipv6_addresses.items():
+            network = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), "big")
+            network >>= host_bits
+            code = ipv6_codes.get(network)
+            if code is None:
+                code = ipv6_codes[network] = IPV6_KEY_BASE + len(ipv6_codes)
+                label = socket.inet_ntop(
+                    socket.AF_INET6, (network << host_bits).to_bytes(16, "big")
+                )
+                ipv6_labels[code] = f"{label}/{IPV6_SUBNET_PREFIX}"
+            keys[row] = code
+
+        unique, inverse = np.unique(keys, return_inverse=True)
+        labels = []
+        for key in unique.tolist():
+            if key >= IPV6_KEY_BASE:
+                labels.append(ipv6_labels[key])
+            else:
+                network = socket.inet_ntoa((key << (32 - prefix)).to_bytes(4, "big"))
+                labels.append(f"{network}/{prefix}")
+        return inverse.astype(np.int64), labels
+
+    @staticmethod
+    def _top_per_subnet(subnets, count: int, codes, rows, n_codes: int):
+        """
+        The most frequent of ``codes`` in each subnet, or -1 where there is
+        none; ``rows`` are the hosts the codes belong to.
+        """
+        if not n_codes or not len(codes):
+            return np.full(count, -1, dtype=np.int64)
+        table = np.bincount(
+            subnets[rows] * n_codes + codes, minlength=count * n_codes
+        ).reshape(count, n_codes)
+        best = table.argmax(axis=1)
+        best[table.max(axis=1) == 0] = -1
+        return best
+
+    def subnet_rollup(
+        self, prefix: int = DEFAULT_SUBNET_PREFIX, limit: Optional[int] = None
+    ) -> List[SubnetSummary]:
+        """
+        Summarize every subnet: host and open port counts and its most common
+        port, service and OS. Subnets with the most open ports come first.
+        """
+        subnets, labels = self.subnet_keys(prefix)
+        count = len(labels)
+        hosts = np.bincount(subnets, minlength=count)
+        hosts_up = np.bincount(subnets[self.host_up], minlength=count)
+        open_ports = np.bincount(subnets[self.entry_host], minlength=count)
+
+        top_port = self._top_per_subnet(
+            subnets, count, self.entry_port, self.entry_host, len(self.port_labels)
+        )
+        top_service = self._top_per_subnet(
+            subnets, count, self.entry_service, self.entry_host, len(self.service_names)
+        )
+        has_os = np.nonzero(self.host_os >= 0)[0]
+        top_os = self._top_per_subnet(
+            subnets, count, self.host_os[has_os], has_os, len(self.os_names)
+        )
+
+        order = np.lexsort((np.arange(count), -open_ports))
+        if limit is not None:
+            order = order[:limit]
+        return [
+            SubnetSummary(
+                labels[i],
+                int(hosts[i]),
+                int(hosts_up[i]),
+                int(open_ports[i]),
+                self.port_labels[top_port[i]] if top_port[i] >= 0 else None,
+                self.service_names[top_service[i]] if top_service[i] >= 0 else None,
+                self.os_names[top_os[i]] if top_os[i] >= 0 else None,
+            )
+            for i in order.tolist()
+        ]
+
+    def summary(
+        self, top_n: int = SUMMARY_TOP_N, prefix: int = DEFAULT_SUBNET_PREFIX
+    ) -> Dict[str, Any]:
+        """The dashboard shown for a scan, as plain data for the YAML view."""
+        started = time.perf_counter()
+        subnets = self.subnet_rollup(prefix)
+        summary: Dict[str, Any] = {
+            "hosts": len(self),
+            "hosts_up": int(self.host_up.sum()),
+            "open_ports": self.open_ports,
+            "top_ports": dict(self.top(self.port_histogram(), self.port_labels, top_n)),
+            "top_services": dict(
+                self.top(self.service_histogram(), self.service_names, top_n)
+            ),
+            "top_os": dict(self.top(self.os_histogram(), self.os_names, top_n)),
+            f"subnets_by_open_ports (/{prefix})": {
+                subnet.subnet: {
+                    "hosts": subnet.hosts,
+                    "up": subnet.hosts_up,
+                    "open_ports": subnet.open_ports,
+                    "top_port": subnet.top_port,
+                    "top_service": subnet.top_service,
+                    "top_os": subnet.top_os,
+                }
+                for subnet in subnets[:SUMMARY_SUBNETS]
+            },
+            "subnets": len(subnets),
+        }
+        summary["computed_in_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return summary
@@ -1,9 +1,9 @@
 # preferences.py
 import logging
+import os
 import re
-import threading
 
-from gi.repository import Adw, Gio, Gtk
+from gi.repository import Adw, Gio, GLib, Gtk
 
 from .constants import APP_ID, RESOURCE_PREFIX
 from .style_utils import apply_font_size, apply_theme
@@ -17,6 +17,18 @@ class Preferences(Adw.PreferencesWindow):
     theme_switch = Gtk.Template.Child("theme_switch")
     source_style_scheme_combo_row = Gtk.Template.Child("source_style_scheme_combo_row")
     dns_server_entryrow = Gtk.Template.Child("dns_server_entryrow")
+    adaptive_scan_rate_switchrow = Gtk.Template.Child("adaptive_scan_rate_switchrow")
+    scan_max_rate_spinrow = Gtk.Template.Child("scan_max_rate_spinrow")
+    scan_max_retries_spinrow = Gtk.Template.Child("scan_max_retries_spinrow")
+    scan_max_parallelism_spinrow = Gtk.Template.Child("scan_max_parallelism_spinrow")
+    connect_top_ports_spinrow = Gtk.Template.Child("connect_top_ports_spinrow")
+    connect_timeout_spinrow = Gtk.Template.Child("connect_timeout_spinrow")
+    connect_concurrency_spinrow = Gtk.Template.Child("connect_concurrency_spinrow")
+    connect_host_rate_spinrow = Gtk.Template.Child("connect_host_rate_spinrow")
+    script_cache_switchrow = Gtk.Template.Child("script_cache_switchrow")
+    script_cache_max_age_spinrow = Gtk.Template.Child("script_cache_max_age_spinrow")
+    metrics_textfile_entryrow = Gtk.Template.Child("metrics_textfile_entryrow")
+    metrics_port_spinrow = Gtk.Template.Child("metrics_port_spinrow")
     preferences_error_banner = Gtk.Template.Child("preferences_error_banner")  # Reference to the Adw.Banner
 
     def __init__(self, main_window=None):
@@ -34,6 +46,32 @@ class Preferences(Adw.PreferencesWindow):
             "notify::selected", self.on_source_style_scheme_changed
         )
         self.dns_server_entryrow.connect("apply", self.on_dns_server_changed)
+        self.metrics_textfile_entryrow.set_text(self.settings.get_string("metrics-textfile"))
+        self.metrics_textfile_entryrow.connect("apply", self.on_metrics_textfile_changed)
+        self.settings.bind(
+            "adaptive-scan-rate",
+            self.adaptive_scan_rate_switchrow,
+            "active",
+            Gio.SettingsBindFlags.DEFAULT,
+        )
+        self.settings.bind(
+            "script-cache",
+            self.script_cache_switchrow,
+            "active",
+            Gio.SettingsBindFlags.DEFAULT,
+        )
+        for key, row in (
+            ("scan-max-rate", self.scan_max_rate_spinrow),
+            ("scan-max-retries", self.scan_max_retries_spinrow),
+            ("scan-max-parallelism", self.scan_max_parallelism_spinrow),
+            ("connect-top-ports", self.connect_top_ports_spinrow),
+            ("connect-timeout", self.connect_timeout_spinrow),
+            ("connect-concurrency", self.connect_concurrency_spinrow),
+            ("connect-host-rate", self.connect_host_rate_spinrow),
+            ("script-cache-max-age", self.script_cache_max_age_spinrow),
+            ("metrics-port", self.metrics_port_spinrow),
+        ):
+            self.settings.bind(key, row, "value", Gio.SettingsBindFlags.DEFAULT)
 
     def on_dns_server_changed(self, entryrow):
         dns_server = entryrow.get_text().strip()
@@ -59,11 +97,24 @@ class Preferences(Adw.PreferencesWindow):
             entryrow.set_text("")
 
             # Hide the banner after 4 seconds and clear the CSS class
-            threading.Timer(4.0, self.hide_banner, args=[entryrow]).start()
+            GLib.timeout_add_seconds(4, self.hide_banner, entryrow)
+
+    def on_metrics_textfile_changed(self, entryrow):
+        path = os.path.expanduser(entryrow.get_text().strip())
+        directory = os.path.dirname(path) or "."
+        if path and not os.path.isdir(directory):
+            entryrow.add_css_class("error")
+            self.preferences_error_banner.set_title(f"Directory {directory} does not exist.")
+            self.preferences_error_banner.set_revealed(True)
+            return
+        entryrow.remove_css_class("error")
+        self.preferences_error_banner.set_revealed(False)
+        self.settings.set_string("metrics-textfile", path)
 
     def hide_banner(self, entryrow):
         self.preferences_error_banner.set_revealed(False)
         entryrow.remove_css_class("error")
+        return GLib.SOURCE_REMOVE
 
     @staticmethod
     def is_valid_ipv4(ip: str) -> bool:
@@ -99,14 +150,12 @@ class Preferences(Adw.PreferencesWindow):
             source_style_scheme = selected_item.get_string()
             self.settings.set_string("source-style-scheme", source_style_scheme)
 
-            if self.main_window and hasattr(
-                self.main_window.nmap_page, "apply_source_style_scheme"
-            ):
+            # The nmap page is built on first use and reads the scheme from
+            # the settings then, so there is nothing to update before that.
+            if self.main_window and self.main_window.nmap_page is not None:
                 self.main_window.nmap_page.apply_source_style_scheme(
                     source_style_scheme
                 )
-            else:
-                logging.error("NmapPage does not have apply_source_style_scheme method")
 
     def load_preferences(self):
         font_size = self.settings.get_int("font-size")
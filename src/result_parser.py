@@ -0,0 +1,311 @@
+# result_parser.py
+import logging
+import multiprocessing
+import os
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Union
+
+from . import metrics, tracing
+from .nse import attach_script_results, parse_nse_xml
+from .scan_model import PROTOCOLS, HostRecord
+
+# Hosts per batch handed to a parser process and back to the caller.
+PARSE_BATCH_SIZE = 512
+# Output smaller than this is parsed in the calling thread; starting the pool
+# and pickling the records would cost more than the parse.
+POOL_MIN_BYTES = 256 * 1024
+PARSER_WORKERS = min(4, os.cpu_count() or 1)
+
+HOST_OPEN_TAGS = (b"<host ", b"<host>")
+HOST_CLOSE_TAG = b"</host>"
+
+
+def _host_data(host: ET.Element) -> Optional[tuple]:
+    """
+    Build python-nmap's dictionary for one ``<host>`` element, so records
+    parsed here match the ones built from ``PortScanner`` results.
+    """
+    addresses: Dict[str, str] = {}
+    vendor: Dict[str, str] = {}
+    for entry in host.findall("address"):
+        addresses[entry.get("addrtype", "")] = entry.get("addr", "")
+        if entry.get("vendor"):
+            vendor[entry.get("addr", "")] = entry.get("vendor")
+    address = addresses.get("ipv4") or addresses.get("ipv6")
+    if address is None:
+        return None
+
+    hostnames = [
+        {"name": entry.get("name", ""), "type": entry.get("type", "")}
+        for entry in host.findall("hostnames/hostname")
+    ] or [{"name": "", "type": ""}]
+    status = host.find("status")
+    host_data: Dict[str, Any] = {
+        "hostnames": hostnames,
+        "addresses": addresses,
+        "vendor": vendor,
+        "status": {
+            "state": status.get("state", "") if status is not None else "",
+            "reason": status.get("reason", "") if status is not None else "",
+        },
+    }
+    uptime = host.find("uptime")
+    if uptime is not None:
+        host_data["uptime"] = {
+            "seconds": uptime.get("seconds", ""),
+            "lastboot": uptime.get("lastboot", ""),
+        }
+
+    for port in host.findall("ports/port"):
+        protocol = port.get("protocol", "")
+        if protocol not in PROTOCOLS:
+            continue
+        state = port.find("state")
+        port_data = {
+            "state": state.get("state", "") if state is not None else "",
+            "reason": state.get("reason", "") if state is not None else "",
+            "name": "",
+            "product": "",
+            "version": "",
+            "extrainfo": "",
+            "conf": "",
+            "cpe": "",
+        }
+        service = port.find("service")
+        if service is not None:
+            for field in ("name", "product", "version", "extrainfo", "conf"):
+                port_data[field] = service.get(field, "")
+            cpe = service.find("cpe")
+            if cpe is not None and cpe.text:
+                port_data["cpe"] = cpe.text
+        scripts = {
+            script.get("id", ""): script.get("output", "") for script in port.findall("script")
+        }
+        if scripts:
+            port_data["script"] = scripts
+        host_data.setdefault(protocol, {})[int(port.get("portid", "0"))] = port_data
+
+    hostscript = [
+        {"id": script.get("id", ""), "output": script.get("output", "")}
+        for script in host.findall("hostscript/script")
+    ]
+    if hostscript:
+        host_data["hostscript"] = hostscript
+
+    osmatch = [
+        {
+            "name": match.get("name", ""),
+            "accuracy": match.get("accuracy", ""),
+            "line": match.get("line", ""),
+            "osclass": [
+                {
+                    "type": osclass.get("type", ""),
+                    "vendor": osclass.get("vendor", ""),
+                    "osfamily": osclass.get("osfamily", ""),
+                    "osgen": osclass.get("osgen", ""),
+                    "accuracy": osclass.get("accuracy", ""),
+                    "cpe": [cpe.text for cpe in osclass.findall("cpe") if cpe.text],
+                }
+                for osclass in match.findall("osclass")
+            ],
+        }
+        for match in host.findall("os/osmatch")
+    ]
+    if osmatch:
+        host_data["osmatch"] = osmatch
+    portused = [
+        {
+            "state": entry.get("state", ""),
+            "proto": entry.get("proto", ""),
+            "portid": entry.get("portid", ""),
+        }
+        for entry in host.findall("os/portused")
+    ]
+    if portused:
+        host_data["portused"] = portused
+    return address, host_data
+
+
+def parse_hosts(xml_output: Union[str, bytes]) -> Dict[str, HostRecord]:
+    """
+    Parse nmap XML output straight into host records, with structured NSE
+    data attached. This is what runs in the parser processes.
+    """
+    try:
+        root = ET.fromstring(xml_output)
+    except ET.ParseError as e:
+        logging.error(f"Could not parse nmap XML output: {e}")
+        return {}
+    records: Dict[str, HostRecord] = {}
+    for host in root.iter("host"):
+        parsed = _host_data(host)
+        if parsed is not None:
+            address, host_data = parsed
+            records[address] = HostRecord.from_dict(address, host_data)
+    marker = b"<script " if isinstance(xml_output, bytes) else "<script "
+    if marker in xml_output:
+        for address, results in parse_nse_xml(xml_output).items():
+            if address in records:
+                attach_script_results(records[address], results)
+    return records
+
+
+def _host_start(xml_output: bytes, position: int) -> int:
+    while True:
+        position = xml_output.find(b"<host", position)
+        if position == -1 or xml_output[position : position + 6] in HOST_OPEN_TAGS:
+            return position
+        position += 5
+
+
+def split_hosts(xml_output: bytes, batch_size: int = PARSE_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Cut nmap XML output into standalone documents of ``batch_size`` hosts.
+
+    Only the ``<host>`` elements are kept; script output is escaped inside
+    attributes, so a literal ``</host>`` can only close a host element.
+    """
+    start = _host_start(xml_output, 0)
+    while start != -1:
+        end = start
+        for _ in range(batch_size):
+            close = xml_output.find(HOST_CLOSE_TAG, end)
+            if close == -1:
+                break
+            end = close + len(HOST_CLOSE_TAG)
+        if end == start:
+            return
+        yield b"<nmaprun>" + xml_output[start:end] + b"</nmaprun>"
+        start = _host_start(xml_output, end)
+
+
+def _pool_context():
+    # Forking a process that runs GTK and worker threads could copy held
+    # locks into the child, so the pool starts from a clean interpreter.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ResultParser:
+    """
+    Parses nmap XML into host records in a pool of processes.
+
+    Large outputs are split into batches of hosts that are parsed in
+    parallel, away from the interpreter running the GTK main loop, and come
+    back as pickled ``HostRecord`` batches.
+    """
+
+    def __init__(
+        self,
+        workers: int = PARSER_WORKERS,
+        batch_size: int = PARSE_BATCH_SIZE,
+        min_pool_bytes: int = POOL_MIN_BYTES,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.min_pool_bytes = min_pool_bytes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Batches not yet parsed, cancelled on shutdown.
+        self._pending: Set[Future] = set()
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=_pool_context()
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                for future in list(self._pending):
+                    future.cancel()
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def parse(
+        self,
+        xml_output: Union[str, bytes],
+        on_batch: Optional[Callable[[Dict[str, HostRecord]], None]] = None,
+    ) -> Dict[str, HostRecord]:
+        """
+        Parse nmap XML output into host records.
+
+        Args:
+            xml_output: The ``-oX`` output of one nmap run.
+            on_batch: Called with each batch of records, in scan order.
+
+        Returns:
+            dict: Host records keyed by address.
+        """
+        if isinstance(xml_output, str):
+            xml_output = xml_output.encode()
+        if not xml_output:
+            return {}
+        with tracing.span("parse.nmap_xml", "parse", xml_bytes=len(xml_output)) as span:
+            with metrics.PARSE_SECONDS.time():
+                records = self._parse(xml_output, on_batch)
+            span.set(hosts=len(records))
+        metrics.PARSED_HOSTS.inc(len(records))
+        return records
+
+    def _parse(
+        self,
+        xml_output: bytes,
+        on_batch: Optional[Callable[[Dict[str, HostRecord]], None]],
+    ) -> Dict[str, HostRecord]:
+        if self.workers < 1 or len(xml_output) < self.min_pool_bytes:
+            return self._parse_here(xml_output, on_batch)
+
+        try:
+            pool = self._get_pool()
+            futures = [
+                pool.submit(parse_hosts, chunk)
+                for chunk in split_hosts(xml_output, self.batch_size)
+            ]
+            for future in futures:
+                self._pending.add(future)
+                future.add_done_callback(self._pending.discard)
+        except (OSError, RuntimeError, BrokenProcessPool) as e:
+            logging.warning(f"Parser processes unavailable, parsing in-process: {e}")
+            self.shutdown()
+            return self._parse_here(xml_output, on_batch)
+
+        records: Dict[str, HostRecord] = {}
+        for index, future in enumerate(futures):
+            try:
+                with tracing.span("parse.wait_batch", "parse", batch=index):
+                    batch = future.result()
+            except BrokenProcessPool as e:
+                logging.warning(f"Parser process failed, parsing the rest in-process: {e}")
+                self.shutdown()
+                remaining = list(split_hosts(xml_output, self.batch_size))[index:]
+                for chunk in remaining:
+                    batch = parse_hosts(chunk)
+                    records.update(batch)
+                    if on_batch and batch:
+                        on_batch(batch)
+                break
+            records.update(batch)
+            if on_batch and batch:
+                on_batch(batch)
+        logging.debug(f"Parsed {len(records)} hosts in {len(futures)} batches")
+        return records
+
+    @staticmethod
+    def _parse_here(
+        xml_output: bytes, on_batch: Optional[Callable[[Dict[str, HostRecord]], None]]
+    ) -> Dict[str, HostRecord]:
+        records = parse_hosts(xml_output)
+        if on_batch and records:
+            on_batch(records)
+        return records
+
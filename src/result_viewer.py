@@ -0,0 +1,328 @@
+# result_viewer.py
+"""
+Shows large text results in a GtkSource.View without laying all of them out.
+
+``set_text`` of a multi-megabyte ``-p- -A --script=vuln`` result makes
+GtkSourceView highlight and lay out every line up front. The viewer keeps
+the full text in Python and holds only a window of it in the buffer:
+chunks are added as the view scrolls towards either end, and the far end
+is dropped once the window exceeds ``MAX_LOADED_CHARS``. Above
+``HIGHLIGHT_LIMIT`` syntax highlighting and wrapping are turned off.
+
+Indented sections, such as a host or a port in the YAML output, can be
+folded from the gutter. Folds hide the section's lines with an invisible
+tag and survive the window moving. Each fold also remembers its section's
+header lines, so a re-render that inserts lines above it, such as added
+enrichment results, keeps the same sections folded.
+"""
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+from gi.repository import Gtk, GtkSource
+
+CHUNK_CHARS = 64 * 1024
+# Text kept in the buffer at once; bounds layout and buffer memory.
+MAX_LOADED_CHARS = 512 * 1024
+# Results larger than this are shown without highlighting or wrapping.
+HIGHLIGHT_LIMIT = 256 * 1024
+# Load the next chunk when the view is this many pages from the loaded end.
+PRELOAD_PAGES = 2.0
+
+FOLD_OPEN = "▾"
+FOLD_CLOSED = "▸"
+
+
+def line_indent(line: str) -> Optional[int]:
+    """
+    Indentation of a line, or None for a blank one. A ``- `` list marker
+    counts as indentation, so list items fold under their key.
+    """
+    stripped = line.lstrip(" ")
+    if not stripped:
+        return None
+    return len(line) - len(stripped) + (1 if stripped.startswith("- ") else 0)
+
+
+def find_sections(lines) -> Dict[int, int]:
+    """
+    Map the index of each line that has more deeply indented lines after it
+    to the index just past its last one.
+    """
+    sections: Dict[int, int] = {}
+    stack = []
+    last = -1
+    for index, line in enumerate(lines):
+        indent = line_indent(line)
+        if indent is None:
+            continue
+        while stack and stack[-1][0] >= indent:
+            _, start = stack.pop()
+            if last > start:
+                sections[start] = last + 1
+        stack.append((indent, index))
+        last = index
+    while stack:
+        _, start = stack.pop()
+        if last > start:
+            sections[start] = last + 1
+    return sections
+
+
+def section_path(text: str, offset: int) -> Tuple[str, ...]:
+    """
+    The line starting at ``offset`` and the header lines of every section
+    around it, outermost first: host, protocol and port for a port section.
+    """
+    end = text.find("\n", offset)
+    line = text[offset : end if end >= 0 else len(text)]
+    path = [line]
+    indent = line_indent(line) or 0
+    position = offset
+    while indent > 0 and position > 0:
+        start = text.rfind("\n", 0, position - 1) + 1
+        previous = text[start : position - 1]
+        position = start
+        previous_indent = line_indent(previous)
+        if previous_indent is not None and previous_indent < indent:
+            path.append(previous)
+            indent = previous_indent
+    return tuple(reversed(path))
+
+
+def find_section(text: str, path: Tuple[str, ...]) -> Optional[int]:
+    """Return the number of the line with the given section path, if any."""
+    header = path[-1]
+    position = -1
+    while True:
+        position = text.find(header, position + 1)
+        if position < 0:
+            return None
+        end = position + len(header)
+        if (
+            (position == 0 or text[position - 1] == "\n")
+            and (end == len(text) or text[end] == "\n")
+            and section_path(text, position) == path
+        ):
+            return text.count("\n", 0, position)
+
+
+class ResultViewer:
+    def __init__(self, view: GtkSource.View):
+        self.view = view
+        self.buffer: GtkSource.Buffer = view.get_buffer()
+        self.highlight = self.buffer.get_highlight_syntax()
+        self.wrap_mode = view.get_wrap_mode()
+        self.text = ""
+        # The loaded window: character offsets into ``text`` and the
+        # number of the window's first line in the whole text.
+        self.start = 0
+        self.end = 0
+        self.first_line = 0
+        # Sections and folds are keyed by line numbers in the whole text;
+        # each fold also keeps its section path to be found after a re-render.
+        self.sections: Dict[int, int] = {}
+        self.folded: Set[int] = set()
+        self.fold_paths: Dict[int, Tuple[str, ...]] = {}
+        self._loading = False
+        self._adjustment = None
+        self._adjustment_handler = 0
+        self.fold_tag = self.buffer.create_tag("folded", invisible=True)
+        self.fold_renderer = self._add_fold_gutter()
+        view.connect("notify::vadjustment", self._on_vadjustment_changed)
+        self._on_vadjustment_changed(view, None)
+
+    def _add_fold_gutter(self) -> GtkSource.GutterRendererText:
+        renderer = GtkSource.GutterRendererText()
+        width, _ = renderer.measure(FOLD_OPEN)
+        renderer.set_size_request(width + 8, -1)
+        renderer.set_xalign(0.5)
+        renderer.connect("query-data", self._on_query_fold_data)
+        renderer.connect("query-activatable", self._on_query_fold_activatable)
+        renderer.connect("activate", self._on_fold_activate)
+        self.view.get_gutter(Gtk.TextWindowType.LEFT).insert(renderer, 0)
+        return renderer
+
+    def _on_vadjustment_changed(self, view, pspec):
+        if self._adjustment is not None:
+            self._adjustment.disconnect(self._adjustment_handler)
+        self._adjustment = view.get_vadjustment()
+        if self._adjustment is not None:
+            self._adjustment_handler = self._adjustment.connect(
+                "value-changed", self._on_scrolled
+            )
+
+    @property
+    def windowed(self) -> bool:
+        return self.start > 0 or self.end < len(self.text)
+
+    def show(self, text: str, keep_folds: bool = False):
+        """
+        Replace the shown text. With ``keep_folds`` the sections folded in
+        the previous text stay folded, and the same part of the text stays
+        loaded and scrolled to, for a re-render of the same result.
+        """
+        paths = list(self.fold_paths.values()) if keep_folds else []
+        start, size = (self.start, self.end - self.start) if keep_folds else (0, 0)
+        self.text = text
+        self.folded.clear()
+        self.fold_paths.clear()
+        large = len(text) > HIGHLIGHT_LIMIT
+        self.buffer.set_highlight_syntax(self.highlight and not large)
+        self.view.set_wrap_mode(Gtk.WrapMode.NONE if large else self.wrap_mode)
+        if len(text) <= MAX_LOADED_CHARS:
+            self.start, self.end = 0, len(text)
+        else:
+            self.start = text.rfind("\n", 0, min(start, len(text))) + 1 if start else 0
+            self.end = max(self._chunk_end(self.start), self._line_end(self.start + size))
+        self.first_line = text.count("\n", 0, self.start)
+        for path in paths:
+            line = find_section(text, path)
+            if line is not None:
+                self.folded.add(line)
+                self.fold_paths[line] = path
+        self._loading = True
+        try:
+            self.buffer.set_text(text[self.start : self.end])
+            self.buffer.place_cursor(self.buffer.get_start_iter())
+            if self._adjustment is not None and not keep_folds:
+                self._adjustment.set_value(0)
+        finally:
+            self._loading = False
+        if self.windowed:
+            logging.debug(f"Showing {self.end} of {len(text)} characters")
+        self._update_sections()
+
+    def clear(self):
+        self.show("")
+
+    def _chunk_end(self, position: int) -> int:
+        end = position + CHUNK_CHARS
+        if end >= len(self.text):
+            return len(self.text)
+        newline = self.text.find("\n", end)
+        return len(self.text) if newline < 0 else newline + 1
+
+    def _line_end(self, position: int) -> int:
+        if position >= len(self.text):
+            return len(self.text)
+        newline = self.text.find("\n", position)
+        return len(self.text) if newline < 0 else newline + 1
+
+    def _line_offset(self, line: int) -> int:
+        offset = self.start
+        for _ in range(line - self.first_line):
+            offset = self.text.find("\n", offset) + 1
+        return offset
+
+    def _chunk_start(self, position: int) -> int:
+        start = position - CHUNK_CHARS
+        if start <= 0:
+            return 0
+        return self.text.rfind("\n", 0, start) + 1
+
+    def _iter_at_line(self, line: int) -> Gtk.TextIter:
+        found, text_iter = self.buffer.get_iter_at_line(line)
+        return text_iter if found else self.buffer.get_end_iter()
+
+    def _line_y(self, line: int) -> int:
+        y, _ = self.view.get_line_yrange(self._iter_at_line(line))
+        return y
+
+    def _on_scrolled(self, adjustment):
+        if self._loading or not self.windowed:
+            return
+        value, page = adjustment.get_value(), adjustment.get_page_size()
+        margin = page * PRELOAD_PAGES
+        self._loading = True
+        try:
+            if self.end < len(self.text) and value + page + margin >= adjustment.get_upper():
+                self._append_chunk()
+            elif self.start > 0 and value <= margin:
+                self._prepend_chunk()
+        finally:
+            self._loading = False
+
+    def _append_chunk(self):
+        end = self._chunk_end(self.end)
+        self.buffer.insert(self.buffer.get_end_iter(), self.text[self.end : end])
+        self.end = end
+        if self.end - self.start > MAX_LOADED_CHARS:
+            # Drop the oldest chunk and scroll up by its height, so the
+            # visible lines stay where they are.
+            cut = self._chunk_end(self.start)
+            lines = self.text.count("\n", self.start, cut)
+            height = self._line_y(lines)
+            self.buffer.delete(self.buffer.get_start_iter(), self._iter_at_line(lines))
+            self.start = cut
+            self.first_line += lines
+            self._adjustment.set_value(max(0, self._adjustment.get_value() - height))
+        self._update_sections()
+
+    def _prepend_chunk(self):
+        start = self._chunk_start(self.start)
+        lines = self.text.count("\n", start, self.start)
+        self.buffer.insert(self.buffer.get_start_iter(), self.text[start : self.start])
+        self.start = start
+        self.first_line -= lines
+        self._adjustment.set_value(self._adjustment.get_value() + self._line_y(lines))
+        if self.end - self.start > MAX_LOADED_CHARS:
+            cut = self._chunk_start(self.end)
+            kept_lines = self.text.count("\n", self.start, cut)
+            self.buffer.delete(self._iter_at_line(kept_lines), self.buffer.get_end_iter())
+            self.end = cut
+        self._update_sections()
+
+    def _update_sections(self):
+        lines = self.text[self.start : self.end].split("\n")
+        self.sections = {
+            start + self.first_line: end + self.first_line
+            for start, end in find_sections(lines).items()
+        }
+        self._apply_folds()
+
+    def _apply_folds(self):
+        self.buffer.remove_tag(
+            self.fold_tag, self.buffer.get_start_iter(), self.buffer.get_end_iter()
+        )
+        for start in self.folded:
+            end = self.sections.get(start)
+            if end is None:
+                continue
+            self.buffer.apply_tag(
+                self.fold_tag,
+                self._iter_at_line(start - self.first_line + 1),
+                self._iter_at_line(end - self.first_line),
+            )
+        self.fold_renderer.queue_draw()
+
+    def toggle_fold(self, line: int):
+        """Fold or unfold the section starting at ``line`` of the whole text."""
+        if line in self.folded:
+            self.folded.discard(line)
+            self.fold_paths.pop(line, None)
+        elif line in self.sections:
+            self.folded.add(line)
+            self.fold_paths[line] = section_path(self.text, self._line_offset(line))
+        else:
+            return
+        self._apply_folds()
+
+    def unfold_all(self):
+        self.folded.clear()
+        self.fold_paths.clear()
+        self._apply_folds()
+
+    def _on_query_fold_data(self, renderer, lines, line):
+        absolute = line + self.first_line
+        if absolute in self.folded:
+            renderer.set_text(FOLD_CLOSED, -1)
+        elif absolute in self.sections:
+            renderer.set_text(FOLD_OPEN, -1)
+        else:
+            renderer.set_text("", -1)
+
+    def _on_query_fold_activatable(self, renderer, text_iter, area):
+        return text_iter.get_line() + self.first_line in self.sections
+
+    def _on_fold_activate(self, renderer, text_iter, area, button, state, n_presses):
+        self.toggle_fold(text_iter.get_line() + self.first_line)
@@ -0,0 +1,270 @@
+# runtime.py
+"""
+The task runtime every page schedules background work on.
+
+An asyncio event loop runs on one thread next to the GLib main loop, with
+bounded thread pools for blocking work: ``io`` for lookups, history loads
+and exports, and ``scan`` for long scans, so a scan never holds up a DNS
+lookup. Work waits for a pool slot on the event loop rather than in the
+executor's queue, so work that is cancelled before it starts never runs.
+
+Results come back on the GLib main loop. Pages spawn work in a
+``TaskScope``, which caps the work it has in flight, can replace older
+work with newer (the latest lookup wins), and drops the results of work
+that was cancelled, so a late result never overwrites a newer one.
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from gi.repository import GLib
+
+from . import tracing
+
+# Workers per pool: lookups and history loads are short, scans are long.
+POOL_WORKERS = {"io": 8, "scan": 4}
+DEFAULT_SCOPE_LIMIT = 4
+
+
+class RuntimeBusy(RuntimeError):
+    """A scope already has as much work in flight as it allows."""
+
+
+class Task:
+    """Work spawned in a scope; cancel it to drop its result."""
+
+    def __init__(self, scope: "TaskScope", name: str):
+        self.scope = scope
+        self.name = name
+        self.cancelled = threading.Event()
+        self.future = None
+        self._cancel_callbacks: List[Callable[[], None]] = []
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """
+        Call ``callback`` when the task is cancelled. Blocking work cannot
+        be interrupted, so this is how it is told to stop, e.g. by
+        cancelling a scan pipeline.
+        """
+        self._cancel_callbacks.append(callback)
+        if self.cancelled.is_set():
+            callback()
+
+    def cancel(self):
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        self.scope._forget(self)
+        if self.future is not None:
+            self.future.cancel()
+        for callback in self._cancel_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Cancelling {self.name} failed: {e}")
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+
+class TaskScope:
+    """
+    The work one page has in flight. Cancelling the scope cancels all of
+    it and drops the main loop callbacks it had not delivered yet.
+    """
+
+    def __init__(self, runtime: "TaskRuntime", name: str, limit: int = DEFAULT_SCOPE_LIMIT):
+        self.runtime = runtime
+        self.name = name
+        self.limit = limit
+        self.closed = False
+        self._tasks: Set[Task] = set()
+        self._lock = threading.Lock()
+
+    def spawn(
+        self,
+        work: Callable[..., Any],
+        *args,
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        pool: str = "io",
+        replace: bool = False,
+    ) -> Task:
+        """
+        Run ``work(*args)`` in the background: a coroutine function on the
+        event loop, anything else in ``pool``. ``on_done`` gets the result
+        and ``on_error`` the exception, on the main loop, unless the task
+        was cancelled first. With ``replace`` the scope's earlier work is
+        cancelled.
+
+        Raises:
+            RuntimeBusy: If the scope is at its limit.
+        """
+        name = f"{self.name}.{getattr(work, '__name__', 'task')}"
+        task = Task(self, name)
+        with self._lock:
+            if replace:
+                superseded, self._tasks = self._tasks, set()
+            else:
+                superseded = set()
+            if len(self._tasks) >= self.limit:
+                raise RuntimeBusy(f"{self.name} already has {self.limit} tasks running")
+            self._tasks.add(task)
+        for old in superseded:
+            old.cancel()
+        if asyncio.iscoroutinefunction(work):
+            coroutine = work(*args)
+        else:
+            coroutine = self.runtime.run_blocking(work, *args, pool=pool)
+        task.future = self.runtime.submit(self._run(task, coroutine, on_done, on_error))
+        return task
+
+    async def _run(self, task: Task, coroutine, on_done, on_error):
+        try:
+            with tracing.span("runtime.task", "runtime", task=task.name):
+                result = await coroutine
+        except asyncio.CancelledError:
+            self._forget(task)
+            raise
+        except Exception as e:
+            if on_error is None:
+                logging.error(f"{task.name} failed: {e}")
+                self.runtime.ui(self._forget, task)
+            else:
+                self.runtime.ui(self._deliver, task, on_error, e)
+            return
+        self.runtime.ui(self._deliver, task, on_done, result)
+
+    def _deliver(self, task: Task, callback, value):
+        self._forget(task)
+        if callback is not None and not task.cancelled.is_set() and not self.closed:
+            callback(value)
+
+    def _forget(self, task: Task):
+        with self._lock:
+            self._tasks.discard(task)
+
+    def ui(self, function: Callable[..., Any], *args):
+        """Call ``function(*args)`` on the main loop, unless the scope is cancelled."""
+        self.runtime.ui(self._call, function, args)
+
+    def _call(self, function, args):
+        if not self.closed:
+            function(*args)
+
+    @property
+    def busy(self) -> bool:
+        with self._lock:
+            return bool(self._tasks)
+
+    def cancel(self):
+        """Cancel the scope's work in flight; the scope stays usable."""
+        with self._lock:
+            tasks, self._tasks = self._tasks, set()
+        for task in tasks:
+            task.cancel()
+
+    def close(self):
+        """Cancel everything and deliver nothing more."""
+        self.closed = True
+        self.cancel()
+
+
+class TaskRuntime:
+    """
+    The shared event loop thread and worker pools; started on first use.
+    """
+
+    def __init__(self, pool_workers: Dict[str, int] = POOL_WORKERS):
+        self.pool_workers = dict(pool_workers)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.pools: Dict[str, ThreadPoolExecutor] = {}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._scopes: List[TaskScope] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(
+                    target=self._run_loop, name="woes-runtime", daemon=True
+                )
+                self.thread.start()
+            return self.loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def scope(self, name: str, limit: int = DEFAULT_SCOPE_LIMIT) -> TaskScope:
+        scope = TaskScope(self, name, limit)
+        with self._lock:
+            self._scopes.append(scope)
+        return scope
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the event loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start())
+
+    def _pool(self, pool: str):
+        # Called on the event loop thread only.
+        if pool not in self.pools:
+            workers = self.pool_workers[pool]
+            self.pools[pool] = ThreadPoolExecutor(workers, thread_name_prefix=f"woes-{pool}")
+            self._slots[pool] = asyncio.Semaphore(workers)
+        return self.pools[pool], self._slots[pool]
+
+    async def run_blocking(self, function: Callable[..., Any], *args, pool: str = "io"):
+        """
+        Run a blocking function in a worker pool. Callers wait for a free
+        worker here, where they can still be cancelled, instead of in the
+        executor's queue.
+        """
+        executor, slots = self._pool(pool)
+        async with slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, functools.partial(function, *args)
+            )
+
+    def ui(self, function: Callable[..., Any], *args):
+        """Call ``function(*args)`` once on the GLib main loop, from any thread."""
+
+        def call():
+            try:
+                function(*args)
+            except Exception:
+                logging.exception(f"Main loop callback {function!r} failed")
+            return GLib.SOURCE_REMOVE
+
+        GLib.idle_add(call)
+
+    def shutdown(self):
+        """Cancel all work and stop the loop; running blocking calls are abandoned."""
+        with self._lock:
+            scopes, self._scopes = self._scopes, []
+            loop, self.loop = self.loop, None
+        for scope in scopes:
+            scope.close()
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        self.thread.join(timeout=5)
+        # run_blocking never queues more calls than a pool has workers, so
+        # there is nothing waiting to cancel; running calls are abandoned.
+        for executor in self.pools.values():
+            executor.shutdown(wait=False)
+        self.pools.clear()
+        self._slots.clear()
+
+
+RUNTIME = TaskRuntime()
+
+
+def scope(name: str, limit: int = DEFAULT_SCOPE_LIMIT) -> TaskScope:
+    """A task scope on the application's runtime."""
+    return RUNTIME.scope(name, limit)
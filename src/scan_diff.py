@@ -0,0 +1,176 @@
+# scan_diff.py
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .scan_model import HostRecord
+
+DEFAULT_MAX_AGE_HOURS = 24
+
+
+@dataclass(frozen=True)
+class PortChange:
+    host: str
+    protocol: str
+    port: int
+    change: str  # "new", "closed" or "changed"
+    before: Optional[str] = None
+    after: Optional[str] = None
+
+
+@dataclass
+class ScanDiff:
+    new_hosts: List[str] = field(default_factory=list)
+    missing_hosts: List[str] = field(default_factory=list)
+    port_changes: List[PortChange] = field(default_factory=list)
+    os_changes: Dict[str, Tuple[Optional[str], Optional[str]]] = field(
+        default_factory=dict
+    )
+
+    def is_empty(self) -> bool:
+        return not (
+            self.new_hosts or self.missing_hosts or self.port_changes or self.os_changes
+        )
+
+    def changed_hosts(self) -> Set[str]:
+        hosts = set(self.new_hosts) | set(self.os_changes)
+        hosts.update(change.host for change in self.port_changes)
+        return hosts
+
+    def summary(self) -> str:
+        counts = {"new": 0, "closed": 0, "changed": 0}
+        for change in self.port_changes:
+            counts[change.change] += 1
+        return (
+            f"{len(self.new_hosts)} new hosts, {len(self.missing_hosts)} gone, "
+            f"{counts['new']} new ports, {counts['closed']} closed, "
+            f"{counts['changed']} changed, {len(self.os_changes)} OS changes"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        ports: Dict[str, Dict[str, List[str]]] = {}
+        for change in self.port_changes:
+            host_changes = ports.setdefault(change.host, {})
+            if change.change == "changed":
+                text = f"{change.port}/{change.protocol}: {change.before} -> {change.after}"
+            else:
+                text = f"{change.port}/{change.protocol}: {change.after or change.before}"
+            host_changes.setdefault(change.change, []).append(text)
+        return {
+            "summary": self.summary(),
+            "new_hosts": self.new_hosts,
+            "missing_hosts": self.missing_hosts,
+            "ports": ports,
+            "os": {
+                host: {"before": before, "after": after}
+                for host, (before, after) in self.os_changes.items()
+            },
+        }
+
+
+@dataclass
+class RescanPlan:
+    """Hosts to probe fully, host ports to re-probe, and hosts to carry over."""
+
+    full_hosts: List[str] = field(default_factory=list)
+    port_hosts: Dict[str, Set[int]] = field(default_factory=dict)
+    carried_hosts: List[str] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.full_hosts or self.port_hosts)
+
+
+def open_ports(host: Optional[HostRecord]) -> Dict[Tuple[str, int], str]:
+    """Map (protocol, port) of every open port to its service description."""
+    if host is None:
+        return {}
+    return {key: service.label for key, service in host.open_ports().items()}
+
+
+def diff_scans(previous: Dict[str, HostRecord], current: Dict[str, HostRecord]) -> ScanDiff:
+    """
+    Compare two scans of the same targets.
+
+    Args:
+        previous (dict): Host records of the earlier scan keyed by address.
+        current (dict): Host records of the new scan keyed by address.
+
+    Returns:
+        ScanDiff: New and missing hosts, port changes and OS guess changes.
+    """
+    diff = ScanDiff()
+    diff.new_hosts = [host for host in current if host not in previous]
+    diff.missing_hosts = [host for host in previous if host not in current]
+
+    for host, record in current.items():
+        before_ports = open_ports(previous.get(host))
+        after_ports = open_ports(record)
+
+        for key in sorted(after_ports.keys() - before_ports.keys()):
+            diff.port_changes.append(
+                PortChange(host, key[0], key[1], "new", after=after_ports[key])
+            )
+        for key in sorted(before_ports.keys() - after_ports.keys()):
+            diff.port_changes.append(
+                PortChange(host, key[0], key[1], "closed", before=before_ports[key])
+            )
+        for key in sorted(before_ports.keys() & after_ports.keys()):
+            if before_ports[key] != after_ports[key]:
+                diff.port_changes.append(
+                    PortChange(
+                        host,
+                        key[0],
+                        key[1],
+                        "changed",
+                        before=before_ports[key],
+                        after=after_ports[key],
+                    )
+                )
+
+        if host in previous:
+            before_os, after_os = previous[host].os_name, record.os_name
+            if before_os != after_os:
+                diff.os_changes[host] = (before_os, after_os)
+
+    return diff
+
+
+def plan_incremental_rescan(
+    previous: Dict[str, HostRecord],
+    probed_at: Dict[str, float],
+    last_diff: Optional[ScanDiff],
+    max_age: float,
+    now: Optional[float] = None,
+    discovered: Iterable[str] = (),
+) -> RescanPlan:
+    """
+    Decide which hosts and ports of the last stored scan need probing again.
+
+    Hosts whose results are older than ``max_age`` seconds, or that appeared
+    or changed OS guess in the last diff, are probed with the full scan
+    options. Hosts with only port changes in the last diff have just those
+    ports re-probed. Every other host is carried over from the previous scan
+    unchanged. Live hosts found by a
+    discovery sweep that the previous scan did not have are probed in full.
+    """
+    now = now if now is not None else time.time()
+    plan = RescanPlan()
+    new_hosts = set(last_diff.new_hosts) if last_diff else set()
+    os_changes = last_diff.os_changes if last_diff else {}
+    changed_ports: Dict[str, Set[int]] = {}
+    if last_diff:
+        for change in last_diff.port_changes:
+            changed_ports.setdefault(change.host, set()).add(change.port)
+
+    for host in previous:
+        stale = now - probed_at.get(host, 0.0) > max_age
+        if stale or host in new_hosts or host in os_changes:
+            plan.full_hosts.append(host)
+        elif host in changed_ports:
+            plan.port_hosts[host] = changed_ports[host]
+        else:
+            plan.carried_hosts.append(host)
+    plan.full_hosts.extend(
+        host for host in dict.fromkeys(discovered) if host not in previous
+    )
+    return plan
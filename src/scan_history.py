@@ -0,0 +1,470 @@
+# scan_history.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .nse import ScriptResult
+from .scan_model import EMPTY_SERVICE, SERVICE_FIELDS, HostRecord, ServiceRecord
+
+HISTORY_DB_NAME = "history.db"
+HISTORY_PAGE_SIZE = 50
+
+# (address, protocol, port, fingerprint, results) of one script cache row.
+ScriptCacheEntry = Tuple[str, Optional[str], Optional[int], str, List[ScriptResult]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    host_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS host (
+    id INTEGER PRIMARY KEY,
+    scan_id INTEGER NOT NULL REFERENCES scan(id) ON DELETE CASCADE,
+    address TEXT NOT NULL,
+    hostname TEXT,
+    state TEXT,
+    reason TEXT,
+    os_name TEXT,
+    os_accuracy INTEGER,
+    probed_at REAL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS port (
+    id INTEGER PRIMARY KEY,
+    host_id INTEGER NOT NULL REFERENCES host(id) ON DELETE CASCADE,
+    protocol TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    state TEXT,
+    reason TEXT
+);
+CREATE TABLE IF NOT EXISTS service (
+    port_id INTEGER PRIMARY KEY REFERENCES port(id) ON DELETE CASCADE,
+    name TEXT,
+    product TEXT,
+    version TEXT,
+    extrainfo TEXT,
+    conf TEXT,
+    cpe TEXT
+);
+CREATE TABLE IF NOT EXISTS script_output (
+    id INTEGER PRIMARY KEY,
+    host_id INTEGER NOT NULL REFERENCES host(id) ON DELETE CASCADE,
+    port_id INTEGER REFERENCES port(id) ON DELETE CASCADE,
+    script_id TEXT NOT NULL,
+    output TEXT
+);
+CREATE TABLE IF NOT EXISTS script_cache (
+    address TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    selection TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    results TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (address, protocol, port, selection)
+);
+CREATE INDEX IF NOT EXISTS idx_scan_started ON scan(started_at);
+CREATE INDEX IF NOT EXISTS idx_scan_target ON scan(target, started_at);
+CREATE INDEX IF NOT EXISTS idx_host_scan ON host(scan_id);
+CREATE INDEX IF NOT EXISTS idx_host_address ON host(address, scan_id);
+CREATE INDEX IF NOT EXISTS idx_port_host ON port(host_id);
+CREATE INDEX IF NOT EXISTS idx_port_number ON port(port, state);
+CREATE INDEX IF NOT EXISTS idx_script_host ON script_output(host_id);
+"""
+
+
+@dataclass(frozen=True)
+class ScanSummary:
+    scan_id: int
+    target: str
+    arguments: str
+    started_at: float
+    finished_at: Optional[float]
+    host_count: int
+
+    @property
+    def label(self) -> str:
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.started_at))
+        return f"{started} — {self.target} ({self.host_count} hosts)"
+
+
+def default_history_path() -> str:
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(
+        os.path.expanduser("~"), ".local", "share"
+    )
+    return os.path.join(data_home, "woes", HISTORY_DB_NAME)
+
+
+class ScanHistory:
+    """
+    Persistent store of nmap scan results backed by a local SQLite database.
+
+    Host results are stored in a normalized schema (scan, host, port, service
+    and script output) and rebuilt into ``HostRecord`` objects, so stored
+    scans can be displayed without re-running nmap.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_history_path()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+        logging.debug(f"Opened scan history at {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record_scan(
+        self,
+        target: str,
+        arguments: str,
+        hosts: Dict[str, HostRecord],
+        started_at: Optional[float] = None,
+        probed_at: Optional[Dict[str, float]] = None,
+    ) -> int:
+        """
+        Store a finished scan and all of its host results in one transaction.
+
+        Args:
+            target (str): The target expression that was scanned.
+            arguments (str): The nmap arguments used for the scan.
+            hosts (dict): Host records keyed by host address.
+            started_at (float): Epoch time the scan started, defaults to now.
+            probed_at (dict): Epoch times at which hosts carried over from an
+                earlier scan were last probed, defaults to ``started_at``.
+
+        Returns:
+            int: The id of the stored scan.
+        """
+        finished_at = time.time()
+        started_at = started_at if started_at is not None else finished_at
+        probed_at = probed_at or {}
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO scan (target, arguments, started_at, finished_at, host_count)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (target, arguments, started_at, finished_at, len(hosts)),
+            )
+            scan_id = cursor.lastrowid
+            for address, host in hosts.items():
+                self._insert_host(scan_id, host, probed_at.get(address, started_at))
+        logging.debug(f"Stored scan {scan_id} with {len(hosts)} hosts")
+        return scan_id
+
+    def _insert_host(self, scan_id: int, host: HostRecord, probed_at: float):
+        # Everything that has no column of its own (hostnames, addresses,
+        # vendor, full OS matches, uptime, ...) is kept in the ``extra`` JSON.
+        extra = dict(host.extra or {})
+        if host.hostnames:
+            extra["hostnames"] = [
+                {"name": name, "type": kind} for name, kind in host.hostnames
+            ]
+
+        cursor = self._conn.execute(
+            "INSERT INTO host (scan_id, address, hostname, state, reason, os_name,"
+            " os_accuracy, probed_at, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                scan_id,
+                host.address,
+                host.hostname,
+                host.state,
+                host.reason,
+                host.os_name,
+                host.os_accuracy,
+                probed_at,
+                json.dumps(extra, default=str) if extra else None,
+            ),
+        )
+        host_id = cursor.lastrowid
+
+        for script_id, output in (host.scripts or {}).items():
+            self._conn.execute(
+                "INSERT INTO script_output (host_id, port_id, script_id, output)"
+                " VALUES (?, NULL, ?, ?)",
+                (host_id, script_id, output),
+            )
+
+        for port in host.ports:
+            cursor = self._conn.execute(
+                "INSERT INTO port (host_id, protocol, port, state, reason)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (host_id, port.protocol, port.port, port.state, port.reason),
+            )
+            port_id = cursor.lastrowid
+            if port.service is not EMPTY_SERVICE:
+                self._conn.execute(
+                    "INSERT INTO service (port_id, name, product, version, extrainfo,"
+                    " conf, cpe) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (port_id, *port.service.fields()),
+                )
+            for script_id, output in (port.scripts or {}).items():
+                self._conn.execute(
+                    "INSERT INTO script_output (host_id, port_id, script_id, output)"
+                    " VALUES (?, ?, ?, ?)",
+                    (host_id, port_id, script_id, output),
+                )
+
+    def add_port_scripts(
+        self, scan_id: int, address: str, protocol: str, port: int, scripts: Dict[str, str]
+    ):
+        """Attach script output gathered after a scan was stored to one of its ports."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT port.host_id, port.id FROM port JOIN host ON host.id = port.host_id"
+                " WHERE host.scan_id = ? AND host.address = ? AND port.protocol = ?"
+                " AND port.port = ?",
+                (scan_id, address, protocol, port),
+            ).fetchone()
+            if row is None:
+                return
+            host_id, port_id = row
+            self._conn.execute(
+                "DELETE FROM script_output WHERE port_id = ? AND script_id IN (%s)"
+                % ",".join("?" * len(scripts)),
+                (port_id, *scripts),
+            )
+            self._conn.executemany(
+                "INSERT INTO script_output (host_id, port_id, script_id, output)"
+                " VALUES (?, ?, ?, ?)",
+                [(host_id, port_id, script_id, output) for script_id, output in scripts.items()],
+            )
+
+    def cached_scripts(
+        self,
+        address: str,
+        protocol: Optional[str],
+        port: Optional[int],
+        selection: str,
+        fingerprint: str,
+        max_age: float,
+    ) -> Optional[List[ScriptResult]]:
+        """
+        Return the script results of an earlier run of ``selection`` against a
+        port (or the host, with ``port`` None), if the service there still has
+        the same fingerprint and the results are younger than ``max_age``
+        seconds. An empty list means the scripts ran and reported nothing.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, results, updated_at FROM script_cache"
+                " WHERE address = ? AND protocol = ? AND port = ? AND selection = ?",
+                (address, protocol or "", port or 0, selection),
+            ).fetchone()
+        if row is None or row["fingerprint"] != fingerprint:
+            return None
+        if time.time() - row["updated_at"] > max_age:
+            return None
+        return [
+            ScriptResult(address, entry["id"], entry["output"], entry.get("data"), protocol, port)
+            for entry in json.loads(row["results"])
+        ]
+
+    def store_scripts_many(self, selection: str, entries: List[ScriptCacheEntry]):
+        """Cache the script output of many locations in one transaction."""
+        now = time.time()
+        rows = [
+            (
+                address,
+                protocol or "",
+                port or 0,
+                selection,
+                fingerprint,
+                json.dumps(
+                    [
+                        {"id": result.script_id, "output": result.output, "data": result.data}
+                        for result in results
+                    ],
+                    default=str,
+                ),
+                now,
+            )
+            for address, protocol, port, fingerprint, results in entries
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO script_cache (address, protocol, port, selection,"
+                " fingerprint, results, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def list_scans(
+        self,
+        limit: int = HISTORY_PAGE_SIZE,
+        offset: int = 0,
+        target: Optional[str] = None,
+        arguments: Optional[str] = None,
+    ) -> List[ScanSummary]:
+        """Return one page of stored scans, newest first."""
+        query = (
+            "SELECT id, target, arguments, started_at, finished_at, host_count FROM scan"
+        )
+        conditions = []
+        params: List[Any] = []
+        if target is not None:
+            conditions.append("target = ?")
+            params.append(target)
+        if arguments is not None:
+            conditions.append("arguments = ?")
+            params.append(arguments)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?"
+        params.extend((limit, offset))
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [ScanSummary(*row) for row in rows]
+
+    def count_scans(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scan").fetchone()[0]
+
+    def latest_scan(self, target: str) -> Optional[ScanSummary]:
+        scans = self.list_scans(limit=1, target=target)
+        return scans[0] if scans else None
+
+    def get_scan(self, scan_id: int) -> Optional[ScanSummary]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, target, arguments, started_at, finished_at, host_count"
+                " FROM scan WHERE id = ?",
+                (scan_id,),
+            ).fetchone()
+        return ScanSummary(*row) if row else None
+
+    def host_addresses(self, scan_id: int) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT address FROM host WHERE scan_id = ? ORDER BY id", (scan_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def probe_times(self, scan_id: int) -> Dict[str, float]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT address, probed_at FROM host WHERE scan_id = ?", (scan_id,)
+            ).fetchall()
+        return {row[0]: row[1] or 0.0 for row in rows}
+
+    def load_scan(
+        self, scan_id: int, limit: int = -1, offset: int = 0
+    ) -> Dict[str, HostRecord]:
+        """
+        Rebuild the host records of a stored scan.
+
+        Args:
+            scan_id (int): The id of the stored scan.
+            limit (int): Maximum number of hosts to load, -1 for all.
+            offset (int): Number of hosts to skip, for paging large scans.
+
+        Returns:
+            dict: Host records keyed by host address, in scan order.
+        """
+        return dict(self.iter_hosts(scan_id, limit=limit, offset=offset))
+
+    def iter_hosts(
+        self, scan_id: int, limit: int = -1, offset: int = 0
+    ) -> Iterator[Tuple[str, HostRecord]]:
+        with self._lock:
+            host_rows = self._conn.execute(
+                "SELECT id, address, state, reason, os_name, os_accuracy, extra"
+                " FROM host WHERE scan_id = ? ORDER BY id LIMIT ? OFFSET ?",
+                (scan_id, limit, offset),
+            ).fetchall()
+        for host in self._rebuild_hosts(host_rows).values():
+            yield host.address, host
+
+    def stream_hosts(self, scan_id: int, batch_size: int = 500) -> Iterator[HostRecord]:
+        """
+        Yield the host records of a stored scan in batches of ``batch_size``,
+        so exporting a very large scan never loads all of it at once.
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                host_rows = self._conn.execute(
+                    "SELECT id, address, state, reason, os_name, os_accuracy, extra"
+                    " FROM host WHERE scan_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (scan_id, last_id, batch_size),
+                ).fetchall()
+            if not host_rows:
+                return
+            last_id = host_rows[-1]["id"]
+            yield from self._rebuild_hosts(host_rows).values()
+
+    def _rebuild_hosts(self, host_rows: List[sqlite3.Row]) -> Dict[int, HostRecord]:
+        if not host_rows:
+            return {}
+        with self._lock:
+            first_id, last_id = host_rows[0]["id"], host_rows[-1]["id"]
+            port_rows = self._conn.execute(
+                "SELECT port.id, port.host_id, port.protocol, port.port, port.state,"
+                " port.reason, service.name, service.product, service.version,"
+                " service.extrainfo, service.conf, service.cpe"
+                " FROM port LEFT JOIN service ON service.port_id = port.id"
+                " WHERE port.host_id BETWEEN ? AND ? ORDER BY port.host_id, port.id",
+                (first_id, last_id),
+            ).fetchall()
+            script_rows = self._conn.execute(
+                "SELECT host_id, port_id, script_id, output FROM script_output"
+                " WHERE host_id BETWEEN ? AND ? ORDER BY id",
+                (first_id, last_id),
+            ).fetchall()
+
+        port_scripts: Dict[int, Dict[str, str]] = {}
+        host_scripts: Dict[int, Dict[str, str]] = {}
+        for row in script_rows:
+            if row["port_id"] is None:
+                scripts = host_scripts.setdefault(row["host_id"], {})
+            else:
+                scripts = port_scripts.setdefault(row["port_id"], {})
+            scripts[row["script_id"]] = row["output"]
+
+        hosts: Dict[int, HostRecord] = {}
+        for row in host_rows:
+            host = HostRecord(row["address"], row["state"], row["reason"])
+            host.os_name, host.os_accuracy = row["os_name"], row["os_accuracy"]
+            extra = json.loads(row["extra"]) if row["extra"] else {}
+            host.hostnames = tuple(
+                (entry.get("name", ""), entry.get("type", ""))
+                for entry in extra.pop("hostnames", ())
+            )
+            host.extra = extra or None
+            host.scripts = host_scripts.get(row["id"])
+            hosts[row["id"]] = host
+
+        for row in port_rows:
+            host = hosts.get(row["host_id"])
+            if host is None:
+                continue
+            service = ServiceRecord.get(*(row[field] for field in SERVICE_FIELDS))
+            host.ports.append(
+                row["protocol"],
+                row["port"],
+                row["state"],
+                row["reason"],
+                service,
+                port_scripts.get(row["id"]),
+            )
+        return hosts
+
+    def delete_scan(self, scan_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM scan WHERE id = ?", (scan_id,))
@@ -0,0 +1,470 @@
+# scan_index.py
+import re
+import threading
+from collections.abc import Set as AbstractSet
+from typing import AbstractSet as SetView
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .scan_model import EMPTY_SERVICE, STATES, HostRecord
+
+QUERY_FIELDS = ("port", "service", "product", "version", "os", "script", "host", "state")
+
+TOKEN_REGEX = re.compile(
+    r"""\s*(?:
+        (?P<lparen>\()|
+        (?P<rparen>\))|
+        (?P<term>(?P<field>[A-Za-z]+):(?:"(?P<quoted>[^"]*)"|(?P<value>[^\s()]+)))|
+        (?P<word>"[^"]*"|[^\s()]+)
+    )""",
+    re.VERBOSE,
+)
+
+
+EMPTY: Set[str] = frozenset()
+HOST_SEPARATORS = re.compile(r"[.:]")
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Difference(AbstractSet):
+    """
+    The hosts in ``hosts`` but not in ``excluded``, answered without listing
+    them, so ``not port:22`` or ``port:22 and not service:ssh`` cost no more
+    than looking up their terms.
+    """
+
+    __slots__ = ("hosts", "excluded")
+
+    def __init__(self, hosts: Set[str], excluded: SetView[str]):
+        self.hosts = hosts
+        self.excluded = excluded
+
+    @classmethod
+    def _from_iterable(cls, iterable) -> Set[str]:
+        # What the Set mixins build from "&", "|" and "-".
+        return set(iterable)
+
+    def __contains__(self, address) -> bool:
+        return address in self.hosts and address not in self.excluded
+
+    def __iter__(self) -> Iterator[str]:
+        return (address for address in self.hosts if address not in self.excluded)
+
+    def __len__(self) -> int:
+        # Count from the smaller side; ``excluded`` need not be within ``hosts``.
+        if len(self.excluded) < len(self.hosts):
+            return len(self.hosts) - sum(1 for address in self.excluded if address in self.hosts)
+        return sum(1 for address in self.hosts if address not in self.excluded)
+
+
+class ScanIndex:
+    """
+    In-memory inverted index over host records.
+
+    Every posting maps a normalized key (open port, service name or product,
+    version, OS token, NSE script id, host state, address prefix, hostname
+    label or domain suffix) to the set of host addresses that have it. Hosts
+    can be added as they arrive and are replaced when added again, so the
+    index stays current while a scan is still streaming.
+    """
+
+    def __init__(self):
+        self.hosts: Set[str] = set()
+        self.by_port: Dict[int, Set[str]] = {}
+        self.by_service: Dict[str, Set[str]] = {}
+        self.by_product: Dict[str, Set[str]] = {}
+        self.by_version: Dict[str, Set[str]] = {}
+        self.by_os: Dict[str, Set[str]] = {}
+        self.by_script: Dict[str, Set[str]] = {}
+        self.by_state: Dict[str, Set[str]] = {}
+        self.by_host: Dict[str, Set[str]] = {}
+        # Address and hostnames of each host, for substring host queries.
+        self.names: Dict[str, str] = {}
+        self._postings: Dict[str, List[Tuple[Dict, object]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_hosts(cls, hosts: Iterable[HostRecord]) -> "ScanIndex":
+        index = cls()
+        index.add_many(hosts)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def add_many(self, hosts: Iterable[HostRecord]):
+        for host in hosts:
+            self.add(host)
+
+    def add(self, host: HostRecord):
+        address = host.address
+        with self._lock:
+            if address in self.hosts:
+                self._remove_locked(address)
+            postings = []
+
+            def post(table: Dict, key) -> None:
+                table.setdefault(key, set()).add(address)
+                postings.append((table, key))
+
+            self.hosts.add(address)
+            self.names[address] = " ".join(
+                [address.lower(), *(name.lower() for name, _ in host.hostnames if name)]
+            )
+            for token in _host_tokens(host):
+                post(self.by_host, token)
+            post(self.by_state, host.state)
+            for token in _os_tokens(host):
+                post(self.by_os, token)
+            for script_id in host.scripts or ():
+                post(self.by_script, script_id)
+
+            # Walk the port table's arrays directly rather than materializing
+            # a PortRecord per row.
+            table = host.ports
+            open_code = STATES.code("open")
+            for row, number in enumerate(table.ports):
+                for script_id in (table.scripts or {}).get(row, ()):
+                    post(self.by_script, script_id)
+                if table.states[row] != open_code:
+                    continue
+                post(self.by_port, number)
+                service = table.services.get(row, EMPTY_SERVICE)
+                if service.name:
+                    post(self.by_service, service.name.lower())
+                if service.product:
+                    post(self.by_product, service.product.lower())
+                if service.version:
+                    post(self.by_version, service.version.lower())
+                    if service.product:
+                        # Also allows prefix queries like version:"nginx 1.14".
+                        post(self.by_version, f"{service.product} {service.version}".lower())
+            self._postings[address] = postings
+
+    def remove(self, address: str):
+        with self._lock:
+            self._remove_locked(address)
+
+    def _remove_locked(self, address: str):
+        for table, key in self._postings.pop(address, ()):
+            hosts = table.get(key)
+            if hosts is not None:
+                hosts.discard(address)
+                if not hosts:
+                    del table[key]
+        self.hosts.discard(address)
+        self.names.pop(address, None)
+
+    def clear(self):
+        with self._lock:
+            for table in (
+                self.by_port,
+                self.by_service,
+                self.by_product,
+                self.by_version,
+                self.by_os,
+                self.by_script,
+                self.by_state,
+                self.by_host,
+                self.names,
+                self._postings,
+            ):
+                table.clear()
+            self.hosts.clear()
+
+    def query(self, expression: str) -> SetView[str]:
+        """
+        Return the addresses of the hosts matching a filter expression.
+
+        Terms are ``field:value`` pairs combined with ``and`` (or simply
+        juxtaposed), ``or``, ``not`` and parentheses, for example::
+
+            port:3306
+            service:nginx version:1.14
+            (os:linux or os:bsd) and not script:ssl-cert
+            port:8000-8100 state:up
+
+        Fields are port (a number or range), service, product, version
+        (prefix match), os, script, host and state. ``host`` matches a
+        leading part of an address (``10.0.1``), a hostname label or a domain
+        suffix (``web01``, ``example.com``); any other value falls back to a
+        substring scan of every address and hostname, about 20 ms at 65k
+        hosts. A bare word matches the same address parts and hostname
+        tokens, services and products, without the scan.
+
+        A term that names one posting takes microseconds, and so do ``not``
+        and ``and not`` over such terms. Terms that merge postings (``service``
+        also matches products, prefix fields match several keys), ``or``, and
+        ``and`` between several terms build a new set, which takes a few
+        milliseconds at 65k hosts when the terms are broad (about 5 ms for
+        ``(port:22 or port:80) and not script:ssl-cert``).
+
+        The result may be one of the index's own postings, or a view of
+        them, and must not be modified; it follows hosts added later.
+        """
+        predicate = compile_query(expression)
+        with self._lock:
+            return predicate(self)
+
+    def lookup(self, field: str, value: str) -> SetView[str]:
+        """
+        Return the hosts matching a single ``field:value`` term.
+
+        The returned set may be one of the index's own postings and must not
+        be modified.
+        """
+        value = value.lower()
+        if field == "port":
+            return self._lookup_port(value)
+        if field == "service":
+            return _union(self.by_service.get(value), self.by_product.get(value))
+        if field == "product":
+            return _union_matching(self.by_product, lambda key: value in key)
+        if field == "version":
+            return _union_matching(self.by_version, lambda key: key.startswith(value))
+        if field == "os":
+            return _union_matching(self.by_os, lambda key: key.startswith(value))
+        if field == "script":
+            return _union_matching(self.by_script, lambda key: key.lower().startswith(value))
+        if field == "state":
+            return self.by_state.get(value, EMPTY)
+        if field == "host":
+            hosts = self.by_host.get(value)
+            if hosts is not None:
+                return hosts
+            return {address for address, names in self.names.items() if value in names}
+        raise QueryError(f"Unknown field '{field}', expected one of {', '.join(QUERY_FIELDS)}")
+
+    def _lookup_port(self, value: str) -> Set[str]:
+        try:
+            if "-" in value:
+                low, high = (int(part) for part in value.split("-", 1))
+                return _union_matching(self.by_port, lambda port: low <= port <= high)
+            return self.by_port.get(int(value), EMPTY)
+        except ValueError:
+            raise QueryError(f"Invalid port '{value}'")
+
+
+def _union(
+    *postings: Optional[SetView[str]], universe: Optional[Set[str]] = None
+) -> SetView[str]:
+    operands = []
+    for hosts in postings:
+        if hosts is None or _is_empty(hosts) or any(hosts is other for other in operands):
+            continue
+        operands.append(hosts)
+    if not operands:
+        return EMPTY
+    if len(operands) == 1:
+        return operands[0]
+    complements, others = [], []
+    for hosts in operands:
+        if isinstance(hosts, Difference) and hosts.hosts is universe:
+            complements.append(hosts)
+        else:
+            others.append(hosts)
+    if not complements:
+        return set().union(*others)
+    # a or not b == not (b - a)
+    excluded = _intersect([hosts.excluded for hosts in complements], universe)
+    for hosts in others:
+        if _is_empty(excluded):
+            break
+        excluded = excluded - hosts
+    return Difference(universe, excluded)
+
+
+def _intersect(operands: List[SetView[str]], universe: Set[str]) -> SetView[str]:
+    # (a - x) and (b - y) == (a and b) - (x or y), so only plain sets are
+    # intersected and the exclusions stay lazy.
+    bases, excluded = [], []
+    for hosts in operands:
+        if isinstance(hosts, Difference):
+            if hosts.hosts is not universe:
+                bases.append(hosts.hosts)
+            excluded.append(hosts.excluded)
+        else:
+            bases.append(hosts)
+    if not bases:
+        return Difference(universe, _union(*excluded, universe=universe))
+    # Intersecting smallest-first keeps every step proportional to the
+    # most selective term.
+    bases.sort(key=len)
+    result = bases[0]
+    for other in bases[1:]:
+        if not result:
+            return EMPTY
+        if other is not result:
+            result = result & other
+    if not excluded or not result:
+        return result
+    return Difference(result, _union(*excluded, universe=universe))
+
+
+def _negate(universe: Set[str], operand: SetView[str]) -> SetView[str]:
+    if isinstance(operand, Difference) and operand.hosts is universe:
+        return operand.excluded
+    return Difference(universe, operand)
+
+
+def _is_empty(hosts: SetView[str]) -> bool:
+    # Differences are not counted here, that would walk them.
+    return not isinstance(hosts, Difference) and not hosts
+
+
+def _union_matching(table: Dict, matches: Callable) -> Set[str]:
+    return _union(*(hosts for key, hosts in table.items() if matches(key)))
+
+
+def _host_tokens(host: HostRecord) -> Set[str]:
+    """
+    Leading parts of the address (``10``, ``10.0``, ``10.0.1`` and the whole
+    address), and the labels and domain suffixes of each hostname (``web01``,
+    ``example``, ``example.com`` and ``web01.example.com``).
+    """
+    parts = [part for part in HOST_SEPARATORS.split(host.address.lower()) if part]
+    separator = ":" if ":" in host.address else "."
+    tokens = {separator.join(parts[:end]) for end in range(1, len(parts) + 1)}
+    tokens.add(host.address.lower())
+    for name, _ in host.hostnames:
+        labels = name.lower().split(".") if name else []
+        tokens.update(labels)
+        tokens.update(".".join(labels[start:]) for start in range(len(labels)))
+    return tokens
+
+
+def _os_tokens(host: HostRecord) -> Set[str]:
+    names = []
+    if host.os_name:
+        names.append(host.os_name)
+    for match in (host.extra or {}).get("osmatch") or ():
+        for osclass in match.get("osclass") or ():
+            names.extend(
+                osclass.get(key) or "" for key in ("vendor", "osfamily", "osgen", "type")
+            )
+    tokens = set()
+    for name in names:
+        tokens.update(token for token in re.split(r"[\s,/()]+", name.lower()) if token)
+    return tokens
+
+
+def looks_like_query(text: str) -> bool:
+    """Tell filter expressions apart from plain substring searches."""
+    return ":" in text or "(" in text or bool(re.search(r"\s(and|or|not)\s", f" {text} "))
+
+
+def compile_query(expression: str) -> Callable[[ScanIndex], SetView[str]]:
+    """Parse a filter expression into a function evaluated against an index."""
+    tokens = _tokenize(expression)
+    if not tokens:
+        raise QueryError("Empty filter expression")
+    parser = _QueryParser(tokens)
+    predicate = parser.parse_or()
+    if parser.position != len(tokens):
+        raise QueryError(f"Unexpected '{tokens[parser.position][1]}'")
+    return predicate
+
+
+def _tokenize(expression: str) -> List[Tuple[str, object]]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN_REGEX.match(expression, position)
+        if match is None or match.end() == position:
+            raise QueryError(f"Cannot parse filter at '{expression[position:]}'")
+        position = match.end()
+        if match.group("lparen"):
+            tokens.append(("(", "("))
+        elif match.group("rparen"):
+            tokens.append((")", ")"))
+        elif match.group("term"):
+            value = match.group("quoted")
+            if value is None:
+                value = match.group("value")
+            tokens.append(("term", (match.group("field").lower(), value)))
+        else:
+            word = match.group("word")
+            lowered = word.lower()
+            if lowered in ("and", "or", "not"):
+                tokens.append((lowered, lowered))
+            else:
+                tokens.append(("word", word.strip('"')))
+    return tokens
+
+
+class _QueryParser:
+    """Recursive descent parser: or > and > not > atom."""
+
+    def __init__(self, tokens: List[Tuple[str, object]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def take(self) -> Tuple[str, object]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == "or":
+            self.take()
+            operands.append(self.parse_and())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda index: _union(
+            *(operand(index) for operand in operands), universe=index.hosts
+        )
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek() in ("and", "not", "term", "word", "("):
+            if self.peek() == "and":
+                self.take()
+            operands.append(self.parse_not())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda index: _intersect(
+            [operand(index) for operand in operands], index.hosts
+        )
+
+    def parse_not(self):
+        if self.peek() == "not":
+            self.take()
+            operand = self.parse_not()
+            return lambda index: _negate(index.hosts, operand(index))
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind = self.peek()
+        if kind is None:
+            raise QueryError("Filter expression ends unexpectedly")
+        kind, value = self.take()
+        if kind == "(":
+            inner = self.parse_or()
+            if self.peek() != ")":
+                raise QueryError("Missing closing parenthesis")
+            self.take()
+            return inner
+        if kind == "term":
+            field, term_value = value
+            if field not in QUERY_FIELDS:
+                raise QueryError(
+                    f"Unknown field '{field}', expected one of {', '.join(QUERY_FIELDS)}"
+                )
+            return lambda index: index.lookup(field, term_value)
+        if kind == "word":
+            word = value
+            return lambda index: _union(
+                index.by_host.get(word.lower()),
+                index.lookup("service", word),
+                index.lookup("product", word),
+            )
+        raise QueryError(f"Unexpected '{value}'")
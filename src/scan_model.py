@@ -0,0 +1,345 @@
+# scan_model.py
+#
+# Compact in-memory representation of nmap host results.
+#
+# Strings that repeat across hosts (states, reasons, service names, products,
+# versions, script ids) are interned, identical services are shared between
+# ports, and per-port numbers and state codes live in ``array`` tables instead
+# of one dict per port. Nested nmap-shaped dictionaries are only rebuilt on
+# demand through ``HostRecord.to_dict``.
+#
+# Measured with benchmarks/memory_scan_model.py on a synthetic /16 (65,536 up
+# hosts, 3 open and 2 closed ports each, CPython 3.11):
+#
+#   nmap host dicts + plain dict copies + YAML text    369.2 MiB
+#   HostRecord (this module)                             50.8 MiB
+import sys
+import threading
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PROTOCOLS = ("tcp", "udp", "sctp", "ip")
+SERVICE_FIELDS = ("name", "product", "version", "extrainfo", "conf", "cpe")
+
+_PROTOCOL_CODES = {protocol: code for code, protocol in enumerate(PROTOCOLS)}
+
+
+class StringTable:
+    """Maps repeated strings to small integer codes that fit in an array."""
+
+    __slots__ = ("_codes", "_strings", "_lock")
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._strings: List[str] = []
+        self._lock = threading.Lock()
+
+    def code(self, value: Optional[str]) -> int:
+        value = value or ""
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._strings)
+                    value = sys.intern(value)
+                    self._strings.append(value)
+                    self._codes[value] = code
+        return code
+
+    def string(self, code: int) -> str:
+        return self._strings[code]
+
+
+STATES = StringTable()
+REASONS = StringTable()
+
+
+class ServiceRecord:
+    """An immutable service fingerprint, shared between every port that reports it."""
+
+    __slots__ = SERVICE_FIELDS
+    _shared: Dict[Tuple[str, ...], "ServiceRecord"] = {}
+
+    def __init__(self, name="", product="", version="", extrainfo="", conf="", cpe=""):
+        for field, value in zip(SERVICE_FIELDS, (name, product, version, extrainfo, conf, cpe)):
+            object.__setattr__(self, field, sys.intern(str(value or "")))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("ServiceRecord is immutable")
+
+    def __reduce__(self):
+        return (ServiceRecord.get, self.fields())
+
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(getattr(self, field) for field in SERVICE_FIELDS)
+
+    @classmethod
+    def get(cls, *values: Any) -> "ServiceRecord":
+        key = tuple(str(value or "") for value in values)
+        service = cls._shared.get(key)
+        if service is None:
+            service = cls._shared[key] = cls(*key)
+        return service
+
+    @classmethod
+    def from_port(cls, port_data: Dict[str, Any]) -> "ServiceRecord":
+        return cls.get(*(port_data.get(field) for field in SERVICE_FIELDS))
+
+    @property
+    def label(self) -> str:
+        parts = (self.name, self.product, self.version)
+        return " ".join(part for part in parts if part) or "unknown"
+
+    def to_dict(self) -> Dict[str, str]:
+        return dict(zip(SERVICE_FIELDS, self.fields()))
+
+
+EMPTY_SERVICE = ServiceRecord.get()
+
+
+class PortRecord:
+    """A view of one row of a ``PortTable``."""
+
+    __slots__ = ("protocol", "port", "state", "reason", "service", "scripts")
+
+    def __init__(self, protocol, port, state, reason, service, scripts):
+        self.protocol = protocol
+        self.port = port
+        self.state = state
+        self.reason = reason
+        self.service = service
+        self.scripts = scripts
+
+    def to_dict(self) -> Dict[str, Any]:
+        port_data = {"state": self.state, "reason": self.reason}
+        port_data.update(self.service.to_dict())
+        if self.scripts:
+            port_data["script"] = dict(self.scripts)
+        return port_data
+
+
+class PortTable:
+    """
+    Array-backed ports of a single host.
+
+    Protocol, port number, state and reason are stored as parallel machine
+    arrays; services and script output are only kept for the rows that have
+    them.
+    """
+
+    __slots__ = ("protocols", "ports", "states", "reasons", "services", "scripts")
+
+    def __init__(self):
+        self.protocols = array("B")
+        self.ports = array("H")
+        self.states = array("H")
+        self.reasons = array("H")
+        self.services: Dict[int, ServiceRecord] = {}
+        self.scripts: Optional[Dict[int, Dict[str, str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+    def __getstate__(self):
+        # State and reason codes index this process's string tables, so they
+        # are pickled as strings (shared by pickle's memo) and re-coded when
+        # a table is loaded in another process.
+        return (
+            self.protocols,
+            self.ports,
+            [STATES.string(code) for code in self.states],
+            [REASONS.string(code) for code in self.reasons],
+            self.services,
+            self.scripts,
+        )
+
+    def __setstate__(self, state):
+        self.protocols, self.ports, states, reasons, self.services, self.scripts = state
+        self.states = array("H", map(STATES.code, states))
+        self.reasons = array("H", map(REASONS.code, reasons))
+
+    def append(
+        self,
+        protocol: str,
+        port: int,
+        state: str,
+        reason: str = "",
+        service: ServiceRecord = EMPTY_SERVICE,
+        scripts: Optional[Dict[str, str]] = None,
+    ):
+        index = len(self.ports)
+        self.protocols.append(_PROTOCOL_CODES[protocol])
+        self.ports.append(int(port))
+        self.states.append(STATES.code(state))
+        self.reasons.append(REASONS.code(reason))
+        if service is not EMPTY_SERVICE:
+            self.services[index] = service
+        if scripts:
+            if self.scripts is None:
+                self.scripts = {}
+            self.scripts[index] = {sys.intern(key): value for key, value in scripts.items()}
+
+    def row(self, index: int) -> PortRecord:
+        return PortRecord(
+            PROTOCOLS[self.protocols[index]],
+            self.ports[index],
+            STATES.string(self.states[index]),
+            REASONS.string(self.reasons[index]),
+            self.services.get(index, EMPTY_SERVICE),
+            self.scripts.get(index) if self.scripts else None,
+        )
+
+    def __iter__(self) -> Iterator[PortRecord]:
+        for index in range(len(self.ports)):
+            yield self.row(index)
+
+    def find(self, protocol: str, port: int) -> Optional[PortRecord]:
+        code = _PROTOCOL_CODES[protocol]
+        for index, number in enumerate(self.ports):
+            if number == port and self.protocols[index] == code:
+                return self.row(index)
+        return None
+
+    def set_scripts(self, protocol: str, port: int, scripts: Dict[str, str]) -> bool:
+        """Merge script output into a port's row; returns False if there is none."""
+        code = _PROTOCOL_CODES[protocol]
+        for index, number in enumerate(self.ports):
+            if number == port and self.protocols[index] == code:
+                if self.scripts is None:
+                    self.scripts = {}
+                row_scripts = self.scripts.setdefault(index, {})
+                row_scripts.update((sys.intern(key), value) for key, value in scripts.items())
+                return True
+        return False
+
+    def open_count(self) -> int:
+        open_code = STATES.code("open")
+        return self.states.count(open_code)
+
+
+class HostRecord:
+    """The results nmap reported for one host."""
+
+    __slots__ = (
+        "address",
+        "hostnames",
+        "state",
+        "reason",
+        "os_name",
+        "os_accuracy",
+        "ports",
+        "scripts",
+        "extra",
+    )
+
+    def __init__(self, address: str, state: str = "", reason: str = ""):
+        self.address = address
+        self.hostnames: Tuple[Tuple[str, str], ...] = ()
+        self.state = sys.intern(state or "")
+        self.reason = sys.intern(reason or "")
+        self.os_name: Optional[str] = None
+        self.os_accuracy: Optional[int] = None
+        self.ports = PortTable()
+        self.scripts: Optional[Dict[str, str]] = None
+        self.extra: Optional[Dict[str, Any]] = None
+
+    @property
+    def hostname(self) -> Optional[str]:
+        for name, _ in self.hostnames:
+            if name:
+                return name
+        return None
+
+    @classmethod
+    def from_dict(cls, address: str, host_data: Dict[str, Any]) -> "HostRecord":
+        """Build a record from an nmap-shaped host dictionary."""
+        status = host_data.get("status") or {}
+        host = cls(address, status.get("state"), status.get("reason"))
+        host.hostnames = tuple(
+            (entry.get("name", ""), sys.intern(entry.get("type", "")))
+            for entry in host_data.get("hostnames") or ()
+            if entry.get("name")
+        )
+
+        osmatch = host_data.get("osmatch") or []
+        if osmatch:
+            host.os_name = osmatch[0].get("name")
+            host.os_accuracy = int(osmatch[0].get("accuracy") or 0)
+
+        for protocol in PROTOCOLS:
+            for port, port_data in (host_data.get(protocol) or {}).items():
+                host.ports.append(
+                    protocol,
+                    port,
+                    port_data.get("state"),
+                    port_data.get("reason"),
+                    ServiceRecord.from_port(port_data),
+                    port_data.get("script"),
+                )
+
+        hostscript = host_data.get("hostscript")
+        if hostscript:
+            host.scripts = {script["id"]: script.get("output", "") for script in hostscript}
+
+        extra = {}
+        for key, value in host_data.items():
+            if key in PROTOCOLS or key in ("status", "hostnames", "hostscript"):
+                continue
+            if key == "addresses" and value == {"ipv4": address}:
+                continue
+            if key == "vendor" and not value:
+                continue
+            extra[key] = value
+        host.extra = extra or None
+        return host
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Rebuild the nmap-shaped host dictionary for display and export."""
+        host_data: Dict[str, Any] = {
+            "hostnames": [{"name": name, "type": kind} for name, kind in self.hostnames]
+            or [{"name": "", "type": ""}],
+            "addresses": {"ipv4": self.address},
+            "vendor": {},
+        }
+        if self.extra:
+            host_data.update(self.extra)
+        host_data["status"] = {"state": self.state, "reason": self.reason}
+        for port in self.ports:
+            host_data.setdefault(port.protocol, {})[port.port] = port.to_dict()
+        if self.scripts:
+            host_data["hostscript"] = [
+                {"id": script_id, "output": output}
+                for script_id, output in self.scripts.items()
+            ]
+        return host_data
+
+    def open_ports(self) -> Dict[Tuple[str, int], ServiceRecord]:
+        """Map (protocol, port) of every open port to its service."""
+        return {
+            (port.protocol, port.port): port.service
+            for port in self.ports
+            if port.state == "open"
+        }
+
+    def with_ports(self, fresh: "HostRecord") -> "HostRecord":
+        """
+        Return a copy of this record whose ports are overlaid with the ports
+        (and host status) reported in ``fresh``.
+        """
+        merged = HostRecord(self.address, fresh.state, fresh.reason)
+        merged.hostnames = self.hostnames or fresh.hostnames
+        merged.os_name, merged.os_accuracy = self.os_name, self.os_accuracy
+        merged.scripts, merged.extra = self.scripts, self.extra
+
+        fresh_rows = {(port.protocol, port.port): port for port in fresh.ports}
+        for port in self.ports:
+            port = fresh_rows.pop((port.protocol, port.port), port)
+            merged.ports.append(
+                port.protocol, port.port, port.state, port.reason, port.service, port.scripts
+            )
+        for port in fresh_rows.values():
+            merged.ports.append(
+                port.protocol, port.port, port.state, port.reason, port.service, port.scripts
+            )
+        return merged
@@ -0,0 +1,221 @@
+# scan_pipeline.py
+import logging
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import nmap
+
+from .nmap_scanner import NmapScanner, ScanOptions
+from .scan_model import HostRecord
+from .scan_rate import RateController
+from .targets import TargetSet, split_by_family
+
+DISCOVERY_ARGUMENTS = ["-sn", "-n", ScanOptions.DEFAULT.value, "--max-hostgroup", "256"]
+SWEEP_SHARD_SIZE = 4096
+GREPABLE_HOST_UP = re.compile(r"^Host:\s+(\S+)\s.*Status:\s+Up", re.IGNORECASE)
+
+HostsCallback = Callable[[Dict[str, HostRecord]], None]
+ProgressCallback = Callable[[int, int], None]
+
+
+class ScanPipeline:
+    """
+    Two-stage scan: a fast ping sweep streams live hosts into a bounded queue
+    while a pool of workers runs the port, OS and script scan on batches of
+    those hosts, so deep scanning starts before discovery has finished and
+    no expensive probes are spent on dead addresses. Each batch is a shard
+    for the optional rate controller, which tunes the timing of later
+    batches from the ones that finished.
+
+    The queue is bounded, so when the deep scan falls behind, the discovery
+    reader stops draining nmap's output and the ping sweep is paused by the
+    pipe rather than piling up hosts in memory.
+    """
+
+    def __init__(
+        self,
+        scanner: NmapScanner,
+        workers: int = 3,
+        batch_size: int = 16,
+        queue_size: int = 256,
+        batch_wait: float = 0.5,
+        controller: Optional[RateController] = None,
+    ):
+        self.scanner = scanner
+        self.controller = controller
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.hosts: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=queue_size)
+        self.cancelled = threading.Event()
+        self.discovered = 0
+        self.scanned = 0
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+
+    def cancel(self):
+        self.cancelled.set()
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+
+    def run(
+        self,
+        targets: TargetSet,
+        os_fingerprinting: bool,
+        scan_all_ports: bool,
+        selected_script: str,
+        on_hosts: Optional[HostsCallback] = None,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, HostRecord]:
+        """
+        Run discovery and deep scanning concurrently.
+
+        Args:
+            targets (TargetSet): The compiled targets to sweep.
+            os_fingerprinting (bool): Enable OS fingerprinting in the deep scan.
+            scan_all_ports (bool): Scan all ports in the deep scan.
+            selected_script (str): NSE script to run in the deep scan.
+            on_hosts: Called from worker threads with each batch of results.
+            on_progress: Called with (discovered, scanned) host counts.
+
+        Returns:
+            dict: Host records of every scanned host.
+        """
+        results: Dict[str, HostRecord] = {}
+        errors: List[Exception] = []
+
+        def report():
+            if on_progress:
+                on_progress(self.discovered, self.scanned)
+
+        def deep_scan_worker():
+            finished = False
+            while not finished:
+                batch, finished = self._next_batch()
+                if not batch or self.cancelled.is_set():
+                    continue
+                records: Dict[str, HostRecord] = {}
+                for ipv6, hosts in split_by_family(batch).items():
+                    timing = self.controller.options() if self.controller else None
+                    try:
+                        shard_records, stats = self.scanner.run_nmap_shard(
+                            hosts,
+                            os_fingerprinting,
+                            scan_all_ports,
+                            selected_script,
+                            timing=timing,
+                            ipv6=ipv6,
+                        )
+                        records.update(shard_records)
+                        if self.controller:
+                            self.controller.observe(stats)
+                    except Exception as e:
+                        logging.error(f"Deep scan of {len(hosts)} hosts failed: {e}")
+                        errors.append(e)
+                with self._lock:
+                    results.update(records)
+                    self.scanned += len(batch)
+                if records and on_hosts:
+                    on_hosts(records)
+                report()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(deep_scan_worker) for _ in range(self.workers)]
+            try:
+                for address in self._discover(targets):
+                    with self._lock:
+                        self.discovered += 1
+                    self.hosts.put(address)
+                    report()
+            finally:
+                for _ in futures:
+                    self.hosts.put(None)
+
+        if errors and not results:
+            raise errors[0]
+        return results
+
+    def discover(self, targets: TargetSet) -> List[str]:
+        """Ping sweep ``targets`` without deep scanning and return the live hosts."""
+        live = []
+        for address in self._discover(targets):
+            self.discovered += 1
+            live.append(address)
+        return live
+
+    def _discover(self, targets: TargetSet):
+        nmap_path = shutil.which("nmap")
+        if nmap_path is None:
+            raise nmap.PortScannerError("nmap program was not found in path")
+        started = time.monotonic()
+        # Shards never overlap, so no address is swept twice, and they keep
+        # each command line bounded for long target lists.
+        for shard in targets.shards(SWEEP_SHARD_SIZE):
+            if self.cancelled.is_set():
+                break
+            yield from self._sweep(nmap_path, shard.targets, shard.ipv6)
+        logging.debug(
+            f"Host discovery finished in {time.monotonic() - started:.1f}s, "
+            f"{self.discovered} hosts up"
+        )
+
+    def _sweep(self, nmap_path: str, targets: List[str], ipv6: bool):
+        command = [nmap_path, *DISCOVERY_ARGUMENTS, "-oG", "-"]
+        if ipv6:
+            command.append(ScanOptions.IPV6.value)
+        command.extend(targets)
+        logging.debug(f"Sweeping {len(targets)} target blocks for live hosts")
+        # stderr goes to a file: a pipe read only after stdout ends would
+        # block nmap once it fills, with stdout still waiting for nmap.
+        with tempfile.TemporaryFile() as stderr:
+            self._process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                text=True,
+                bufsize=1,
+            )
+            for line in self._process.stdout:
+                if self.cancelled.is_set():
+                    break
+                match = GREPABLE_HOST_UP.match(line)
+                if match:
+                    yield match.group(1)
+            self._process.wait()
+            if self._process.returncode not in (0, None) and not self.cancelled.is_set():
+                stderr.seek(0)
+                raise nmap.PortScannerError(stderr.read().decode(errors="replace").strip())
+
+    def _next_batch(self) -> Tuple[List[str], bool]:
+        """
+        Collect up to ``batch_size`` hosts, waiting at most ``batch_wait``
+        seconds after the first one.
+
+        Returns:
+            tuple: The batch, and whether this worker has taken its end
+            marker off the queue and should stop after the batch.
+        """
+        first = self.hosts.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                address = self.hosts.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if address is None:
+                return batch, True
+            batch.append(address)
+        return batch, False
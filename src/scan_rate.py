@@ -0,0 +1,229 @@
+# scan_rate.py
+import logging
+import re
+import statistics
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, replace
+from typing import Iterable, Optional, Union
+
+# A shard is congested when its median RTT grows past this multiple of the
+# best RTT seen so far, or its share of unanswered probes grows by more than
+# DROP_TOLERANCE over the best shard.
+RTT_INFLATION = 2.0
+DROP_TOLERANCE = 0.1
+RATE_STEP = 50
+RETRANSMISSION_CAP_WARNING = re.compile(r"retransmission cap hit", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    """Ceilings and floors the controller never leaves."""
+
+    max_rate: int = 2000
+    min_rate: int = 50
+    max_retries: int = 6
+    min_retries: int = 1
+    max_parallelism: int = 256
+    min_parallelism: int = 8
+    max_rtt_timeout_ms: int = 1250
+    min_rtt_timeout_ms: int = 100
+
+
+@dataclass(frozen=True)
+class RateSettings:
+    rate: int
+    retries: int
+    parallelism: int
+    rtt_timeout_ms: Optional[int] = None
+
+    def options(self) -> str:
+        options = (
+            f"--max-rate {self.rate} --max-retries {self.retries} "
+            f"--max-parallelism {self.parallelism}"
+        )
+        if self.rtt_timeout_ms:
+            options += f" --max-rtt-timeout {self.rtt_timeout_ms}ms"
+        return options
+
+
+@dataclass(frozen=True)
+class ShardStats:
+    hosts: int = 0
+    srtt_ms: Optional[float] = None
+    rttvar_ms: Optional[float] = None
+    probed_ports: int = 0
+    unanswered_ports: int = 0
+    retransmission_cap_hits: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def drop_ratio(self) -> float:
+        if not self.probed_ports:
+            return 0.0
+        return self.unanswered_ports / self.probed_ports
+
+
+def parse_shard_stats(
+    xml_output: Union[str, bytes, None], warnings: Iterable[str] = ()
+) -> ShardStats:
+    """
+    Summarize the timing of one nmap run from its XML output.
+
+    Args:
+        xml_output: The ``-oX`` output of the run.
+        warnings: nmap's stderr warnings, which report hosts where probes hit
+            the retransmission cap.
+
+    Returns:
+        ShardStats: Median smoothed RTT and variance across hosts, the number
+        of probed and unanswered ports, and the retransmission cap hits.
+    """
+    cap_hits = sum(1 for line in warnings if RETRANSMISSION_CAP_WARNING.search(line))
+    if not xml_output:
+        return ShardStats(retransmission_cap_hits=cap_hits)
+    try:
+        root = ET.fromstring(xml_output)
+    except ET.ParseError as e:
+        logging.warning(f"Could not parse nmap XML for shard statistics: {e}")
+        return ShardStats(retransmission_cap_hits=cap_hits)
+
+    srtts, rttvars = [], []
+    probed = unanswered = 0
+    hosts = root.findall("host")
+    for host in hosts:
+        times = host.find("times")
+        if times is not None and times.get("srtt"):
+            # nmap reports both in microseconds.
+            srtts.append(int(times.get("srtt")) / 1000)
+            rttvars.append(int(times.get("rttvar", "0")) / 1000)
+        ports = host.find("ports")
+        if ports is None:
+            continue
+        for extra in ports.findall("extraports"):
+            probed += int(extra.get("count", "0"))
+            for reasons in extra.findall("extrareasons"):
+                if reasons.get("reason") == "no-response":
+                    unanswered += int(reasons.get("count", "0"))
+        for port in ports.findall("port"):
+            probed += 1
+            state = port.find("state")
+            if state is not None and state.get("reason") == "no-response":
+                unanswered += 1
+
+    finished = root.find("runstats/finished")
+    elapsed = float(finished.get("elapsed", "0")) if finished is not None else 0.0
+    return ShardStats(
+        hosts=len(hosts),
+        srtt_ms=statistics.median(srtts) if srtts else None,
+        rttvar_ms=statistics.median(rttvars) if rttvars else None,
+        probed_ports=probed,
+        unanswered_ports=unanswered,
+        retransmission_cap_hits=cap_hits,
+        elapsed=elapsed,
+    )
+
+
+class RateController:
+    """
+    Adapt nmap's rate, retries and parallelism from shard to shard.
+
+    Each finished shard is classified as healthy or congested by comparing its
+    RTT and unanswered-probe share with the best shard seen so far and by the
+    retransmission cap warnings nmap printed. Healthy shards let the next ones
+    go faster; a congested shard halves the rate and parallelism and allows
+    another retry (additive increase, multiplicative decrease). The RTT
+    timeout follows the measured RTT. Settings never leave ``limits``.
+    """
+
+    def __init__(self, limits: RateLimits = RateLimits()):
+        self.limits = limits
+        self.settings = RateSettings(
+            rate=max(limits.min_rate, limits.max_rate // 4),
+            retries=min(max(2, limits.min_retries), limits.max_retries),
+            parallelism=max(limits.min_parallelism, limits.max_parallelism // 4),
+        )
+        self.best_srtt_ms: Optional[float] = None
+        self.best_drop_ratio: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def options(self) -> str:
+        with self._lock:
+            return self.settings.options()
+
+    def observe(self, stats: ShardStats) -> RateSettings:
+        with self._lock:
+            if not stats.hosts:
+                return self.settings
+            reason = self._congestion_reason(stats)
+            if reason:
+                self.settings = self._back_off()
+                logging.info(f"Shard congested ({reason}), backing off: {self.settings}")
+            else:
+                self.settings = self._speed_up()
+                logging.info(
+                    f"Shard healthy (srtt {stats.srtt_ms} ms, "
+                    f"{stats.drop_ratio:.0%} unanswered), speeding up: {self.settings}"
+                )
+            self._track(stats, congested=bool(reason))
+            return self.settings
+
+    def _congestion_reason(self, stats: ShardStats) -> Optional[str]:
+        if stats.retransmission_cap_hits:
+            return f"{stats.retransmission_cap_hits} hosts hit the retransmission cap"
+        if (
+            stats.srtt_ms is not None
+            and self.best_srtt_ms
+            and stats.srtt_ms > RTT_INFLATION * self.best_srtt_ms
+        ):
+            return f"srtt {stats.srtt_ms:.1f} ms vs best {self.best_srtt_ms:.1f} ms"
+        if (
+            self.best_drop_ratio is not None
+            and stats.drop_ratio - self.best_drop_ratio > DROP_TOLERANCE
+        ):
+            return (
+                f"{stats.drop_ratio:.0%} probes unanswered vs best "
+                f"{self.best_drop_ratio:.0%}"
+            )
+        return None
+
+    def _back_off(self) -> RateSettings:
+        limits, current = self.limits, self.settings
+        return replace(
+            current,
+            rate=max(limits.min_rate, current.rate // 2),
+            parallelism=max(limits.min_parallelism, current.parallelism // 2),
+            retries=min(limits.max_retries, current.retries + 1),
+        )
+
+    def _speed_up(self) -> RateSettings:
+        limits, current = self.limits, self.settings
+        return replace(
+            current,
+            rate=min(limits.max_rate, current.rate + max(RATE_STEP, current.rate // 4)),
+            parallelism=min(
+                limits.max_parallelism, current.parallelism + max(1, current.parallelism // 4)
+            ),
+            retries=max(limits.min_retries, current.retries - 1),
+        )
+
+    def _track(self, stats: ShardStats, congested: bool):
+        if stats.srtt_ms is not None:
+            if self.best_srtt_ms is None or stats.srtt_ms < self.best_srtt_ms:
+                self.best_srtt_ms = stats.srtt_ms
+            # Give slow probes room without waiting on the template default:
+            # a few deviations above the shard's RTT, inside the limits.
+            timeout = 3 * (stats.srtt_ms + 4 * (stats.rttvar_ms or 0))
+            self.settings = replace(
+                self.settings,
+                rtt_timeout_ms=int(
+                    min(
+                        self.limits.max_rtt_timeout_ms,
+                        max(self.limits.min_rtt_timeout_ms, timeout),
+                    )
+                ),
+            )
+        if not congested and (
+            self.best_drop_ratio is None or stats.drop_ratio < self.best_drop_ratio
+        ):
+            self.best_drop_ratio = stats.drop_ratio
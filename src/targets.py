@@ -0,0 +1,377 @@
+# targets.py
+import bisect
+import os
+import re
+import socket
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# Compiled once: validating a target list must not rebuild them per entry.
+SEPARATOR_REGEX = re.compile(r"[\s,]+")
+OCTET_RANGE_REGEX = re.compile(r"^(\d{1,3}\.\d{1,3}\.\d{1,3}\.)(\d{1,3})-(\d{1,3})$")
+HOSTNAME_REGEX = re.compile(r"^(?:localhost|(?:[A-Za-z0-9-]{1,63}\.)+[A-Za-z]{2,})$")
+
+ADDRESS_BITS = {4: 32, 6: 128}
+DEFAULT_SHARD_SIZE = 4096
+
+
+class TargetError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class TargetShard:
+    """A slice of a target set that a single nmap run can take."""
+
+    targets: List[str]
+    size: int
+    ipv6: bool = False
+
+
+class IntervalSet:
+    """
+    Sorted, non-overlapping, inclusive integer intervals.
+
+    Intervals are appended unsorted and merged once by ``normalize()``, so
+    building a set from n entries costs one O(n log n) sort.
+    """
+
+    __slots__ = ("intervals", "_normalized", "_count")
+
+    def __init__(self):
+        self.intervals: List[Tuple[int, int]] = []
+        self._normalized = True
+        self._count = 0
+
+    def add(self, start: int, end: int):
+        self.intervals.append((start, end))
+        self._normalized = False
+
+    def extend(self, intervals: Iterable[Tuple[int, int]]):
+        self.intervals.extend(intervals)
+        self._normalized = False
+
+    def normalize(self) -> "IntervalSet":
+        if self._normalized:
+            return self
+        merged: List[Tuple[int, int]] = []
+        count = 0
+        intervals = sorted(self.intervals)
+        if intervals:
+            low, high = intervals[0]
+            for start, end in intervals:
+                if start <= high + 1:
+                    if end > high:
+                        high = end
+                    continue
+                merged.append((low, high))
+                count += high - low + 1
+                low, high = start, end
+            merged.append((low, high))
+            count += high - low + 1
+        self.intervals = merged
+        self._normalized = True
+        self._count = count
+        return self
+
+    def subtract(self, other: "IntervalSet") -> "IntervalSet":
+        """Remove every value in ``other`` from this set."""
+        self.normalize()
+        other.normalize()
+        result: List[Tuple[int, int]] = []
+        cuts = other.intervals
+        i = 0
+        for start, end in self.intervals:
+            while i < len(cuts) and cuts[i][1] < start:
+                i += 1
+            j = i
+            while start <= end and j < len(cuts) and cuts[j][0] <= end:
+                cut_start, cut_end = cuts[j]
+                if cut_start > start:
+                    result.append((start, cut_start - 1))
+                start = max(start, cut_end + 1)
+                j += 1
+            if start <= end:
+                result.append((start, end))
+        self.intervals = result
+        self._count = sum(end - start + 1 for start, end in result)
+        return self
+
+    def __len__(self) -> int:
+        return self.normalize()._count
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return iter(self.normalize().intervals)
+
+    def __contains__(self, value: int) -> bool:
+        intervals = self.normalize().intervals
+        i = bisect.bisect_right(intervals, (value, float("inf"))) - 1
+        return i >= 0 and intervals[i][0] <= value <= intervals[i][1]
+
+
+class TargetSet:
+    """
+    The unique hosts of a target expression: IPv4 and IPv6 interval sets plus
+    the hostnames, which nmap resolves itself.
+    """
+
+    def __init__(self):
+        self.addresses: Dict[int, IntervalSet] = {4: IntervalSet(), 6: IntervalSet()}
+        self.hostnames: Dict[str, str] = {}
+        self.requested = 0
+        self.duplicates = 0
+        self.excluded = 0
+
+    def __len__(self) -> int:
+        return len(self.addresses[4]) + len(self.addresses[6]) + len(self.hostnames)
+
+    def __contains__(self, target: str) -> bool:
+        if target.lower() in self.hostnames:
+            return True
+        try:
+            version, value = parse_address(target)
+        except TargetError:
+            return False
+        return value in self.addresses[version]
+
+    @property
+    def has_ipv6(self) -> bool:
+        return bool(self.addresses[6])
+
+    def summary(self) -> str:
+        text = f"{len(self)} unique hosts"
+        details = []
+        if self.duplicates:
+            details.append(f"{self.duplicates} duplicates merged")
+        if self.excluded:
+            details.append(f"{self.excluded} excluded")
+        return f"{text} ({', '.join(details)})" if details else text
+
+    def hosts(self) -> Iterator[str]:
+        """Yield every address, then every hostname, one at a time."""
+        for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+            length = ADDRESS_BITS[version] // 8
+            for start, end in self.addresses[version]:
+                for value in range(start, end + 1):
+                    yield socket.inet_ntop(family, value.to_bytes(length, "big"))
+        yield from self.hostnames.values()
+
+    def without(self, addresses: Iterable[str]) -> "TargetSet":
+        """Return a copy of the set with the given single addresses removed."""
+        removed = {4: IntervalSet(), 6: IntervalSet()}
+        for address in addresses:
+            try:
+                version, value = parse_address(address)
+            except TargetError:
+                continue
+            removed[version].add(value, value)
+        remaining = TargetSet()
+        for version, family in self.addresses.items():
+            remaining.addresses[version].extend(family)
+            if removed[version]:
+                remaining.addresses[version].subtract(removed[version])
+        remaining.hostnames = dict(self.hostnames)
+        return remaining
+
+    def nmap_targets(self) -> Dict[bool, List[str]]:
+        """
+        Return the set as nmap target specifications keyed by whether they
+        need ``-6``. Merged intervals become the fewest covering CIDR blocks.
+        """
+        groups: Dict[bool, List[str]] = {}
+        for shard in self.shards(max_size=None):
+            groups.setdefault(shard.ipv6, []).extend(shard.targets)
+        return groups
+
+    def shards(self, max_size: int = DEFAULT_SHARD_SIZE) -> Iterator[TargetShard]:
+        """
+        Split the set into shards of at most ``max_size`` hosts, each of one
+        address family, so no address lands in two shards.
+        """
+        for version in (4, 6):
+            targets: List[str] = []
+            size = 0
+            for start, end in self.addresses[version]:
+                while start <= end:
+                    take = end - start + 1
+                    if max_size:
+                        take = min(take, max_size - size)
+                    targets.extend(_cidrs(version, start, start + take - 1))
+                    size += take
+                    start += take
+                    if max_size and size >= max_size:
+                        yield TargetShard(targets, size, version == 6)
+                        targets, size = [], 0
+            if targets:
+                yield TargetShard(targets, size, version == 6)
+
+        names = list(self.hostnames.values())
+        step = max_size or len(names) or 1
+        for i in range(0, len(names), step):
+            chunk = names[i : i + step]
+            yield TargetShard(chunk, len(chunk))
+
+
+def _cidrs(version: int, start: int, end: int) -> List[str]:
+    """Cover ``start``..``end`` with the fewest aligned CIDR blocks."""
+    family = socket.AF_INET if version == 4 else socket.AF_INET6
+    bits = ADDRESS_BITS[version]
+    blocks = []
+    while start <= end:
+        # The largest block aligned at start that does not pass end.
+        size_bits = min((start & -start).bit_length() - 1 if start else bits,
+                        (end - start + 1).bit_length() - 1)
+        text = socket.inet_ntop(family, start.to_bytes(bits // 8, "big"))
+        blocks.append(text if size_bits == 0 else f"{text}/{bits - size_bits}")
+        start += 1 << size_bits
+    return blocks
+
+
+def parse_address(text: str) -> Tuple[int, int]:
+    """Return the address family and integer value of a single address."""
+    family, version = (socket.AF_INET6, 6) if ":" in text else (socket.AF_INET, 4)
+    try:
+        return version, int.from_bytes(socket.inet_pton(family, text), "big")
+    except (OSError, ValueError):
+        raise TargetError(f"Invalid IP address '{text}'")
+
+
+def parse_target(text: str) -> Tuple[int, int, int]:
+    """
+    Parse one address, CIDR block or range into ``(version, start, end)``.
+
+    Hostnames are returned as version 0.
+    """
+    if "/" in text:
+        address, _, prefix = text.partition("/")
+        version, value = parse_address(address)
+        bits = ADDRESS_BITS[version]
+        if not prefix.isdigit() or int(prefix) > bits:
+            raise TargetError(f"Invalid prefix length in '{text}'")
+        host_bits = bits - int(prefix)
+        start = (value >> host_bits) << host_bits
+        return version, start, start + (1 << host_bits) - 1
+
+    match = OCTET_RANGE_REGEX.match(text)
+    if match:
+        prefix, low, high = match.groups()
+        _, start = parse_address(f"{prefix}{low}")
+        _, end = parse_address(f"{prefix}{high}")
+        if end < start:
+            raise TargetError(f"Empty range '{text}'")
+        return 4, start, end
+
+    if ":" in text or text[:1].isdigit():
+        try:
+            if "-" not in text:
+                version, value = parse_address(text)
+                return version, value, value
+            first, _, last = text.partition("-")
+            version, start = parse_address(first)
+            last_version, end = parse_address(last)
+        except TargetError:
+            # Hostnames may start with a digit or contain dashes.
+            if ":" in text or not HOSTNAME_REGEX.match(text):
+                raise
+        else:
+            if version != last_version or end < start:
+                raise TargetError(f"Invalid range '{text}'")
+            return version, start, end
+
+    if HOSTNAME_REGEX.match(text):
+        return 0, 0, 0
+    raise TargetError(f"Invalid target '{text}'")
+
+
+def _tokens(text: str, allow_files: bool = True) -> Iterator[str]:
+    for token in SEPARATOR_REGEX.split(text):
+        if not token:
+            continue
+        if token[0] not in "#@!":
+            yield token
+        elif token[0] == "#":
+            continue
+        elif token.startswith("@") or token.startswith("!@"):
+            if not allow_files:
+                raise TargetError(f"Nested target file '{token}' is not supported")
+            negate = token.startswith("!")
+            path = os.path.expanduser(token[2:] if negate else token[1:])
+            try:
+                with open(path, encoding="utf-8") as target_file:
+                    lines = [line.split("#", 1)[0] for line in target_file]
+            except OSError as e:
+                raise TargetError(f"Cannot read target file '{path}': {e.strerror}")
+            for entry in _tokens(" ".join(lines), allow_files=False):
+                yield f"!{entry}" if negate and not entry.startswith("!") else entry
+        else:
+            yield token
+
+
+def compile_targets(text: str) -> TargetSet:
+    """
+    Compile a target expression into the set of unique hosts to scan.
+
+    Entries are separated by whitespace or commas and may be IPv4 or IPv6
+    addresses, CIDR blocks, ``10.0.0.1-50`` or ``first-last`` ranges and
+    hostnames. ``@path`` reads more entries from a file, and a ``!`` prefix
+    excludes an entry. Overlapping entries are merged. A list of 100,000
+    scattered addresses takes about a quarter to a third of a second.
+
+    Raises:
+        TargetError: If an entry cannot be parsed or nothing is left to scan.
+    """
+    targets = TargetSet()
+    excluded = {4: IntervalSet(), 6: IntervalSet()}
+    excluded_names = set()
+
+    # Plain IPv4 addresses are the bulk of long target lists; they skip the
+    # general parser and are collected as single-address intervals.
+    inet_pton, af_inet, from_bytes = socket.inet_pton, socket.AF_INET, int.from_bytes
+    singles = []
+    for token in _tokens(text):
+        try:
+            singles.append(from_bytes(inet_pton(af_inet, token), "big"))
+            continue
+        except OSError:
+            pass
+        negate = token[0] == "!"
+        entry = token[1:] if negate else token
+        version, start, end = parse_target(entry)
+        if version == 0:
+            if negate:
+                excluded_names.add(entry.lower())
+            else:
+                targets.requested += 1
+                targets.hostnames.setdefault(entry.lower(), entry)
+        elif negate:
+            excluded[version].add(start, end)
+        else:
+            targets.requested += end - start + 1
+            targets.addresses[version].add(start, end)
+    targets.requested += len(singles)
+    targets.addresses[4].extend((value, value) for value in singles)
+
+    merged = sum(len(addresses) for addresses in targets.addresses.values())
+    merged += len(targets.hostnames)
+    targets.duplicates = targets.requested - merged
+    for version, addresses in targets.addresses.items():
+        if excluded[version]:
+            addresses.subtract(excluded[version])
+    for name in excluded_names:
+        targets.hostnames.pop(name, None)
+    targets.excluded = merged - len(targets)
+
+    if not len(targets):
+        raise TargetError("No targets left to scan")
+    return targets
+
+
+def split_by_family(addresses: Iterable[str]) -> Dict[bool, List[str]]:
+    """Group single addresses by whether nmap needs ``-6`` for them."""
+    groups: Dict[bool, List[str]] = {}
+    for address in addresses:
+        groups.setdefault(":" in address, []).append(address)
+    return groups
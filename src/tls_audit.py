@@ -0,0 +1,378 @@
+# tls_audit.py
+"""
+TLS certificate and handshake audit of many ``host:port`` endpoints.
+
+Each endpoint gets one full handshake, which records the certificate
+chain, expiry, SANs, the negotiated protocol and cipher, whether the chain
+verifies, and the connect and handshake latency. Re-checks then resume the
+TLS session from the first handshake and measure how much faster that is.
+
+Python's asyncio cannot resume sessions, so endpoints are audited on
+blocking sockets in a thread pool. The ssl module also cannot request a
+stapled OCSP response; with ``ocsp`` set, it is checked with the
+``openssl`` command line tool, when installed, at the cost of one process
+per endpoint.
+"""
+import datetime
+import hashlib
+import logging
+import re
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import metrics, tracing
+from .enrichment import CertificateSummary, parse_certificate, unverified_tls_context
+from .targets import TargetError
+
+DEFAULT_PORT = 443
+# Seconds to wait after a handshake for TLS 1.3 session tickets, which
+# only arrive after it and are needed to resume.
+TICKET_WAIT = 0.1
+# Certificates expiring within this many days are flagged.
+EXPIRY_WARNING_DAYS = 30
+OCSP_RESPONSE_REGEX = re.compile(r"OCSP Response Status: (\w+)")
+
+
+@dataclass(frozen=True)
+class TlsAuditOptions:
+    timeout: float = 5.0
+    concurrency: int = 64
+    # Resumed handshakes per endpoint after the full one.
+    rechecks: int = 1
+    ocsp: bool = False
+
+
+@dataclass
+class TlsAuditResult:
+    target: str
+    host: str
+    port: int
+    address: str = ""
+    protocol: str = ""
+    cipher: str = ""
+    cipher_bits: int = 0
+    trusted: bool = False
+    verify_error: str = ""
+    chain: List[CertificateSummary] = field(default_factory=list)
+    connect_ms: float = 0.0
+    handshake_ms: float = 0.0
+    resumed_handshake_ms: List[float] = field(default_factory=list)
+    session_reused: Optional[bool] = None
+    # None when it was not or could not be checked.
+    ocsp_stapled: Optional[bool] = None
+    error: Optional[str] = None
+
+    @property
+    def certificate(self) -> Optional[CertificateSummary]:
+        return self.chain[0] if self.chain else None
+
+    @property
+    def days_left(self) -> Optional[int]:
+        if self.certificate is None or self.certificate.not_after is None:
+            return None
+        return (self.certificate.not_after - datetime.datetime.utcnow()).days
+
+    @property
+    def resumption_speedup(self) -> Optional[float]:
+        """How many times faster a resumed handshake was than the full one."""
+        if not self.session_reused or not self.resumed_handshake_ms:
+            return None
+        resumed = min(self.resumed_handshake_ms)
+        return round(self.handshake_ms / resumed, 2) if resumed else None
+
+    def to_dict(self) -> Dict[str, object]:
+        record = {"target": self.target, "host": self.host, "port": self.port}
+        if self.error:
+            record["error"] = self.error
+            return record
+        certificate = self.certificate
+        record.update(
+            address=self.address,
+            protocol=self.protocol,
+            cipher=self.cipher,
+            cipher_bits=self.cipher_bits,
+            trusted=self.trusted,
+            verify_error=self.verify_error or None,
+            subject=certificate.subject if certificate else None,
+            issuer=certificate.issuer if certificate else None,
+            alt_names=certificate.alt_names if certificate else [],
+            not_after=certificate.not_after if certificate else None,
+            days_left=self.days_left,
+            chain=[
+                {
+                    "subject": summary.subject,
+                    "issuer": summary.issuer,
+                    "not_after": summary.not_after,
+                    "sha256": summary.sha256,
+                }
+                for summary in self.chain
+            ],
+            ocsp_stapled=self.ocsp_stapled,
+            connect_ms=self.connect_ms,
+            handshake_ms=self.handshake_ms,
+            resumed_handshake_ms=self.resumed_handshake_ms,
+            session_reused=self.session_reused,
+            resumption_speedup=self.resumption_speedup,
+        )
+        return record
+
+    def to_text(self) -> str:
+        if self.error:
+            return f"{self.target}: {self.error}"
+        lines = [f"{self.target} ({self.address})"]
+        lines.append(f"Protocol: {self.protocol}, cipher {self.cipher} ({self.cipher_bits} bits)")
+        lines.append(f"Trusted: {'yes' if self.trusted else f'no ({self.verify_error})'}")
+        days_left = self.days_left
+        if days_left is not None:
+            warning = " (expiring soon)" if days_left < EXPIRY_WARNING_DAYS else ""
+            lines.append(f"Days left: {days_left}{warning}")
+        if self.certificate is not None:
+            lines.append(self.certificate.to_text())
+        for index, summary in enumerate(self.chain[1:], 1):
+            subject = summary.subject.get("commonName", summary.sha256[:16])
+            lines.append(f"Chain {index}: {subject}")
+        if self.ocsp_stapled is not None:
+            lines.append(f"OCSP stapled: {'yes' if self.ocsp_stapled else 'no'}")
+        lines.append(f"Connect: {self.connect_ms} ms, handshake: {self.handshake_ms} ms")
+        if self.resumed_handshake_ms:
+            reused = "resumed" if self.session_reused else "not resumed"
+            lines.append(
+                f"Re-check: {min(self.resumed_handshake_ms)} ms, {reused}"
+                + (f", {self.resumption_speedup}x faster" if self.resumption_speedup else "")
+            )
+        return "\n".join(lines)
+
+
+def parse_endpoint(value: str, default_port: int = DEFAULT_PORT) -> Tuple[str, int]:
+    """
+    Split ``host``, ``host:port``, ``[v6]:port`` or an https URL into a
+    host and port.
+
+    Raises:
+        TargetError: If the port is not a number from 1 to 65535.
+    """
+    text = value.strip()
+    if "://" in text:
+        text = text.split("://", 1)[1]
+    text = text.split("/", 1)[0]
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        port_text = rest[1:] if rest.startswith(":") else ""
+    elif text.count(":") == 1:
+        host, port_text = text.split(":")
+    else:
+        host, port_text = text, ""
+    if not host:
+        raise TargetError(f"No host in {value!r}")
+    if not port_text:
+        return host, default_port
+    if not port_text.isdigit() or not 0 < int(port_text) < 65536:
+        raise TargetError(f"Invalid port in {value!r}")
+    return host, int(port_text)
+
+
+def _is_address(host: str) -> bool:
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+    except OSError:
+        return False
+    return True
+
+
+def _peer_chain(tls: ssl.SSLSocket) -> List[bytes]:
+    # The whole chain is only exposed from Python 3.13; before that, the
+    # leaf certificate is all there is.
+    get_chain = getattr(tls, "get_unverified_chain", None)
+    if get_chain is not None:
+        chain = get_chain()
+        chain = [cert for cert in chain or () if isinstance(cert, bytes)]
+        if chain:
+            return chain
+    der = tls.getpeercert(binary_form=True)
+    return [der] if der else []
+
+
+def _summarize(der: bytes) -> CertificateSummary:
+    try:
+        return parse_certificate(der)
+    except ValueError as e:
+        logging.debug(f"Unparsed certificate: {e}")
+        return CertificateSummary(sha256=hashlib.sha256(der).hexdigest())
+
+
+def check_ocsp_stapling(host: str, port: int, server_name: Optional[str], timeout: float):
+    """
+    Whether the endpoint staples an OCSP response, asked of ``openssl
+    s_client``; None when openssl is not installed or did not answer.
+    """
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        return None
+    connect = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+    command = [openssl, "s_client", "-connect", connect, "-status"]
+    if server_name and not _is_address(server_name):
+        command += ["-servername", server_name]
+    try:
+        completed = subprocess.run(
+            command,
+            input=b"",
+            capture_output=True,
+            timeout=timeout,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.debug(f"OCSP check of {connect} failed: {e}")
+        return None
+    output = completed.stdout.decode("latin-1")
+    if "OCSP response: no response sent" in output:
+        return False
+    match = OCSP_RESPONSE_REGEX.search(output)
+    return match.group(1) == "successful" if match else None
+
+
+class TlsAuditor:
+    """Audits TLS endpoints concurrently."""
+
+    def __init__(self, options: TlsAuditOptions = TlsAuditOptions()):
+        self.options = options
+        self.cancelled = threading.Event()
+        self._verified_context = ssl.create_default_context()
+        self._unverified_context = unverified_tls_context()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _handshake(
+        self,
+        host: str,
+        port: int,
+        context: ssl.SSLContext,
+        server_name: Optional[str],
+        session: Optional[ssl.SSLSession] = None,
+    ):
+        """Connect and shake hands; returns the socket and the two latencies."""
+        started = time.perf_counter()
+        sock = socket.create_connection((host, port), timeout=self.options.timeout)
+        connected = time.perf_counter()
+        try:
+            tls = context.wrap_socket(sock, server_hostname=server_name, session=session)
+        except Exception:
+            sock.close()
+            raise
+        done = time.perf_counter()
+        kind = "resumed" if tls.session_reused else "full"
+        metrics.TLS_HANDSHAKES.inc(kind=kind, result="ok")
+        metrics.TLS_HANDSHAKE_SECONDS.observe(done - connected, kind=kind)
+        return tls, round((connected - started) * 1000, 2), round((done - connected) * 1000, 2)
+
+    @staticmethod
+    def _close(tls: ssl.SSLSocket) -> Optional[ssl.SSLSession]:
+        """Close the connection and return its session for resumption."""
+        # TLS 1.3 sends session tickets after the handshake; read briefly
+        # so they are processed before the session is taken.
+        if tls.version() == "TLSv1.3":
+            tls.settimeout(TICKET_WAIT)
+            try:
+                tls.recv(1)
+            except (OSError, ssl.SSLError):
+                pass
+        session = tls.session
+        try:
+            tls.close()
+        except OSError:
+            pass
+        return session
+
+    def audit_one(self, target: str) -> TlsAuditResult:
+        try:
+            host, port = parse_endpoint(target)
+        except TargetError as e:
+            return TlsAuditResult(target, target, 0, error=str(e))
+        result = TlsAuditResult(target, host, port)
+        # The ssl module leaves SNI out for addresses but still checks them
+        # against the certificate.
+        server_name = host
+        with tracing.span("tls.audit", "tls", target=target) as span:
+            try:
+                context, session = self._full_handshake(result, server_name)
+                for _ in range(self.options.rechecks):
+                    if self.cancelled.is_set() or session is None:
+                        break
+                    tls, _, handshake_ms = self._handshake(
+                        host, port, context, server_name, session
+                    )
+                    reused = tls.session_reused
+                    result.session_reused = reused and result.session_reused is not False
+                    result.resumed_handshake_ms.append(handshake_ms)
+                    session = self._close(tls) or session
+                if self.options.ocsp:
+                    result.ocsp_stapled = check_ocsp_stapling(
+                        host, port, server_name, self.options.timeout
+                    )
+            except (OSError, ssl.SSLError) as e:
+                result.error = str(e) or e.__class__.__name__
+                metrics.TLS_HANDSHAKES.inc(kind="full", result="error")
+            span.set(protocol=result.protocol, reused=result.session_reused, error=result.error)
+        return result
+
+    def _full_handshake(self, result: TlsAuditResult, server_name: Optional[str]):
+        """
+        Shake hands without a session, verifying the chain, or without
+        verifying when that fails. Returns the context used and the session.
+        """
+        context = self._verified_context
+        try:
+            tls, connect_ms, handshake_ms = self._handshake(
+                result.host, result.port, context, server_name
+            )
+            result.trusted = True
+        except ssl.SSLCertVerificationError as e:
+            result.verify_error = e.verify_message or str(e)
+            context = self._unverified_context
+            tls, connect_ms, handshake_ms = self._handshake(
+                result.host, result.port, context, server_name
+            )
+        result.address = tls.getpeername()[0]
+        result.protocol = tls.version() or ""
+        cipher = tls.cipher()
+        if cipher:
+            result.cipher, _, result.cipher_bits = cipher
+        result.chain = [_summarize(der) for der in _peer_chain(tls)]
+        result.connect_ms = connect_ms
+        result.handshake_ms = handshake_ms
+        return context, self._close(tls)
+
+    def audit(
+        self,
+        targets: Iterable[str],
+        on_result: Optional[Callable[[TlsAuditResult], None]] = None,
+    ) -> List[TlsAuditResult]:
+        results = []
+        for result in self.iter_audit(targets):
+            results.append(result)
+            if on_result:
+                on_result(result)
+        return results
+
+    @tracing.traced("tls.audit_all", "tls")
+    def iter_audit(self, targets: Iterable[str]) -> Iterator[TlsAuditResult]:
+        """Yield results as endpoints finish, with a bounded number queued."""
+        workers = max(1, self.options.concurrency)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="woes-tls") as executor:
+            pending = set()
+            for target in targets:
+                if self.cancelled.is_set():
+                    break
+                pending.add(executor.submit(self.audit_one, target))
+                if len(pending) >= workers * 4:
+                    done = next(as_completed(pending))
+                    pending.discard(done)
+                    yield done.result()
+            for future in as_completed(pending):
+                yield future.result()
@@ -0,0 +1,248 @@
+# tracing.py
+"""
+Named, nested timing spans that cost next to nothing while tracing is off.
+
+Tracing is off by default. ``span()`` then returns a shared no-op object,
+and ``traced`` functions pay a single flag check, so spans can stay in hot
+paths. When it is on, finished spans are kept in a bounded buffer and can
+be written out in the Chrome trace event format, which chrome://tracing,
+Perfetto and speedscope open.
+
+Setting ``WOES_TRACE`` to a file path turns tracing on at startup and
+writes the trace there when the process exits.
+"""
+import atexit
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+
+TRACE_ENV = "WOES_TRACE"
+# Spans kept before the oldest are dropped; about 200 bytes each.
+MAX_SPANS = 200_000
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class _NullSpan:
+    """Stands in for a span while tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "category", "args", "span_id", "parent_id", "start", "end")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.span_id = 0
+        self.parent_id = 0
+        self.start = 0
+        self.end = 0
+
+    def set(self, **args):
+        """Attach results known only once the span's work is done."""
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        stack = self.tracer._stack()
+        self.span_id = next(self.tracer._ids)
+        self.parent_id = stack[-1].span_id if stack else 0
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        self.end = time.perf_counter_ns()
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+
+class Tracer:
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self.enabled = False
+        self.origin = time.perf_counter_ns()
+        self.spans: Deque[tuple] = deque(maxlen=max_spans)
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, span: Span):
+        # Spans are stored as plain tuples; deque.append is thread-safe.
+        self.spans.append(
+            (
+                span.name,
+                span.category,
+                span.start,
+                span.end,
+                threading.get_ident(),
+                span.span_id,
+                span.parent_id,
+                span.args,
+            )
+        )
+
+    def span(self, name: str, category: str = "woes", **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def instant(self, name: str, category: str = "woes", **args):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        stack = self._stack()
+        parent = stack[-1].span_id if stack else 0
+        self.spans.append(
+            (name, category, now, None, threading.get_ident(), next(self._ids), parent, args)
+        )
+
+    def clear(self):
+        self.spans.clear()
+
+    def chrome_events(self) -> List[Dict[str, Any]]:
+        """The recorded spans as Chrome trace events, in microseconds."""
+        pid = os.getpid()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        events: List[Dict[str, Any]] = []
+        seen_threads = set()
+        for name, category, start, end, tid, span_id, parent_id, args in list(self.spans):
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X" if end is not None else "i",
+                "ts": (start - self.origin) / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": dict(args, span_id=span_id, parent_id=parent_id),
+            }
+            if end is not None:
+                event["dur"] = (end - start) / 1000
+            else:
+                event["s"] = "t"
+            events.append(event)
+            seen_threads.add(tid)
+        for tid in seen_threads:
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": thread_names.get(tid, str(tid))},
+                }
+            )
+        return events
+
+    def export_chrome_trace(self, path: str) -> int:
+        """
+        Write the recorded spans to ``path`` as a Chrome trace.
+
+        Returns:
+            int: The number of spans written.
+        """
+        events = self.chrome_events()
+        with open(path, "w", encoding="utf-8") as stream:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, stream, default=str)
+        count = sum(1 for event in events if event["ph"] != "M")
+        logging.info(f"Wrote {count} trace spans to {path}")
+        return count
+
+
+TRACER = Tracer()
+
+
+def enabled() -> bool:
+    """Whether spans are being recorded; guard costly span arguments with it."""
+    return TRACER.enabled
+
+
+def enable(on: bool = True):
+    TRACER.enabled = on
+
+
+def span(name: str, category: str = "woes", **args):
+    """
+    Time a block as a named span nested under the thread's current span.
+
+    Arguments are stored as given and only converted when the trace is
+    exported, so pass counts and short strings, not result payloads.
+    """
+    if not TRACER.enabled:
+        return NULL_SPAN
+    return Span(TRACER, name, category, args)
+
+
+def instant(name: str, category: str = "woes", **args):
+    TRACER.instant(name, category, **args)
+
+
+def traced(name: Optional[str] = None, category: str = "woes") -> Callable[[F], F]:
+    """Decorator: run every call of the function in a span."""
+
+    def decorator(function: F) -> F:
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            with Span(TRACER, span_name, category, {}):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def export_chrome_trace(path: str) -> int:
+    return TRACER.export_chrome_trace(path)
+
+
+def trace_to_file(path: str):
+    """Record spans from now on and write them to ``path`` at exit."""
+    enable()
+
+    def write():
+        try:
+            export_chrome_trace(path)
+        except OSError as e:
+            logging.error(f"Could not write trace to {path}: {e}")
+
+    atexit.register(write)
+
+
+def configure_from_environment():
+    path = os.environ.get(TRACE_ENV)
+    if path:
+        trace_to_file(path)
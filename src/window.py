@@ -1,20 +1,30 @@
 # window.py
+import importlib
 import logging
 
-from gi.repository import Adw, Gdk, Gio, Gtk
+from gi.repository import Adw, Gdk, Gio, GLib, Gtk
 
-from . import DNSPage, HttpPage, NmapPage
+from . import tracing
 from .constants import APP_ID, RESOURCE_PREFIX
 from .style_utils import apply_font_size, apply_theme
 
+# Pages are built the first time their stack page is shown: stack page
+# name -> (module, class). Their modules, and the libraries those import
+# (requests, dnspython, python-nmap, PyYAML), load with them.
+LAZY_PAGES = {
+    "http_page": ("http_page", "HttpPage"),
+    "nmap_page": ("nmap_page", "NmapPage"),
+    "dns_page": ("dns_page", "DNSPage"),
+}
+
 
 @Gtk.Template(resource_path=f"{RESOURCE_PREFIX}/window.ui")
 class WoesWindow(Adw.ApplicationWindow):
     __gtype_name__ = "WoesWindow"
 
-    http_page = Gtk.Template.Child("http_page")
-    nmap_page = Gtk.Template.Child("nmap_page")
-    dns_page = Gtk.Template.Child("dns_page")
+    http_page_box = Gtk.Template.Child("http_page_box")
+    nmap_page_box = Gtk.Template.Child("nmap_page_box")
+    dns_page_box = Gtk.Template.Child("dns_page_box")
 
     switcher_title = Gtk.Template.Child("switcher_title")
     stack = Gtk.Template.Child("stack")
@@ -30,16 +40,41 @@ class WoesWindow(Adw.ApplicationWindow):
         self.load_css()
         self.apply_preferences()
         self.switcher_title.connect("notify::selected-page", self.on_page_switched)
+        self.stack.connect("notify::visible-child", self.on_page_switched)
 
     def initialize_pages(self):
-        self.http_page = HttpPage()
-        self.stack.add(self.http_page)
-
-        self.nmap_page = NmapPage()
-        self.stack.add(self.nmap_page)
-
-        self.dns_page = DNSPage()
-        self.stack.add(self.dns_page)
+        self.http_page = None
+        self.nmap_page = None
+        self.dns_page = None
+        # Idle callbacks run after the frame clock's redraw, so the window
+        # is drawn with its header and page descriptions before the first
+        # page is built.
+        GLib.idle_add(self.build_visible_page)
+
+    def build_page(self, name: str):
+        """Return the page for a stack page name, building it on first use."""
+        page = getattr(self, name, None)
+        if page is not None or name not in LAZY_PAGES:
+            return page
+
+        module_name, class_name = LAZY_PAGES[name]
+        with tracing.span("ui.build_page", "ui", page=class_name):
+            module = importlib.import_module(f".{module_name}", __package__)
+            page = getattr(module, class_name)()
+            box = getattr(self, f"{name}_box")
+            page.set_vexpand(box.get_vexpand())
+            box.append(page)
+        setattr(self, name, page)
+        return page
+
+    def build_visible_page(self) -> bool:
+        name = self.stack.get_visible_child_name()
+        if name is not None:
+            self.build_page(name)
+        application = self.get_application()
+        if application is not None:
+            application.mark_startup("page-ready")
+        return GLib.SOURCE_REMOVE
 
     def load_css(self):
         # Determine which CSS file to use based on the current theme
@@ -77,5 +112,7 @@ class WoesWindow(Adw.ApplicationWindow):
             logging.error(f"Error applying preferences: {e}")
 
     def on_page_switched(self, widget, gparam):
-        selected_page = self.stack.get_visible_child()
+        selected_page = self.stack.get_visible_child_name()
+        if selected_page is not None:
+            self.build_page(selected_page)
         logging.debug(f"Switched to page: {selected_page}")
@@ -0,0 +1,61 @@
+# conftest.py
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+from typing import List, Optional
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def load_woes():
+    """Import ``src`` as the ``woes`` package, as it is installed."""
+    if "woes" in sys.modules:
+        return sys.modules["woes"]
+    spec = importlib.util.spec_from_file_location(
+        "woes", os.path.join(SRC_DIR, "__init__.py"), submodule_search_locations=[SRC_DIR]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["woes"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+load_woes()
+
+
+@pytest.fixture(scope="session")
+def make_certificate(tmp_path_factory):
+    """
+    Return a function that writes a self-signed certificate and its key
+    with the openssl command, and returns their paths.
+    """
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        pytest.skip("openssl is not installed")
+    directory = tmp_path_factory.mktemp("certificates")
+
+    def make(
+        name: str,
+        key: str = "rsa:2048",
+        days: int = 30,
+        subject: str = "/CN=example.test",
+        alt_names: Optional[List[str]] = None,
+    ):
+        cert_path = directory / f"{name}.pem"
+        key_path = directory / f"{name}.key"
+        command = [openssl, "req", "-x509", "-nodes", "-subj", subject, "-days", str(days)]
+        if key.startswith("ec:"):
+            command += ["-newkey", "ec", "-pkeyopt", f"ec_paramgen_curve:{key[3:]}"]
+        else:
+            command += ["-newkey", key]
+        if alt_names:
+            command += ["-addext", f"subjectAltName={','.join(alt_names)}"]
+        command += ["-keyout", str(key_path), "-out", str(cert_path)]
+        subprocess.run(command, check=True, capture_output=True)
+        return str(cert_path), str(key_path)
+
+    return make
@@ -0,0 +1,182 @@
+# test_connect_scanner.py
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from woes.connect_scanner import ConnectScanner, ConnectScanOptions
+from woes.scan_model import HostRecord
+
+# TEST-NET-1: never routed, so connection attempts time out or fail.
+UNROUTABLE = "192.0.2.1"
+
+
+@pytest.fixture
+def listeners():
+    """Two listening ports on loopback and one port with nothing behind it."""
+    sockets = [socket.create_server(("127.0.0.1", 0)) for _ in range(2)]
+    with socket.create_server(("127.0.0.1", 0)) as unused:
+        closed = unused.getsockname()[1]
+    yield [sock.getsockname()[1] for sock in sockets], closed
+    for sock in sockets:
+        sock.close()
+
+
+class ProbeCounter:
+    """Replaces ``_probe`` and records how many probes run at once."""
+
+    def __init__(self, delay: float = 0.01, reason: str = "syn-ack"):
+        self.delay = delay
+        self.reason = reason
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_total = 0
+        self.max_per_host = 0
+        self.max_hosts = 0
+        self.probes = 0
+
+    async def __call__(self, address: str, port: int) -> str:
+        with self.lock:
+            self.probes += 1
+            self.active[address] = self.active.get(address, 0) + 1
+            self.max_total = max(self.max_total, sum(self.active.values()))
+            self.max_per_host = max(self.max_per_host, self.active[address])
+            self.max_hosts = max(self.max_hosts, len(self.active))
+        try:
+            await asyncio.sleep(self.delay)
+            return self.reason
+        finally:
+            with self.lock:
+                self.active[address] -= 1
+                if not self.active[address]:
+                    del self.active[address]
+
+
+def addresses(count: int):
+    return [f"127.0.0.{index + 1}" for index in range(count)]
+
+
+def test_open_and_closed_ports(listeners):
+    open_ports, closed = listeners
+    scanner = ConnectScanner(ConnectScanOptions(ports=(*open_ports, closed), timeout=2))
+
+    results = scanner.run(["127.0.0.1"])
+
+    record = results["127.0.0.1"]
+    assert (record.state, record.reason) == ("up", "syn-ack")
+    assert sorted(port for _, port in record.open_ports()) == sorted(open_ports)
+    assert [(port.state, port.reason) for port in record.ports] == [("open", "syn-ack")] * 2
+
+
+def test_only_closed_ports_is_up_without_open_ports(listeners):
+    _, closed = listeners
+    results = ConnectScanner(ConnectScanOptions(ports=(closed,), timeout=2)).run(["127.0.0.1"])
+
+    record = results["127.0.0.1"]
+    assert (record.state, record.reason) == ("up", "conn-refused")
+    assert record.open_ports() == {}
+
+
+@pytest.fixture
+def full_backlog():
+    """A loopback port whose accept queue is full, so new connections hang."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(0)
+    port = server.getsockname()[1]
+    queued = []
+    for _ in range(4):
+        client = socket.socket()
+        client.setblocking(False)
+        client.connect_ex(("127.0.0.1", port))
+        queued.append(client)
+    time.sleep(0.1)
+    yield port
+    for client in queued:
+        client.close()
+    server.close()
+
+
+def test_connect_timeout_is_no_response(full_backlog):
+    scanner = ConnectScanner(ConnectScanOptions(ports=(full_backlog,), timeout=0.3))
+
+    started = time.monotonic()
+    assert scanner.run(["127.0.0.1"]) == {}
+    assert 0.3 <= time.monotonic() - started < 2
+
+
+def test_unroutable_address_times_out():
+    scanner = ConnectScanner(ConnectScanOptions(ports=(80,), timeout=0.3))
+    reason = asyncio.run(scanner._probe(UNROUTABLE, 80))
+    if reason == "conn-refused":
+        pytest.skip("this network refuses connections to unroutable addresses")
+
+    assert reason == "no-response"
+    started = time.monotonic()
+    assert scanner.run([UNROUTABLE]) == {}
+    assert time.monotonic() - started < 2
+
+
+def test_concurrency_and_per_host_caps():
+    options = ConnectScanOptions(
+        ports=range(1, 11), concurrency=6, host_concurrency=2, host_rate=0, max_hosts=8
+    )
+    scanner = ConnectScanner(options)
+    scanner._probe = probe = ProbeCounter()
+
+    results = scanner.run(addresses(8))
+
+    assert len(results) == 8
+    assert probe.probes == 80
+    assert probe.max_total == 6
+    assert probe.max_per_host == 2
+
+
+def test_max_hosts_cap():
+    options = ConnectScanOptions(
+        ports=range(1, 5), concurrency=100, host_concurrency=4, host_rate=0, max_hosts=3
+    )
+    scanner = ConnectScanner(options)
+    scanner._probe = probe = ProbeCounter()
+
+    scanner.run(addresses(10))
+
+    assert probe.max_hosts == 3
+
+
+def test_cancel_stops_the_scan():
+    options = ConnectScanOptions(ports=range(1, 101), concurrency=4, host_rate=0)
+    scanner = ConnectScanner(options)
+    scanner._probe = probe = ProbeCounter(delay=0.02)
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(scanner.run(addresses(50))))
+
+    thread.start()
+    time.sleep(0.1)
+    scanner.cancel()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert probe.probes < 100
+
+
+def test_on_host_streams_host_records():
+    options = ConnectScanOptions(ports=(22, 80), host_rate=0)
+    scanner = ConnectScanner(options)
+    scanner._probe = ProbeCounter(delay=0)
+    streamed = []
+
+    results = scanner.run(["127.0.0.2", "localhost"], streamed.append)
+
+    assert len(streamed) == len(results) == 2
+    assert all(isinstance(record, HostRecord) for record in streamed)
+    assert {record.address: record for record in streamed} == results
+    named = next(record for record in streamed if record.hostnames)
+    assert named.hostnames == (("localhost", "user"),)
+    assert named.address in ("127.0.0.1", "::1")
+    for record in streamed:
+        services = record.open_ports()
+        assert sorted(services) == [("tcp", 22), ("tcp", 80)]
+        assert services[("tcp", 22)].name == "ssh"
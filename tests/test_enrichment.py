@@ -0,0 +1,142 @@
+# test_enrichment.py
+import datetime
+import hashlib
+import ipaddress
+import ssl
+
+import pytest
+
+from woes.enrichment import _read_tlv, parse_certificate
+
+ALT_NAMES = ["DNS:example.test", "DNS:www.example.test", "IP:127.0.0.1", "IP:2001:db8::1"]
+
+
+def decoded(cert_path: str) -> dict:
+    """The certificate as the ssl module decodes it."""
+    return ssl._ssl._test_decode_cert(cert_path)
+
+
+def der(cert_path: str) -> bytes:
+    with open(cert_path, encoding="ascii") as pem:
+        return ssl.PEM_cert_to_DER_cert(pem.read())
+
+
+def ssl_time(text: str) -> datetime.datetime:
+    seconds = ssl.cert_time_to_seconds(text)
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).replace(tzinfo=None)
+
+
+def ssl_name(name) -> dict:
+    return {key: value for rdn in name for key, value in rdn}
+
+
+def ssl_alt_names(info: dict) -> list:
+    names = []
+    for kind, value in info.get("subjectAltName", ()):
+        if kind == "IP Address":
+            value = str(ipaddress.ip_address(value.strip()))
+        names.append(f"{kind}:{value}")
+    return names
+
+
+@pytest.fixture(scope="module")
+def rsa_certificate(make_certificate):
+    return make_certificate(
+        "rsa", subject="/C=CA/O=Woes Test/CN=example.test", alt_names=ALT_NAMES
+    )[0]
+
+
+@pytest.fixture(scope="module")
+def ec_certificate(make_certificate):
+    # Valid past 2049, so notAfter is a GeneralizedTime, not a UTCTime.
+    return make_certificate(
+        "ec", key="ec:prime256v1", days=365 * 40, alt_names=["DNS:ec.example.test"]
+    )[0]
+
+
+@pytest.fixture(scope="module")
+def plain_certificate(make_certificate):
+    return make_certificate("plain", key="ec:secp384r1", subject="/CN=plain.test")[0]
+
+
+@pytest.mark.parametrize(
+    "fixture, key_type, key_bits, signature",
+    [
+        ("rsa_certificate", "rsa", 2048, "sha256WithRSAEncryption"),
+        ("ec_certificate", "ec", 256, "ecdsa-with-SHA256"),
+        ("plain_certificate", "ec", 384, "ecdsa-with-SHA256"),
+    ],
+)
+def test_parse_certificate_matches_ssl(request, fixture, key_type, key_bits, signature):
+    cert_path = request.getfixturevalue(fixture)
+    data = der(cert_path)
+    info = decoded(cert_path)
+
+    summary = parse_certificate(data)
+
+    assert summary.subject == ssl_name(info["subject"])
+    assert summary.issuer == ssl_name(info["issuer"])
+    assert summary.self_signed
+    assert summary.alt_names == ssl_alt_names(info)
+    assert summary.not_before == ssl_time(info["notBefore"])
+    assert summary.not_after == ssl_time(info["notAfter"])
+    assert (summary.key_type, summary.key_bits) == (key_type, key_bits)
+    assert summary.signature_algorithm == signature
+    assert summary.sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_alt_names_keep_order_and_address_families(rsa_certificate):
+    summary = parse_certificate(der(rsa_certificate))
+    assert summary.alt_names == [
+        "DNS:example.test",
+        "DNS:www.example.test",
+        "IP Address:127.0.0.1",
+        "IP Address:2001:db8::1",
+    ]
+
+
+def test_generalized_time_after_2049(ec_certificate):
+    summary = parse_certificate(der(ec_certificate))
+    assert summary.not_before.year < 2050 <= summary.not_after.year
+
+
+def test_certificate_without_alt_names(plain_certificate):
+    assert parse_certificate(der(plain_certificate)).alt_names == []
+
+
+def test_read_tlv_short_and_long_lengths():
+    assert _read_tlv(b"\x04\x03abc", 0) == (0x04, 2, 5)
+    long_form = b"\x30\x82\x01\x00" + bytes(256)
+    assert _read_tlv(long_form, 0) == (0x30, 4, 260)
+
+
+def test_read_tlv_truncated():
+    with pytest.raises(ValueError):
+        _read_tlv(b"\x04\x05abc", 0)
+    with pytest.raises(ValueError):
+        _read_tlv(b"\x30\x82\x01\x00" + bytes(10), 0)
+
+
+def test_truncated_certificates_raise_value_error(rsa_certificate):
+    data = der(rsa_certificate)
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            parse_certificate(data[:length])
+
+
+@pytest.mark.parametrize("data", [b"", b"\x30", b"not a certificate", bytes(64)])
+def test_garbage_raises_value_error(data):
+    with pytest.raises(ValueError):
+        parse_certificate(data)
+
+
+def test_corrupted_certificates_raise_only_value_error(rsa_certificate, ec_certificate):
+    for cert_path in (rsa_certificate, ec_certificate):
+        data = der(cert_path)
+        for position in range(len(data)):
+            for value in (0x00, 0x81, 0xFF):
+                corrupted = data[:position] + bytes([value]) + data[position + 1 :]
+                try:
+                    parse_certificate(corrupted)
+                except ValueError:
+                    pass
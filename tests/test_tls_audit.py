@@ -0,0 +1,110 @@
+# test_tls_audit.py
+import hashlib
+import socket
+import ssl
+import threading
+
+import pytest
+
+from woes.tls_audit import TlsAuditor, TlsAuditOptions
+
+
+@pytest.fixture(scope="module")
+def certificate(make_certificate):
+    return make_certificate(
+        "server",
+        subject="/O=Woes Test/CN=localhost",
+        alt_names=["DNS:localhost", "IP:127.0.0.1"],
+    )
+
+
+@pytest.fixture(scope="module")
+def tls_server(certificate):
+    """A TLS server on loopback that holds each connection until the client closes it."""
+    cert_path, key_path = certificate
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def handle(connection):
+        try:
+            with context.wrap_socket(connection, server_side=True) as tls:
+                while tls.recv(1024):
+                    pass
+        except (OSError, ssl.SSLError):
+            connection.close()
+
+    def serve():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"127.0.0.1:{server.getsockname()[1]}"
+    server.close()
+
+
+def certificate_sha256(cert_path: str) -> str:
+    with open(cert_path, encoding="ascii") as pem:
+        return hashlib.sha256(ssl.PEM_cert_to_DER_cert(pem.read())).hexdigest()
+
+
+def test_untrusted_certificate_falls_back(tls_server, certificate):
+    result = TlsAuditor(TlsAuditOptions(timeout=5, rechecks=0)).audit_one(tls_server)
+
+    assert result.error is None
+    assert not result.trusted
+    assert "self-signed" in result.verify_error
+    assert result.address == "127.0.0.1"
+    assert result.protocol.startswith("TLS")
+    assert result.cipher and result.cipher_bits > 0
+    assert result.chain[0].sha256 == certificate_sha256(certificate[0])
+    assert result.certificate.subject == {"organizationName": "Woes Test", "commonName": "localhost"}
+    assert result.certificate.self_signed
+    assert result.certificate.alt_names == ["DNS:localhost", "IP Address:127.0.0.1"]
+    assert 28 <= result.days_left <= 30
+    assert result.session_reused is None
+
+
+def test_trusted_certificate(tls_server, certificate):
+    auditor = TlsAuditor(TlsAuditOptions(timeout=5, rechecks=0))
+    auditor._verified_context.load_verify_locations(certificate[0])
+
+    result = auditor.audit_one(tls_server)
+
+    assert result.error is None
+    assert result.trusted
+    assert result.verify_error == ""
+    assert result.to_dict()["alt_names"] == ["DNS:localhost", "IP Address:127.0.0.1"]
+
+
+def test_rechecks_resume_the_session(tls_server):
+    result = TlsAuditor(TlsAuditOptions(timeout=5, rechecks=2)).audit_one(tls_server)
+
+    assert result.error is None
+    assert result.session_reused is True
+    assert len(result.resumed_handshake_ms) == 2
+    assert result.resumption_speedup is not None
+
+
+def test_closed_port_is_an_error_result():
+    with socket.create_server(("127.0.0.1", 0)) as unused:
+        port = unused.getsockname()[1]
+    target = f"127.0.0.1:{port}"
+
+    results = TlsAuditor(TlsAuditOptions(timeout=2)).audit([target])
+
+    assert len(results) == 1
+    result = results[0]
+    assert (result.target, result.port) == (target, port)
+    assert result.error
+    assert result.chain == []
+    assert result.to_dict() == {
+        "target": target,
+        "host": "127.0.0.1",
+        "port": port,
+        "error": result.error,
+    }